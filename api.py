@@ -0,0 +1,230 @@
+"""Versioned JSON API.
+
+Serves the same compact projections the HTML listings render, through the
+same Petfinder client and caches, so a client paging through animals gets 42
+small records per request instead of a whole page of markup.
+
+Listings page with opaque cursors: the `next_cursor` of a response, passed
+back as `?cursor=`, carries the page number and the original filters. Any
+endpoint returning records takes `?fields=id,name` to trim them further.
+"""
+
+from flask import Blueprint, current_app, g, jsonify, request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+import petfinder
+from http_caching import conditional_response, etag_for
+from likes import toggle_animal_like, toggle_org_like
+from models import User, SavedAnimals, SavedOrgs
+from projections import animal_detail, org_detail
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+ANIMAL_FILTERS = ("name", "type", "gender")
+ORG_FILTERS = ("location", "state")
+
+ANIMAL_FIELDS = ("id", "name", "description", "photo", "liked")
+ORG_FIELDS = ("id", "name", "mission_statement", "photo", "liked")
+SAVED_ANIMAL_FIELDS = ("id", "name", "img_url", "description")
+SAVED_ORG_FIELDS = ("id", "name", "img_url", "mission_statement")
+
+
+class APIError(Exception):
+    """An error to report to the client as JSON."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(APIError)
+def handle_api_error(error):
+    return jsonify(error=error.message), error.status
+
+
+@api.before_request
+def require_login():
+    if not g.user:
+        raise APIError("Please login first!", 401)
+
+
+##############################################################################
+# Cursors and field selection
+
+def cursor_serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="api-cursor")
+
+
+def encode_cursor(kind, page, filters):
+    return cursor_serializer().dumps({"kind": kind, "page": page, "filters": filters})
+
+
+def decode_cursor(kind, cursor):
+    """Return (page, filters) from a cursor made by `encode_cursor`."""
+
+    try:
+        state = cursor_serializer().loads(cursor)
+    except BadSignature:
+        raise APIError("Invalid cursor.", 400)
+    if state.get("kind") != kind:
+        raise APIError("Invalid cursor.", 400)
+    return state["page"], state["filters"]
+
+
+def listing_state(kind, filter_names):
+    """The page and filters a listing request asks for."""
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        return decode_cursor(kind, cursor)
+
+    filters = {name: request.args[name] for name in filter_names if request.args.get(name)}
+    return 1, filters
+
+
+def requested_fields(allowed):
+    """The fields named by ?fields=, or all of `allowed`."""
+
+    fields = request.args.get("fields")
+    if not fields:
+        return allowed
+
+    fields = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}.", 400)
+    return fields
+
+
+def select(record, fields):
+    return {field: record[field] for field in fields}
+
+
+##############################################################################
+# Listings and details
+
+def fetch_or_empty(fetch, params):
+    """Fetch a listing, retrying once on an expired token.
+
+    The API answers a search with no matches without the listing key, so any
+    other KeyError means there is nothing to show.
+    """
+
+    try:
+        return fetch(params)
+    except petfinder.TokenExpired:
+        petfinder.refresh_token()
+    except KeyError:
+        return [], 0
+    try:
+        return fetch(params)
+    except KeyError:
+        return [], 0
+
+
+def listing_response(kind, fetch, filter_names, allowed_fields, liked_ids):
+    # the cursor and fields are checked before anything is read
+    page, filters = listing_state(kind, filter_names)
+    fields = requested_fields(allowed_fields)
+    likes = liked_ids()
+
+    params = dict(filters, page=page, limit=petfinder.PAGE_SIZE)
+    cards, total_pages = fetch_or_empty(fetch, params)
+
+    data = [select(dict(card.as_dict(), liked=str(card.id) in likes), fields) for card in cards]
+    next_cursor = encode_cursor(kind, page + 1, filters) if page < total_pages else None
+    return jsonify(data=data, next_cursor=next_cursor)
+
+
+@api.route("/animals")
+def list_animals():
+    """Animals from the API. Filters: name, type, gender."""
+
+    return listing_response(
+        "animals", petfinder.fetch_animals, ANIMAL_FILTERS, ANIMAL_FIELDS,
+        lambda: SavedAnimals.animal_ids_for(g.user.id),
+    )
+
+
+@api.route("/organizations")
+def list_organizations():
+    """Organizations from the API. Filters: location, state."""
+
+    return listing_response(
+        "organizations", petfinder.fetch_organizations, ORG_FILTERS, ORG_FIELDS,
+        lambda: SavedOrgs.org_ids_for(g.user.id),
+    )
+
+
+def detail_response(path, key, project):
+    url = f"{petfinder.BASE_URL}/{path}"
+    res = petfinder.make_api_request(url)
+    if res.status_code == 401:
+        # the token expired; get a new one and ask again
+        petfinder.refresh_token()
+        res = petfinder.make_api_request(url)
+    if res.status_code == 404:
+        raise APIError(f"No {key} found.", 404)
+    try:
+        record = project(res.json()[key])
+    except (KeyError, ValueError):
+        raise APIError(f"Could not fetch this {key}. Please try again.", 502)
+
+    fields = requested_fields(tuple(record))
+    etag = etag_for(etag_for(res.content), request.args.get("fields"))
+    return conditional_response(etag, lambda: jsonify(select(record, fields)))
+
+
+@api.route("/animals/<animal_id>")
+def animal_details(animal_id):
+    return detail_response(f"animals/{animal_id}", "animal", animal_detail)
+
+
+@api.route("/organizations/<org_id>")
+def organization_details(org_id):
+    return detail_response(f"organizations/{org_id}", "organization", org_detail)
+
+
+##############################################################################
+# Likes
+
+def saved_response(records, allowed_fields):
+    fields = requested_fields(allowed_fields)
+    return jsonify(data=[select(vars_of(record, allowed_fields), fields) for record in records])
+
+
+def vars_of(record, fields):
+    return {field: getattr(record, field) for field in fields}
+
+
+@api.route("/users/<int:user_id>/animals")
+def liked_animals(user_id):
+    user = User.query.get(user_id)
+    if user is None:
+        raise APIError("No user found.", 404)
+    return saved_response(user.animal_likes, SAVED_ANIMAL_FIELDS)
+
+
+@api.route("/users/<int:user_id>/organizations")
+def liked_organizations(user_id):
+    user = User.query.get(user_id)
+    if user is None:
+        raise APIError("No user found.", 404)
+    return saved_response(user.org_likes, SAVED_ORG_FIELDS)
+
+
+@api.route("/animals/<animal_id>/like", methods=["POST"])
+def toggle_animal(animal_id):
+    liked = toggle_animal_like(g.user.model, animal_id)
+    if liked is None:
+        raise APIError("Could not fetch this animal. Please try again.", 502)
+    return jsonify(id=animal_id, liked=liked)
+
+
+@api.route("/organizations/<org_id>/like", methods=["POST"])
+def toggle_org(org_id):
+    liked = toggle_org_like(g.user.model, org_id)
+    if liked is None:
+        raise APIError("Could not fetch this organization. Please try again.", 502)
+    return jsonify(id=org_id, liked=liked)
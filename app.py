@@ -1,78 +1,108 @@
-import os
-from flask import Flask, render_template, request, flash, redirect, session, g
-from flask_debugtoolbar import DebugToolbarExtension
+"""The Pet Adopter web app.
+
+`create_app` builds it: the WSGI entry point is `app:create_app()`, and
+`from app import app` still works, building one with FLASK_ENV's profile the
+first time it is asked for (see config.py). Importing this module creates no
+app and reads no settings, so scripts and tests that don't need one pay for
+neither, and the debug toolbar is only imported by the development profile.
+"""
+
+from flask import Blueprint, Flask, current_app, render_template, request, flash, redirect, session, g
 from sqlalchemy.exc import IntegrityError
-import html
+import config
+import petfinder
+from api import api
+from assets import init_assets
+from budgets import budget
+from compression import CompressionMiddleware
 from forms import UserAddForm, LoginForm, EditUserForm
 from models import db, connect_db, User, Organization, SavedOrgs, Animal, SavedAnimals
-import requests
+from fragments import card_cache, render_cards
+from metrics import init_metrics
+from tracing import init_tracing
+from profiling import init_profiling
+from likes import toggle_animal_like, toggle_org_like
+from identity import CurrentUser, identity_cache
+from http_caching import NO_STORE, apply_cache_control, cache_control, conditional_response, etag_for
+from passwords import HasherBusy, hasher
+from page_cache import page_cache, page_key, cache_page, send_page
+from replicas import init_replicas
+from sessions import init_sessions, rotate_session
+from petfinder import PAGE_SIZE, ensure_fresh_token, fetch_animals, fetch_organizations, get_animal_types, init_petfinder, make_api_request, refresh_token
+from streaming import Deferred, stream_page
 
 CURR_USER_KEY = "curr_user"
 
-app = Flask(__name__)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
-    "DATABASE_URL")
-
-app.config["SQL ALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ECHO"] = False
-app.config["DEBUG_TB_INTERCEPT_REDIRECTS"] = False
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY")
+views = Blueprint("views", __name__)
 
-toolbar = DebugToolbarExtension(app)
 
-connect_db(app)
+def create_app(profile=None, **overrides):
+    """A new app with the settings of `profile` ("production", "development"
+    or "test"; FLASK_ENV's by default), the environment and `overrides`.
+    """
 
-###########################################
-#global variables for api
-BASE_URL = os.environ.get("API_URL")
-token_request = {
-    "grant_type": "client_credentials",
-    "client_id": os.environ.get("CLIENT_ID"),
-    "client_secret": os.environ.get("CLIENT_SECRET"),
-}
+    app = Flask(__name__)
+    app.config.update(config.load(profile, overrides))
+
+    if app.config["DEBUG_TB_ENABLED"]:
+        # only imported when it's used, so never in production
+        from flask_debugtoolbar import DebugToolbarExtension
+
+        DebugToolbarExtension(app)
+
+    connect_db(app)
+    init_replicas(app)
+    init_sessions(app)
+    init_assets(app)
+    init_petfinder(app)
+    app.register_blueprint(api)
+
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, min_size=app.config["COMPRESSION_MIN_SIZE"])
+    init_metrics(app, app.wsgi_app.stats)
+    init_tracing(app)
+
+    app.register_blueprint(views)
+    # registered after the views' add_user_to_g, since profiling is for admins only
+    init_profiling(app)
+
+    card_cache.maxsize = app.config["FRAGMENT_CACHE_SIZE"]
+    page_cache.maxsize = app.config["PAGE_CACHE_SIZE"]
+    page_cache.ttl = app.config["PAGE_CACHE_TTL"]
+    hasher.configure(
+        rounds=app.config["BCRYPT_LOG_ROUNDS"],
+        workers=app.config["BCRYPT_WORKERS"],
+        max_queue=app.config["BCRYPT_MAX_QUEUE"],
+    )
 
-#api functions
-def retrieve_new_token():
-    # retrieve a new OAuth token 
-    res = requests.post(
-                "https://api.petfinder.com/v2/oauth2/token", json=token_request
-            )
-    return res.json()["access_token"]
+    return app
 
-def refresh_token():
-    new_token = retrieve_new_token()
-    session['oauth_token'] = new_token
 
-def make_api_request(url, method='GET', headers=None, params=None, data=None):
-    if 'oauth_token' not in session:
-        # No token in session, retrieve a new one
-        new_token = retrieve_new_token()
-        session['oauth_token'] = new_token
-        
-    request_headers = {'Authorization': f'Bearer {session["oauth_token"]}'} if headers is None else headers
-    response = requests.request(method, url, headers=request_headers, params=params, data=data)
-    return response
+def __getattr__(name):
+    # `from app import app`: built on first use, then an ordinary attribute
+    if name == "app":
+        globals()["app"] = instance = create_app()
+        return instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 ##############################################################################
 # User signup/login/logout
 
 
-@app.before_request
+@views.before_app_request
 def add_user_to_g():
-    """If we're logged in, add curr user to Flask global."""
+    """Add a lazy stand-in for the curr user to Flask global.
 
-    if CURR_USER_KEY in session:
-        g.user = User.query.get(session[CURR_USER_KEY])
+    Neither the session nor the database is read until something uses it.
+    """
 
-    else:
-        g.user = None
+    g.user = CurrentUser(lambda: session.get(CURR_USER_KEY))
 
 
 def do_login(user):
     """Log in user."""
 
+    rotate_session()
     session[CURR_USER_KEY] = user.id
 
 
@@ -81,9 +111,11 @@ def do_logout():
 
     if CURR_USER_KEY in session:
         del session[CURR_USER_KEY]
+    rotate_session()
 
 
-@app.route("/signup", methods=["GET", "POST"])
+@views.route("/signup", methods=["GET", "POST"])
+@cache_control(NO_STORE)
 def signup():
     """Handle user signup.
 
@@ -110,6 +142,10 @@ def signup():
             flash("Username already taken", "danger")
             return render_template("users/signup.html", form=form)
 
+        except HasherBusy:
+            flash("We're a little busy right now. Please try again in a moment.", "danger")
+            return render_template("users/signup.html", form=form), 503
+
         do_login(user)
 
         return redirect("/")
@@ -117,14 +153,19 @@ def signup():
     else:
         return render_template("users/signup.html", form=form)
 
-@app.route("/login", methods=["GET", "POST"])
+@views.route("/login", methods=["GET", "POST"])
+@cache_control(NO_STORE)
 def login():
     """Handle user login."""
 
     form = LoginForm()
 
     if form.validate_on_submit():
-        user = User.authenticate(form.username.data, form.password.data)
+        try:
+            user = User.authenticate(form.username.data, form.password.data)
+        except HasherBusy:
+            flash("We're a little busy right now. Please try again in a moment.", "danger")
+            return render_template("users/login.html", form=form), 503
 
         if user:
             do_login(user)
@@ -136,13 +177,13 @@ def login():
     return render_template("users/login.html", form=form)
 
 
-@app.route("/logout")
+@views.route("/logout")
 def logout():
     """Handle logout of user."""
     if CURR_USER_KEY not in session:
         flash("You are already logged out!", "danger")
         return redirect("/")
-    session.pop(CURR_USER_KEY)
+    do_logout()
     flash("Logged out successfully", "danger")
     return redirect("/login")
 
@@ -150,7 +191,7 @@ def logout():
 ##############################################################################
 # General user routes:
 
-@app.route("/users/<int:user_id>")
+@views.route("/users/<int:user_id>")
 def users_show(user_id):
     """Show user profile."""
     if not g.user:
@@ -163,22 +204,28 @@ def users_show(user_id):
     return render_template("users/detail.html", user=user)
 
 
-@app.route("/users/profile", methods=["GET", "POST"])
+@views.route("/users/profile", methods=["GET", "POST"])
+@cache_control(NO_STORE)
 def profile():
     """Update profile for current user."""
     if not g.user:
         flash("Access unauthorized.", "danger")
         return redirect("/")
 
-    curr_user = User.query.get(session[CURR_USER_KEY])
+    curr_user = g.user.model
     form = EditUserForm(obj=curr_user)
     if form.validate_on_submit():
-        user = User.authenticate(curr_user.username, form.password.data)
+        try:
+            user = User.authenticate(curr_user.username, form.password.data)
+        except HasherBusy:
+            flash("We're a little busy right now. Please try again in a moment.", "danger")
+            return render_template("users/edit.html", form=form), 503
 
         if user:
             user.username = form.username.data
             user.email = form.email.data
             db.session.commit()
+            identity_cache.invalidate(user.id)
             flash("Your profile was edited", "success")
             return redirect(f"/users/{session[CURR_USER_KEY]}")
 
@@ -187,7 +234,7 @@ def profile():
     return render_template("users/edit.html", form=form)
 
 
-@app.route("/users/delete", methods=["POST"])
+@views.route("/users/delete", methods=["POST"])
 def delete_user():
     """Delete user."""
 
@@ -197,12 +244,14 @@ def delete_user():
 
     do_logout()
 
-    db.session.delete(g.user)
+    db.session.delete(g.user.model)
     db.session.commit()
+    identity_cache.invalidate(g.user.id)
 
     return redirect("/signup")
 
-@app.route("/users/<int:user_id>/organizations")
+@views.route("/users/<int:user_id>/organizations")
+@budget(queries=3, upstream=0)
 def show_liked_orgs(user_id):
     if not g.user:
         flash("Please login first!", "danger")
@@ -215,7 +264,8 @@ def show_liked_orgs(user_id):
         "/organizations/liked_organizations.html", orgs=user.org_likes, org_likes=org_likes, user=user
     )
 
-@app.route("/users/<int:user_id>/animals")
+@views.route("/users/<int:user_id>/animals")
+@budget(queries=3, upstream=0)
 def show_liked_animals(user_id):
     if not g.user:
         flash("Please login first!", "danger")
@@ -228,7 +278,8 @@ def show_liked_animals(user_id):
         "/animals/liked_animals.html", animals=user.animal_likes, animal_likes=animal_likes, user=user
     )
 
-@app.route("/organizations/<int:page_num>")
+@views.route("/organizations/<int:page_num>")
+@budget(queries=2, upstream=1, ms=300)
 def list_organizations(page_num):
     """Page with listing of organizations from API.
 
@@ -251,29 +302,41 @@ def list_organizations(page_num):
           "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", 
           "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY"]
 
-    params = {"page": page_num, "limit": 42}
+    params = {"page": page_num, "limit": PAGE_SIZE}
     
     if location:
         params["location"] = location
 
     if state:
         params["state"] = state
+
+    key = page_key("organizations", page_num, location=location, state=state)
+    page = page_cache.get(key)
+    if page is not None:
+        org_likes = SavedOrgs.org_ids_for(g.user.id)
+        return send_page(page, org_likes)
     
+    if current_app.config["STREAM_LISTINGS"]:
+        ensure_fresh_token()
+        organizations = Deferred(lambda: fetch_organizations(params)[0])
+        cards = Deferred(lambda: render_cards("organizations/_card.html", "org", organizations.value()))
+        org_likes = SavedOrgs.org_ids_for(g.user.id)
+        return stream_page(
+        key, "organizations/index.html", "org", organizations, org_likes,
+        organizations=organizations, cards=cards, page_num=page_num + 1, states=states, state=state, location=location
+        )
+
     if not state and not location:
         try:
-            url = f"{BASE_URL}/organizations"
-            res = make_api_request(url, params=params)
-            data = res.json()
-            organizations = data["organizations"]
-            
-            for org in organizations:
-                if org.get("mission_statement") != None:
-                    org.update({"mission_statement": html.unescape(html.unescape(org.get('mission_statement')))})  
+            organizations, _ = fetch_organizations(params)
                     
-            org_likes = [saved_org.id for saved_org in g.user.org_likes]
-            return render_template(
-            "organizations/index.html", organizations=organizations, page_num=page_num + 1, org_likes=org_likes, states=states, state=state, location=location
-            )          
+            cards = render_cards("organizations/_card.html", "org", organizations)
+            page = cache_page(
+            key, "organizations/index.html", [("org", org.id) for org in organizations],
+            organizations=organizations, cards=cards, page_num=page_num + 1, states=states, state=state, location=location
+            )
+            org_likes = SavedOrgs.org_ids_for(g.user.id)
+            return send_page(page, org_likes)          
         except KeyError:
             refresh_token()
             flash('Sorry! The session has timed out. Please try your search again.', 'danger')
@@ -281,25 +344,22 @@ def list_organizations(page_num):
     
     if state or location:
         try:   
-            url = f"{BASE_URL}/organizations"
-            res = make_api_request(url, params=params)
-            data = res.json()
-            organizations = data["organizations"]
-            
-            for org in organizations:
-                if org.get("mission_statement") != None:
-                    org.update({"mission_statement": html.unescape(html.unescape(org.get('mission_statement')))})  
+            organizations, _ = fetch_organizations(params)
                     
-            org_likes = [saved_org.id for saved_org in g.user.org_likes]
-            return render_template(
-            "organizations/index.html", organizations=organizations, page_num=page_num + 1, org_likes=org_likes, states=states, state=state, location=location
-            )          
+            cards = render_cards("organizations/_card.html", "org", organizations)
+            page = cache_page(
+            key, "organizations/index.html", [("org", org.id) for org in organizations],
+            organizations=organizations, cards=cards, page_num=page_num + 1, states=states, state=state, location=location
+            )
+            org_likes = SavedOrgs.org_ids_for(g.user.id)
+            return send_page(page, org_likes)          
         except KeyError:
             session['orgNotFound'] = True
             return redirect('/organizations/1')   
 
      
-@app.route("/animals/<int:page_num>")
+@views.route("/animals/<int:page_num>")
+@budget(queries=2, upstream=2, ms=300)
 def list_animals(page_num):
     """Page with listing of animals from API.
 
@@ -314,23 +374,26 @@ def list_animals(page_num):
         flash("Sorry! There were no animals found. Please try searching something else.", "danger") 
         session['animalNotFound'] = False
    
+    name = request.args.get("name")
+    type = request.args.get("type")
+    gender = request.args.get('gender')
+
+    key = page_key("animals", page_num, name=name, type=type, gender=gender)
+    page = page_cache.get(key)
+    if page is not None:
+        animal_likes = SavedAnimals.animal_ids_for(g.user.id)
+        return send_page(page, animal_likes)
+
     # this is to get the animal species that they have listed in case they add new or remove ones
     try:
-        url_types = f"{BASE_URL}/types"
-        response_types = make_api_request(url_types)
-        data = response_types.json()
-        types = data['types']
+        types = get_animal_types()
     except KeyError:
         refresh_token()
         flash('Sorry! The session has timed out. Please try your search again.', "danger")
         return redirect(f'/animals/{page_num}')    
     
-         
-    name = request.args.get("name")
-    type = request.args.get("type")
-    gender = request.args.get('gender')
           
-    params = {"page": page_num, "limit": 42}
+    params = {"page": page_num, "limit": PAGE_SIZE}
     
     if type:
         params["type"] = type
@@ -341,21 +404,22 @@ def list_animals(page_num):
     if gender:
         params["gender"] = gender
 
+    if current_app.config["STREAM_LISTINGS"]:
+        ensure_fresh_token()
+        animals = Deferred(lambda: fetch_animals(params)[0])
+        cards = Deferred(lambda: render_cards("animals/_card.html", "animal", animals.value()))
+        animal_likes = SavedAnimals.animal_ids_for(g.user.id)
+        return stream_page(key, "animals/index.html", "animal", animals, animal_likes, animals=animals, cards=cards, page_num=page_num + 1, name=name, types=types, type=type, gender=gender)
+
     # if there are no search queries
     if not type and not name and not gender:
         try:
-            url_animals = f"{BASE_URL}/animals"
-            response_animals = make_api_request(url_animals, params=params)
-            data = response_animals.json()
-            animals = data['animals']
-
-        
-            for animal in animals:
-                if animal.get("description") != None:
-                    animal.update({"description": html.unescape(html.unescape(animal.get('description')))})        
-            animal_likes = [int(saved_animal.id) for saved_animal in g.user.animal_likes]
+            animals, _ = fetch_animals(params)
+            cards = render_cards("animals/_card.html", "animal", animals)
+            page = cache_page(key, "animals/index.html", [("animal", animal.id) for animal in animals], animals=animals, cards=cards, page_num=page_num + 1, name=name, types=types, type=type, gender=gender)
+            animal_likes = SavedAnimals.animal_ids_for(g.user.id)
 
-            return render_template("animals/index.html", animals=animals, page_num=page_num + 1, animal_likes=animal_likes, name=name, types=types, type=type, gender=gender, html=html)
+            return send_page(page, animal_likes)
         except KeyError:
                 refresh_token()
                 return redirect(f'/animals/{page_num}')   
@@ -363,23 +427,19 @@ def list_animals(page_num):
     # if there are search queries     
     if type or name or gender:
         try:
-            url_animals = f"{BASE_URL}/animals"
-            response_animals = make_api_request(url_animals, params=params)
-            data = response_animals.json()
-            animals = data['animals']
-
-            for animal in animals:
-                if animal.get("description") != None:
-                    animal.update({"description": html.unescape(html.unescape(animal.get('description')))})        
-                    print(html.unescape(animal.get('description')))
-            animal_likes = [int(saved_animal.id) for saved_animal in g.user.animal_likes]
-
-            return render_template("animals/index.html", animals=animals, page_num=page_num + 1, animal_likes=animal_likes, name=name, types=types, type=type, gender=gender, html=html)
+            animals, _ = fetch_animals(params)
+
+            cards = render_cards("animals/_card.html", "animal", animals)
+            page = cache_page(key, "animals/index.html", [("animal", animal.id) for animal in animals], animals=animals, cards=cards, page_num=page_num + 1, name=name, types=types, type=type, gender=gender)
+            animal_likes = SavedAnimals.animal_ids_for(g.user.id)
+
+            return send_page(page, animal_likes)
         except KeyError:
             session['animalNotFound'] = True
             return redirect('/animals/1')  
 
-@app.route("/animal/details/<animal_id>")
+@views.route("/animal/details/<animal_id>")
+@budget(queries=1, upstream=1, ms=200)
 def animal_details(animal_id):
     """Page with details of an animal from API.
     """
@@ -389,17 +449,19 @@ def animal_details(animal_id):
         return redirect("/login")
     
     try:
-        url = f"{BASE_URL}/animals/{animal_id}"
+        url = f"{petfinder.BASE_URL}/animals/{animal_id}"
         res = make_api_request(url)
         data = res.json()
         animal = data['animal']
-        return render_template("animals/details.html", animal=animal)
+        etag = etag_for(etag_for(res.content), g.user.id)
+        return conditional_response(etag, lambda: render_template("animals/details.html", animal=animal))
     except KeyError:
         flash("Sorry, looks like this animal doesn't exist or your session timed out. Please try searching something else or search again.", 'danger')
         return redirect('/animals/1')
 
 
-@app.route("/organization/details/<org_id>")
+@views.route("/organization/details/<org_id>")
+@budget(queries=1, upstream=1, ms=200)
 def organization_details(org_id):
     """Page with details of an organization from API.
     """
@@ -408,161 +470,53 @@ def organization_details(org_id):
         flash("Please login first!", "danger")
         return redirect("/login")
     try:
-        url = f"{BASE_URL}/organizations/{org_id}"
+        url = f"{petfinder.BASE_URL}/organizations/{org_id}"
         res = make_api_request(url)
         data = res.json()
         organization = data['organization']
-        return render_template("organizations/details.html", org=organization)
+        etag = etag_for(etag_for(res.content), g.user.id)
+        return conditional_response(etag, lambda: render_template("organizations/details.html", org=organization))
     except KeyError:
         flash("Sorry, looks like this organization doesn't exist or your session timed out. Please try searching something else or search again.", 'danger')
         return redirect('/organizations/1')
         
     
 
-@app.route("/animal/save/<animal_id>", methods=["POST"])
+@views.route("/animal/save/<animal_id>", methods=["POST"])
+@budget(queries=4, upstream=1, ms=200)
 def add_to_saved_animals(animal_id):
     """add to saved animals."""
     if not g.user:
         flash("Please login first!", "danger")
         return redirect("/login")
     else:
-        animal = Animal.query.get(animal_id)
-
-        if animal == None:
-            get_animal = get_the_animal(animal_id)
-            # this is to check if the token has expired so to refresh the page again
-            if get_animal is None:
-                return redirect(request.referrer)
-            else:
-                new_animal = Animal(
-                    id=animal_id,
-                    name=get_animal["name"],
-                    img_url=get_animal["img_url"],
-                    description=get_animal["description"],
-                )
-                db.session.add(new_animal)
-                db.session.commit()
-                new_user_animal = SavedAnimals(user_id=g.user.id, animal_id=animal_id)
-                db.session.add(new_user_animal)
-                db.session.commit()
-        else:
-            liked_animal = Animal.query.get_or_404(animal_id)
-            animal_likes = g.user.animal_likes
-            
-            if liked_animal in animal_likes:
-                g.user.animal_likes = [animal for animal in animal_likes if animal != liked_animal]
-            else:
-                g.user.animal_likes.append(liked_animal)
-            db.session.commit()
-        
+        # None means the token has expired, so refresh the page to try again
+        if toggle_animal_like(g.user.model, animal_id) is None:
+            flash("Sorry! The session has timed out. Please try clicking the heart again.", "danger")
+
         return redirect(request.referrer)
     
-@app.route("/organization/save/<org_id>", methods=["POST"])
+@views.route("/organization/save/<org_id>", methods=["POST"])
+@budget(queries=4, upstream=1, ms=200)
 def add_to_saved_orgs(org_id):
     """add to saved organizations."""
     if not g.user:
         flash("Please login first!", "danger")
         return redirect("/login")
     else:
-        org = Organization.query.get(org_id)
-        
-
-        if org == None:
-            get_org = get_the_org(org_id)
-            # this is to check if the token has expired so to refresh the page again
-            if get_org is None:
-                return redirect(request.referrer)
-            new_org = Organization(
-                id=org_id,
-                name=get_org["name"],
-                img_url=get_org["img_url"],
-                mission_statement=get_org["mission_statement"],
-            )
-            db.session.add(new_org)
-            db.session.commit()
-            new_user_org = SavedOrgs(user_id=g.user.id, org_id=org_id)
-            db.session.add(new_user_org)
-            db.session.commit()
-        else:
-            liked_org = Organization.query.get_or_404(org_id)
-            org_likes = g.user.org_likes
-            
-            if liked_org in org_likes:
-                g.user.org_likes = [org for org in org_likes if org != liked_org]
-            else:
-                g.user.org_likes.append(liked_org)
-            db.session.commit()
-        return redirect(request.referrer)
-
-
-
-def get_the_org(org_id):
-    """get the details for an organizationn"""
-    org = Organization.query.get(
-        org_id
-    )  # see if we have it in the db and if not call the api
-
-    if org is None:
-        try:
-            url = f"{BASE_URL}/organizations/{org_id}"
-            res = make_api_request(url)
-            data = res.json()
-            j_org = data['organization']
-          
-            org = {
-                "id": org_id,
-                "name": j_org["name"],
-                "mission_statement": j_org["mission_statement"],
-            }
-            
-            if len(j_org['photos']) == 0:
-                org['img_url'] = 'https://img.freepik.com/free-vector/cute-dog-sitting-cartoon-vector-icon-illustration-animal-nature-icon-concept-isolated-premium-vector-flat-cartoon-style_138676-3671.jpg'
-            else:
-                org['img_url'] = j_org["photos"][0]["medium"]
-           
-            return org
-        except Exception:
+        # None means the token has expired, so refresh the page to try again
+        if toggle_org_like(g.user.model, org_id) is None:
             flash("Sorry! The session has timed out. Please try clicking the heart again.", "danger")
-            return    
-    return org
 
-def get_the_animal(animal_id):
-    """get the details for an animal when we are not sure if the animal is within our database"""
-    animal = Organization.query.get(
-        animal_id
-    )  # see if we have it in the db and if not call the api
+        return redirect(request.referrer)
 
-    if animal == None:
-        try:
-            url = f"{BASE_URL}/animals/{animal_id}"
-            res = make_api_request(url)
-            data = res.json()
-            j_animal = data['animal']
-            
-            animal = {
-                "id": animal_id,
-                "name": j_animal["name"],
-                "description": j_animal["description"],
-            }
-            
-            if len(j_animal['photos']) == 0:
-                animal['img_url'] = 'https://img.freepik.com/free-vector/cute-dog-sitting-cartoon-vector-icon-illustration-animal-nature-icon-concept-isolated-premium-vector-flat-cartoon-style_138676-3671.jpg'
-            else:
-                animal['img_url'] = j_animal["photos"][0]["medium"]
-            
-            
-            return animal
-        
-        except Exception:
-            flash("Sorry! The session has timed out. Please try clicking the heart again.", "danger")
-            return    
-    return animal
 
 ##############################################################################
 # Homepage and error pages
 
 
-@app.route("/")
+@views.route("/")
+@budget(queries=1, upstream=0)
 def homepage():
     """Show homepage:
     """
@@ -572,36 +526,34 @@ def homepage():
         return render_template("home.html")
 
     else:
-        return render_template("home-anon.html")
+        key = page_key("home-anon")
+        page = page_cache.get(key) or cache_page(key, "home-anon.html")
+        return send_page(page)
     
-@app.errorhandler(404)
+@views.app_errorhandler(404)
 def page_not_found():
     """Handling 404 errors"""
     flash("Page not found. You are being redirected to the home page.", "danger")
     return redirect('/')
 
-@app.errorhandler(405)
+@views.app_errorhandler(405)
 def method_not_allowed_error():
     """Handling 405 errors"""
     flash("Method not allowed. You are being redirected to the home page.", "danger")
     return redirect('/')
 
-@app.errorhandler(Exception)
+@views.app_errorhandler(Exception)
 def handle_exception():
     """Handling any other unexpected errors"""
     flash("An unexpected error occured. You are being redirected to the home page.", 'danger')
     return redirect('/')
 
 ##############################################################################
-# Turn off all caching in Flask
+# HTTP caching
 
-@app.after_request
+@views.after_app_request
 def add_header(req):
-    """Add non-caching headers on every request."""
+    """Add the route's Cache-Control policy to every response."""
 
-    req.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    req.headers["Pragma"] = "no-cache"
-    req.headers["Expires"] = "0"
-    req.headers["Cache-Control"] = "public, max-age=0"
-    return req
+    return apply_cache_control(req)
 
@@ -0,0 +1,179 @@
+"""Fingerprinted, precompressed static assets.
+
+`python assets.py` copies everything under static/ into static/dist/ with a
+content hash in each file name, minifies the CSS, writes gzip (and, if the
+brotli package is installed, brotli) variants next to each compressible file,
+and records the mapping in static/dist/manifest.json.
+
+Templates link assets through `asset_url`, and the app serves static/dist/
+with a year-long immutable Cache-Control, picking the precompressed variant
+the browser accepts. Without a build, `asset_url` falls back to plain
+/static/ urls.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Images like png are already compressed; compressing them again only costs.
+COMPRESSIBLE = {".css", ".js", ".svg", ".ico", ".txt", ".json"}
+
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+CSS_SPACE_RE = re.compile(r"\s+")
+CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*")
+CSS_URL_RE = re.compile(r"""url\(["']?/static/([^"')]+)["']?\)""")
+
+_manifest = {}
+
+
+def minify_css(css):
+    """Strip comments and whitespace from a stylesheet."""
+
+    css = CSS_COMMENT_RE.sub("", css)
+    css = CSS_SPACE_RE.sub(" ", css)
+    css = CSS_PUNCT_RE.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def rewrite_css_urls(css, manifest):
+    """Point /static/ urls in a stylesheet at their fingerprinted copies."""
+
+    def replace(match):
+        hashed = manifest.get(match.group(1))
+        if hashed is None:
+            return match.group(0)
+        return f'url("/static/dist/{hashed}")'
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def fingerprint(path, content):
+    """`stylesheets/style.css` -> `stylesheets/style.<hash>.css`."""
+
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest}{ext}"
+
+
+def write_variants(dest, content):
+    """Write `content` to `dest` plus its precompressed variants."""
+
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(dest, "wb") as f:
+        f.write(content)
+
+    if os.path.splitext(dest)[1] not in COMPRESSIBLE:
+        return
+
+    # mtime=0 keeps the gzip bytes identical between builds.
+    with open(dest + ".gz", "wb") as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(dest + ".br", "wb") as f:
+            f.write(brotli.compress(content, quality=11))
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Build static/dist/ and its manifest. Returns the manifest."""
+
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+
+    paths = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_dir]
+        for name in files:
+            source = os.path.join(root, name)
+            paths.append(os.path.relpath(source, static_dir).replace(os.sep, "/"))
+
+    # Stylesheets go last so the images they reference are already hashed.
+    paths.sort(key=lambda path: (path.endswith(".css"), path))
+
+    manifest = {}
+    for path in paths:
+        with open(os.path.join(static_dir, path), "rb") as f:
+            content = f.read()
+        if path.endswith(".css"):
+            css = rewrite_css_urls(content.decode("utf-8"), manifest)
+            content = minify_css(css).encode("utf-8")
+
+        hashed = fingerprint(path, content)
+        write_variants(os.path.join(dist_dir, hashed), content)
+        manifest[path] = hashed
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(dist_dir=DIST_DIR):
+    """Read the manifest of the last build, if there was one."""
+
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(path):
+    """The url of a static asset, fingerprinted when it has been built."""
+
+    hashed = _manifest.get(path)
+    if hashed is None:
+        return url_for("static", filename=path)
+    return url_for("dist_asset", filename=hashed)
+
+
+def accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def dist_asset(filename):
+    """Serve a fingerprinted asset, precompressed when the client allows it."""
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accepts(candidate) and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE
+    return response
+
+
+def init_assets(app):
+    """Register the dist/ route and the `asset_url` template helper."""
+
+    _manifest.clear()
+    _manifest.update(load_manifest())
+    app.add_url_rule("/static/dist/<path:filename>", "dist_asset", dist_asset)
+    app.add_template_global(asset_url)
+
+
+if __name__ == "__main__":
+    built = build()
+    print(f"Built {len(built)} assets into {DIST_DIR}")
@@ -0,0 +1 @@
+"""Benchmarks and a fake Petfinder API to run them against, see run.py."""
@@ -0,0 +1,287 @@
+"""A local stand-in for the Petfinder API.
+
+Serves /oauth2/token, /types, /animals, /organizations and the detail
+endpoints from fixtures generated from a seed, so the same seed always gives
+the same animals. Latency and failures can be injected:
+
+- `latency` / `jitter`: milliseconds added to every response.
+- `error_rate`: share of requests answered with a 500.
+- `expire_rate`: share of requests answered with a 401, as if the token had
+  expired, which the app answers by fetching a new one.
+
+Run it on its own with
+
+    python -m benchmarks.fake_petfinder --port 8001 --latency 80
+
+and point the app at it with API_URL=http://127.0.0.1:8001 and
+TOKEN_URL=http://127.0.0.1:8001/oauth2/token.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+TYPES = ["Dog", "Cat", "Rabbit", "Small & Furry", "Horse", "Bird", "Scales, Fins & Other", "Barnyard"]
+GENDERS = ["Male", "Female"]
+AGES = ["Baby", "Young", "Adult", "Senior"]
+# every state the organization search offers; each one gets organizations
+STATES = [
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DC", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA", "KS",
+    "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
+    "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY",
+]
+NAMES = ["Biscuit", "Luna", "Milo", "Pepper", "Olive", "Ziggy", "Maple", "Otis", "Nala", "Juniper"]
+WORDS = (
+    "friendly playful gentle loyal curious calm energetic shy affectionate "
+    "house-trained loves walks good with kids enjoys naps and treats"
+).split()
+
+
+def paragraph(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def photos(rng, kind, item_id):
+    if rng.random() < 0.1:
+        return []
+    base = f"https://photos.example.com/{kind}/{item_id}"
+    return [{size: f"{base}/{size}.jpg" for size in ("small", "medium", "large", "full")}]
+
+
+def address(rng, state):
+    return {
+        "address1": f"{rng.randint(1, 9999)} Main St",
+        "address2": None,
+        "city": "Springfield",
+        "state": state,
+        "postcode": f"{rng.randint(10000, 99999)}",
+    }
+
+
+class Fixtures:
+    """Generated animals and organizations, by id and in listing order."""
+
+    def __init__(self, seed=0, animals=2000, organizations=300, description_words=60):
+        rng = random.Random(seed)
+
+        self.organizations = []
+        for i in range(organizations):
+            org_id = f"ORG{i:04d}"
+            state = STATES[i % len(STATES)]
+            self.organizations.append({
+                "id": org_id,
+                "name": f"{rng.choice(NAMES)} Rescue {i}",
+                "email": f"{org_id.lower()}@example.com",
+                "phone": "555-0100",
+                "address": address(rng, state),
+                "url": f"https://example.com/org/{org_id}",
+                "mission_statement": paragraph(rng, description_words),
+                "photos": photos(rng, "organizations", org_id),
+            })
+
+        self.animals = []
+        for i in range(animals):
+            animal_id = 10000000 + i
+            org = rng.choice(self.organizations)
+            animal_type = rng.choice(TYPES)
+            self.animals.append({
+                "id": animal_id,
+                "organization_id": org["id"],
+                "url": f"https://example.com/animal/{animal_id}",
+                "type": animal_type,
+                "species": animal_type,
+                "age": rng.choice(AGES),
+                "gender": rng.choice(GENDERS),
+                "name": f"{rng.choice(NAMES)} {i}",
+                "description": paragraph(rng, description_words),
+                "photos": photos(rng, "animals", animal_id),
+                "status": "adoptable",
+                "contact": {"email": org["email"], "phone": org["phone"], "address": org["address"]},
+            })
+
+        self.animals_by_id = {str(animal["id"]): animal for animal in self.animals}
+        self.organizations_by_id = {org["id"]: org for org in self.organizations}
+
+
+class FakePetfinderServer(ThreadingHTTPServer):
+    """The fake API: fixtures plus injected latency and failures."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), fixtures=None, latency=0, jitter=0,
+                 error_rate=0.0, expire_rate=0.0, seed=0):
+        super().__init__(address, FakePetfinderHandler)
+        self.fixtures = fixtures or Fixtures(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.expire_rate = expire_rate
+        self.rng = random.Random(seed)
+        self.tokens = set()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] += 1
+
+    def new_token(self):
+        with self._lock:
+            token = f"fake-{len(self.tokens)}-{self.rng.random():.12f}"
+            self.tokens.add(token)
+        return token
+
+    def roll(self):
+        with self._lock:
+            return self.rng.random()
+
+    def delay(self):
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self.rng.uniform(0, self.jitter)
+            time.sleep((self.latency + extra) / 1000)
+
+
+class FakePetfinderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def problem(self, status, title):
+        self.send_json(status, {"type": "about:blank", "status": status, "title": title})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path.rstrip("/").endswith("/oauth2/token"):
+            self.server.count("token")
+            self.server.delay()
+            token = self.server.new_token()
+            self.send_json(200, {"token_type": "Bearer", "expires_in": 3600, "access_token": token})
+        else:
+            self.problem(404, "Not Found")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part and part != "v2"]
+        args = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = parts[0] if len(parts) == 1 else f"{parts[0]}/detail" if parts else ""
+        self.server.count(endpoint)
+        self.server.delay()
+
+        token = (self.headers.get("Authorization") or "").replace("Bearer ", "", 1)
+        if token not in self.server.tokens:
+            return self.problem(401, "Unauthorized")
+        roll = self.server.roll()
+        if roll < self.server.error_rate:
+            return self.problem(500, "Internal Server Error")
+        if roll < self.server.error_rate + self.server.expire_rate:
+            self.server.tokens.discard(token)
+            return self.problem(401, "Unauthorized")
+
+        fixtures = self.server.fixtures
+        if parts == ["types"]:
+            return self.send_json(200, {"types": [{"name": name} for name in TYPES]})
+        if parts == ["animals"]:
+            return self.listing("animals", fixtures.animals, args, self.animal_matches)
+        if parts == ["organizations"]:
+            return self.listing("organizations", fixtures.organizations, args, self.org_matches)
+        if len(parts) == 2 and parts[0] == "animals":
+            animal = fixtures.animals_by_id.get(parts[1])
+            return self.send_json(200, {"animal": animal}) if animal else self.problem(404, "Not Found")
+        if len(parts) == 2 and parts[0] == "organizations":
+            org = fixtures.organizations_by_id.get(parts[1])
+            return self.send_json(200, {"organization": org}) if org else self.problem(404, "Not Found")
+        self.problem(404, "Not Found")
+
+    @staticmethod
+    def animal_matches(animal, args):
+        return (
+            (not args.get("type") or animal["type"].lower() == args["type"].lower())
+            and (not args.get("gender") or animal["gender"].lower() == args["gender"].lower())
+            and (not args.get("name") or args["name"].lower() in animal["name"].lower())
+        )
+
+    @staticmethod
+    def org_matches(org, args):
+        return (
+            (not args.get("state") or org["address"]["state"] == args["state"].upper())
+            # the fake has no map, so any postcode counts as near everything
+            and (not args.get("location") or args["location"].isdigit()
+                 or args["location"].upper() in (org["address"]["state"], org["address"]["city"].upper()))
+        )
+
+    def listing(self, kind, items, args, matches):
+        if kind == "animals" and args.get("type") and args["type"].lower() not in [t.lower() for t in TYPES]:
+            return self.problem(400, "Invalid Request")
+        try:
+            page = max(int(args.get("page", 1)), 1)
+            limit = min(max(int(args.get("limit", 20)), 1), 100)
+        except ValueError:
+            return self.problem(400, "Invalid Request")
+
+        matched = [item for item in items if matches(item, args)]
+        total_pages = max((len(matched) + limit - 1) // limit, 1)
+        page_items = matched[(page - 1) * limit:page * limit]
+        self.send_json(200, {
+            kind: page_items,
+            "pagination": {
+                "count_per_page": limit,
+                "total_count": len(matched),
+                "current_page": page,
+                "total_pages": total_pages,
+            },
+        })
+
+
+def start(**options):
+    """Start a FakePetfinderServer in a background thread and return it."""
+
+    server = FakePetfinderServer(**options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Petfinder API.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0, help="ms added to each response")
+    parser.add_argument("--jitter", type=float, default=0, help="up to this many more ms, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--expire-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakePetfinderServer(
+        ("127.0.0.1", args.port), latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, expire_rate=args.expire_rate, seed=args.seed,
+    )
+    print(f"Fake Petfinder API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Load test: many simulated users going through the site concurrently.
+
+Each virtual user signs up, then repeats journeys picked from --mix with
+random think times between steps:
+
+- browse: the animal listing, a filtered search, a few more pages, details.
+- like: browse a little, heart an animal, look at their saved animals.
+- organizations: the organization listing, a state search, details, a heart.
+
+With --spawn the tool starts the fake Petfinder API and a gunicorn running
+the app against it (and against --database-url), so upstream calls can be
+counted; otherwise it drives the app at --url, which must already be pointed
+at a fake API.
+
+--users takes a comma-separated ramp, e.g. 10,20,40,80: each stage runs for
+--duration seconds, and throughput flattening while p95 climbs marks the
+saturation point of the worker configuration.
+
+    python -m benchmarks.load --spawn --workers 4 --users 10,20,40 --duration 30
+"""
+
+import argparse
+import itertools
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from benchmarks import fake_petfinder
+from benchmarks.stats import RouteStats, format_table
+
+TYPES = ["Dog", "Cat", "Rabbit", "Bird"]
+GENDERS = ["male", "female"]
+STATES = ["CA", "NY", "TX", "WA"]
+JOURNEYS = ("browse", "like", "organizations")
+
+ANIMAL_LINK_RE = re.compile(r"/animal/details/(\d+)")
+ORG_LINK_RE = re.compile(r"/organization/details/([\w-]+)")
+USER_LINK_RE = re.compile(r'href="/users/(\d+)"')
+CSRF_RE = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+usernames = itertools.count()
+
+
+class Report:
+    """RouteStats per journey step, shared by every virtual user."""
+
+    def __init__(self):
+        self.steps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, ok):
+        with self._lock:
+            if step not in self.steps:
+                self.steps[step] = RouteStats(step)
+            self.steps[step].record(seconds, ok)
+
+    def summary(self, elapsed):
+        return {name: stats.summary(elapsed) for name, stats in self.steps.items()}
+
+
+class VirtualUser:
+    """One simulated visitor with their own cookies."""
+
+    def __init__(self, base_url, report, think, rng):
+        self.base_url = base_url
+        self.report = report
+        self.think_time = think
+        self.rng = rng
+        self.session = requests.Session()
+        self.user_id = None
+        self.animal_ids = []
+        self.org_ids = []
+
+    def request(self, step, method, path, ok_statuses=(200,), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, allow_redirects=False,
+                headers={"Referer": self.base_url + "/animals/1"}, timeout=30, **kwargs
+            )
+            ok = response.status_code in ok_statuses
+        except requests.RequestException:
+            response, ok = None, False
+        self.report.record(step, time.perf_counter() - start, ok)
+        return response
+
+    def get(self, step, path):
+        response = self.request(step, "GET", path)
+        if response is not None:
+            self.animal_ids = ANIMAL_LINK_RE.findall(response.text) or self.animal_ids
+            self.org_ids = ORG_LINK_RE.findall(response.text) or self.org_ids
+        return response
+
+    def post(self, step, path):
+        return self.request(step, "POST", path, ok_statuses=(302,))
+
+    def think(self):
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+
+    def signup(self):
+        page = self.request("signup_form", "GET", "/signup")
+        csrf = CSRF_RE.search(page.text) if page is not None else None
+        name = f"load{os.getpid()}x{next(usernames)}"
+        self.request("signup", "POST", "/signup", ok_statuses=(302,), data={
+            "username": name,
+            "email": f"{name}@example.com",
+            "password": "loadpassword",
+            "csrf_token": csrf.group(1) if csrf else "",
+        })
+        home = self.request("home", "GET", "/")
+        match = USER_LINK_RE.search(home.text) if home is not None else None
+        self.user_id = match.group(1) if match else None
+
+    # journeys
+
+    def browse(self):
+        self.get("animals", "/animals/1")
+        self.think()
+        self.get("animals_search", f"/animals/1?type={self.rng.choice(TYPES)}&gender={self.rng.choice(GENDERS)}")
+        self.think()
+        for page in range(2, self.rng.randint(2, 5)):
+            self.get("animals_page", f"/animals/{page}")
+            self.think()
+        if self.animal_ids:
+            self.get("animal_details", f"/animal/details/{self.rng.choice(self.animal_ids)}")
+            self.think()
+
+    def like(self):
+        self.get("animals", f"/animals/{self.rng.randint(1, 3)}")
+        self.think()
+        if self.animal_ids:
+            self.post("save_animal", f"/animal/save/{self.rng.choice(self.animal_ids)}")
+            self.think()
+        if self.user_id:
+            self.get("saved_animals", f"/users/{self.user_id}/animals")
+            self.think()
+
+    def organizations(self):
+        self.get("organizations", "/organizations/1")
+        self.think()
+        self.get("organizations_search", f"/organizations/1?state={self.rng.choice(STATES)}")
+        self.think()
+        if self.org_ids:
+            org_id = self.rng.choice(self.org_ids)
+            self.get("organization_details", f"/organization/details/{org_id}")
+            self.think()
+            self.post("save_org", f"/organization/save/{org_id}")
+            self.think()
+
+    def run(self, mix, stop_at):
+        self.signup()
+        journeys, weights = zip(*mix.items())
+        while time.time() < stop_at:
+            getattr(self, self.rng.choices(journeys, weights)[0])()
+
+
+def parse_mix(text):
+    """"browse=6,like=3" -> {"browse": 6.0, "like": 3.0}."""
+
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in JOURNEYS:
+            raise SystemExit(f"Unknown journey: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def statements_executed(database_url):
+    """Statements Postgres has run (or transactions, without pg_stat_statements)."""
+
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT sum(calls) FROM pg_stat_statements")
+                return "statements", int(cur.fetchone()[0] or 0)
+            except psycopg2.Error:
+                conn.rollback()
+                cur.execute(
+                    "SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database()"
+                )
+                return "transactions", int(cur.fetchone()[0])
+    finally:
+        conn.close()
+
+
+def spawn_app(api_url, database_url, port, workers, worker_class, threads):
+    env = dict(
+        os.environ,
+        API_URL=api_url,
+        TOKEN_URL=f"{api_url}/oauth2/token",
+        DATABASE_URL=database_url,
+        SECRET_KEY=os.environ.get("SECRET_KEY", "load-test"),
+        CLIENT_ID="load-test",
+        CLIENT_SECRET="load-test",
+    )
+    # the tables have to exist before the first signup
+    subprocess.run([sys.executable, "-c", "from app import create_app; from models import db; create_app(); db.create_all()"], env=env, check=True)
+    process = subprocess.Popen([
+        sys.executable, "-m", "gunicorn", "app:create_app()",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--worker-class", worker_class,
+        "--threads", str(threads),
+    ], env=env)
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(url + "/login", timeout=1)
+            return process, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("gunicorn did not start")
+
+
+def run_stage(url, users, duration, mix, think, seed):
+    report = Report()
+    stop_at = time.time() + duration
+    threads = [
+        threading.Thread(target=VirtualUser(url, report, think, random.Random(seed + i)).run, args=(mix, stop_at))
+        for i in range(users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return report.summary(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent users going through the site.")
+    parser.add_argument("--users", default="10", help="concurrent users, or a ramp like 10,20,40")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per stage")
+    parser.add_argument("--mix", default="browse=6,like=3,organizations=1")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", action="store_true", help="start the fake API and gunicorn")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=50, help="ms the fake API adds to each response")
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("BENCH_DATABASE_URL", "postgresql:///adopt_a_pet_bench"),
+    )
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server = process = None
+    url = args.url
+    if args.spawn:
+        server = fake_petfinder.start(latency=args.latency)
+        process, url = spawn_app(
+            server.url, args.database_url, args.port, args.workers, args.worker_class, args.threads
+        )
+
+    try:
+        for users in [int(n) for n in args.users.split(",")]:
+            upstream_before = sum(server.counts.values()) if server else None
+            try:
+                db_kind, db_before = statements_executed(args.database_url)
+            except Exception:
+                db_kind = db_before = None
+
+            results = run_stage(url, users, args.duration, mix, args.think, args.seed)
+
+            requests_made = sum(s["requests"] for s in results.values())
+            errors = sum(s["errors"] for s in results.values())
+            print(f"\n== {users} users, {args.duration:.0f}s ==")
+            print(format_table(results))
+            print(
+                f"total: {requests_made / args.duration:.1f} req/s, "
+                f"errors {errors / requests_made:.1%}" if requests_made else "total: no requests"
+            )
+            if server:
+                print(f"upstream calls: {sum(server.counts.values()) - upstream_before}")
+            if db_kind:
+                print(f"database {db_kind}: {statements_executed(args.database_url)[1] - db_before}")
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        if server:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
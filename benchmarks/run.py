@@ -0,0 +1,216 @@
+"""Per-route benchmarks against the fake Petfinder API.
+
+Starts benchmarks.fake_petfinder in this process, points the app at it and
+at a scratch database, then requests each route `--requests` times from
+`--concurrency` threads and prints throughput and p50/p95/p99 latency.
+
+By default requests go through Flask's test client, in process. With --url
+they go over HTTP to an app already running there (say under gunicorn), which
+must itself be pointed at a fake API, e.g. one started with
+`python -m benchmarks.fake_petfinder`.
+
+    python -m benchmarks.run --requests 300 --latency 50
+    python -m benchmarks.run --save before
+    python -m benchmarks.run --compare before
+
+--cold empties the app's caches before every request, to measure the
+uncached paths.
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+
+from benchmarks import fake_petfinder
+from benchmarks.stats import RouteStats, compare, format_table, load_baseline, save_baseline
+
+ANIMAL_IDS = [str(10000000 + i) for i in range(0, 2000, 7)]
+ORG_IDS = [f"ORG{i:04d}" for i in range(0, 300, 3)]
+
+# name -> (method, path for the nth request)
+ROUTES = {
+    "list_animals": ("GET", lambda n: f"/animals/{n % 5 + 1}"),
+    "list_animals_filtered": ("GET", lambda n: f"/animals/1?type={['Dog', 'Cat', 'Bird'][n % 3]}&gender=Female"),
+    "list_organizations": ("GET", lambda n: f"/organizations/{n % 5 + 1}"),
+    "animal_details": ("GET", lambda n: f"/animal/details/{ANIMAL_IDS[n % len(ANIMAL_IDS)]}"),
+    "organization_details": ("GET", lambda n: f"/organization/details/{ORG_IDS[n % len(ORG_IDS)]}"),
+    "save_animal": ("POST", lambda n: f"/animal/save/{ANIMAL_IDS[n % 20]}"),
+    "save_org": ("POST", lambda n: f"/organization/save/{ORG_IDS[n % 20]}"),
+    "api_animals": ("GET", lambda n: f"/api/v1/animals?type={['Dog', 'Cat'][n % 2]}"),
+}
+
+BENCH_USER = {"username": "benchuser", "email": "bench@example.com", "password": "benchpassword"}
+
+
+def configure_environment(api_url, database_url):
+    """Point the app at the fake API and the scratch database.
+
+    Must run before the app is created, since it reads these then.
+    """
+
+    os.environ["API_URL"] = api_url
+    os.environ["TOKEN_URL"] = f"{api_url}/oauth2/token"
+    os.environ.setdefault("CLIENT_ID", "benchmark")
+    os.environ.setdefault("CLIENT_SECRET", "benchmark")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("SESSION_BACKEND", "memory")
+
+
+class InProcessClient:
+    """Requests through Flask's test client, logged in as the bench user."""
+
+    def __init__(self, app, user_id, session_key):
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess[session_key] = user_id
+
+    def request(self, method, path):
+        response = self.client.open(path, method=method, headers={"Referer": "/animals/1"})
+        return response.status_code
+
+
+class HTTPClient:
+    """Requests over HTTP to a running app, logged in through /login."""
+
+    def __init__(self, base_url):
+        import requests
+
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["Referer"] = f"{self.base_url}/animals/1"
+        self.login()
+
+    def csrf_token(self, path):
+        page = self.session.get(self.base_url + path).text
+        match = re.search(r'name="csrf_token"[^>]*value="([^"]+)"', page)
+        return match.group(1) if match else None
+
+    def login(self):
+        for path in ("/signup", "/login"):
+            data = dict(BENCH_USER, csrf_token=self.csrf_token(path))
+            self.session.post(self.base_url + path, data=data, allow_redirects=False)
+
+    def request(self, method, path):
+        response = self.session.request(method, self.base_url + path, allow_redirects=False)
+        return response.status_code
+
+
+def clear_caches():
+    import petfinder
+    from fragments import card_cache
+    from page_cache import page_cache
+
+    page_cache.clear()
+    card_cache.clear()
+    petfinder.listing_cache.clear()
+
+
+def run_route(name, make_client, requests_per_route, concurrency, cold):
+    method, path_for = ROUTES[name]
+    stats = RouteStats(name)
+    counter = iter(range(requests_per_route))
+    lock = threading.Lock()
+
+    def worker():
+        client = make_client()
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            if cold:
+                clear_caches()
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path_for(n))
+                ok = status < 400 and not (method == "GET" and status == 302)
+            except Exception:
+                ok = False
+            stats.record(time.perf_counter() - start, ok)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.summary(time.perf_counter() - start)
+
+
+def setup_database():
+    """Fresh tables and the bench user; returns the user's id."""
+
+    from models import db, User
+
+    db.drop_all()
+    db.create_all()
+    user = User.signup(**BENCH_USER)
+    db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes against a fake Petfinder API.")
+    parser.add_argument("routes", nargs="*", default=list(ROUTES), choices=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0, help="ms the fake API adds to each response")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--expire-rate", type=float, default=0.0)
+    parser.add_argument("--cold", action="store_true", help="clear the app's caches before each request")
+    parser.add_argument("--url", help="benchmark the app running at this URL instead of in process")
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("BENCH_DATABASE_URL", "postgresql:///adopt_a_pet_bench"),
+    )
+    parser.add_argument("--save", metavar="NAME", help="save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        def make_client():
+            return HTTPClient(args.url)
+    else:
+        server = fake_petfinder.start(
+            latency=args.latency, jitter=args.jitter,
+            error_rate=args.error_rate, expire_rate=args.expire_rate,
+        )
+        configure_environment(server.url, args.database_url)
+        from app import create_app, CURR_USER_KEY
+
+        app = create_app()
+
+        with app.app_context():
+            user_id = setup_database()
+
+        def make_client():
+            return InProcessClient(app, user_id, CURR_USER_KEY)
+
+    results = {}
+    for name in args.routes:
+        results[name] = run_route(name, make_client, args.requests, args.concurrency, args.cold and not args.url)
+
+    print(format_table(results))
+    if server is not None:
+        print(f"\nupstream calls: {dict(server.counts)}")
+        server.shutdown()
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"saved baseline {args.save}")
+    if args.compare:
+        lines, regressed = compare(results, load_baseline(args.compare), args.threshold)
+        print("\n".join(lines))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
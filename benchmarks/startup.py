@@ -0,0 +1,130 @@
+"""Start-up time of the app: what every gunicorn worker and test module pays.
+
+Starts a fresh interpreter `--runs` times per profile, and in each times
+`import app` and then `create_app(profile)`, alongside the whole process
+from exec to exit. Nothing connects to the database or the Petfinder API, so
+neither needs to be running.
+
+    python -m benchmarks.startup --runs 20
+    python -m benchmarks.startup --profiles production,test --save before
+    python -m benchmarks.startup --compare before --importtime 15
+
+--importtime N also lists the N modules that take longest to import
+themselves, from `python -X importtime`. The run fails if the production
+profile ever loads the debug toolbar.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stats import RouteStats, compare, format_table, load_baseline, save_baseline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "toolbar": "flask_debugtoolbar" in sys.modules,
+}))
+"""
+
+
+def child_environment(database_url):
+    return dict(os.environ, DATABASE_URL=database_url, SECRET_KEY=os.environ.get("SECRET_KEY", "startup"))
+
+
+def measure(profile, runs, env):
+    """RouteStats for the import, create_app and whole process of `runs` starts."""
+
+    stats = {
+        name: RouteStats(f"{name} ({profile})") for name in ("import", "create_app", "process")
+    }
+    toolbar = False
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", CHILD, profile], cwd=ROOT, env=env,
+            stdout=subprocess.PIPE, check=True, universal_newlines=True,
+        ).stdout
+        stats["process"].record(time.perf_counter() - start)
+        timings = json.loads(output.strip().splitlines()[-1])
+        stats["import"].record(timings["import"])
+        stats["create_app"].record(timings["create_app"])
+        toolbar = toolbar or timings["toolbar"]
+    return stats, toolbar
+
+
+def slowest_imports(env, limit):
+    """[(self ms, cumulative ms, module)] of the `limit` slowest imports of `import app`."""
+
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+        stderr=subprocess.PIPE, check=True, universal_newlines=True,
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        modules.append((int(self_us) / 1000, int(cumulative_us) / 1000, module.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time importing and creating the app.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--profiles", default="production,test,development")
+    parser.add_argument(
+        "--database-url",
+        default=os.environ.get("BENCH_DATABASE_URL", "postgresql:///adopt_a_pet_bench"),
+        help="only used to build the engine; never connected to",
+    )
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="list the N slowest imports")
+    parser.add_argument("--save", metavar="NAME", help="save the results as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with baseline NAME")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before a regression")
+    args = parser.parse_args()
+
+    env = child_environment(args.database_url)
+    results = {}
+    toolbar_in_production = False
+    for profile in args.profiles.split(","):
+        started = time.perf_counter()
+        stats, toolbar = measure(profile, args.runs, env)
+        elapsed = time.perf_counter() - started
+        for name, route_stats in stats.items():
+            results[route_stats.name] = route_stats.summary(elapsed)
+        toolbar_in_production = toolbar_in_production or (profile == "production" and toolbar)
+
+    print(format_table(results))
+
+    if args.importtime:
+        print(f"\n{'self ms':>9}{'cumulative ms':>15}  module")
+        for self_ms, cumulative_ms, module in slowest_imports(env, args.importtime):
+            print(f"{self_ms:>9.1f}{cumulative_ms:>15.1f}  {module}")
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"saved baseline {args.save}")
+    if args.compare:
+        lines, regressed = compare(results, load_baseline(args.compare), args.threshold)
+        print("\n".join(lines))
+        if regressed:
+            sys.exit(1)
+    if toolbar_in_production:
+        sys.exit("the production profile loaded flask_debugtoolbar")
+
+
+if __name__ == "__main__":
+    main()
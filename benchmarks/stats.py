@@ -0,0 +1,94 @@
+"""Latency summaries and baseline comparison for the benchmarks."""
+
+import json
+import math
+import os
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def percentile(sorted_values, p):
+    """The nearest-rank `p`th percentile of already sorted values."""
+
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class RouteStats:
+    """Latencies (in seconds) and failures recorded for one route."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+
+    def record(self, seconds, ok=True):
+        self.latencies.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed):
+        """p50/p95/p99 in ms, requests per second over `elapsed` seconds, errors."""
+
+        values = sorted(self.latencies)
+        return {
+            "requests": len(values),
+            "errors": self.errors,
+            "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+            "p50": round(percentile(values, 50) * 1000, 2),
+            "p95": round(percentile(values, 95) * 1000, 2),
+            "p99": round(percentile(values, 99) * 1000, 2),
+        }
+
+
+def format_table(results):
+    """Summaries by route as an aligned text table."""
+
+    lines = [f"{'route':<28}{'requests':>9}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for name, s in results.items():
+        lines.append(
+            f"{name:<28}{s['requests']:>9}{s['errors']:>8}{s['rps']:>9}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name, results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(name), "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_baseline(name):
+    with open(baseline_path(name)) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.10):
+    """Lines describing each route against `baseline`, and whether any regressed.
+
+    A route regresses when its p95 is more than `threshold` slower, or its
+    throughput more than `threshold` lower, than the baseline's.
+    """
+
+    lines = []
+    regressed = False
+    for name, s in results.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f"{name}: no baseline")
+            continue
+        p95_change = (s["p95"] - base["p95"]) / base["p95"] if base["p95"] else 0.0
+        rps_change = (s["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+        worse = p95_change > threshold or rps_change < -threshold
+        regressed = regressed or worse
+        lines.append(
+            f"{name}: p95 {base['p95']} -> {s['p95']} ms ({p95_change:+.0%}), "
+            f"rps {base['rps']} -> {s['rps']} ({rps_change:+.0%}){'  REGRESSED' if worse else ''}"
+        )
+    return lines, regressed
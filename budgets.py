@@ -0,0 +1,155 @@
+"""Per-route budgets for SQL statements, Petfinder calls and time.
+
+A view declares what one request to it may cost:
+
+    @views.route("/animals/<int:page_num>")
+    @budget(queries=2, upstream=2, ms=300)
+    def list_animals(page_num):
+
+and `check_budget` (used by test_budgets.py) makes a request while counting
+every statement the database engines run and every call made through
+petfinder's transport, then fails with the list of statements and calls if
+the route went over. PREPAREs aren't counted, since a connection only runs
+each one once, and neither are the test fixtures' SAVEPOINTs. The time
+budget is meant for runs against the fake Petfinder API with no added
+latency, so it measures the app alone; since wall-clock time depends on the
+machine, going over it is only reported, as a SlowRequest warning.
+
+Budgets cost nothing outside these checks: the decorator only sets an
+attribute on the view.
+"""
+
+import time
+import warnings
+from contextlib import contextmanager
+
+
+# PREPAREs run once per connection; SAVEPOINTs are only issued by the test
+# fixtures in testing.py, which nest each test in one
+UNCOUNTED = ("PREPARE", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+class Budget:
+    """Upper limits for one request; None means no limit."""
+
+    def __init__(self, queries=None, upstream=None, ms=None):
+        self.queries = queries
+        self.upstream = upstream
+        self.ms = ms
+
+    def overruns(self, usage):
+        """[(what, used, allowed, details)] for every limit `usage` went over."""
+
+        found = []
+        if self.queries is not None and len(usage.statements) > self.queries:
+            found.append(("queries", len(usage.statements), self.queries, usage.statements))
+        if self.upstream is not None and len(usage.upstream) > self.upstream:
+            found.append(("upstream calls", len(usage.upstream), self.upstream, usage.upstream))
+        if self.ms is not None and usage.ms > self.ms:
+            found.append(("ms", round(usage.ms, 1), self.ms, []))
+        return found
+
+
+def budget(queries=None, upstream=None, ms=None):
+    """Declare the Budget of a view; put it right under @app.route."""
+
+    def decorator(view):
+        view.budget = Budget(queries, upstream, ms)
+        return view
+
+    return decorator
+
+
+class Usage:
+    """What one request did."""
+
+    def __init__(self):
+        self.statements = []
+        self.upstream = []
+        self.ms = 0.0
+
+
+class CountingTransport:
+    """Wraps petfinder's transport, noting each call."""
+
+    def __init__(self, transport, calls):
+        self.transport = transport
+        self.calls = calls
+
+    def request(self, method, url, headers=None, params=None, data=None, json=None):
+        query = "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+        self.calls.append(f"{method} {url}" + (f"?{query}" if query else ""))
+        return self.transport.request(method, url, headers=headers, params=params, data=data, json=json)
+
+
+@contextmanager
+def recording(engines):
+    """Count the statements `engines` run and the Petfinder calls made inside the block."""
+
+    from sqlalchemy import event
+
+    import petfinder
+
+    usage = Usage()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(UNCOUNTED):
+            usage.statements.append(" ".join(statement.split()))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before)
+    transport = petfinder.get_transport()
+    petfinder.transport = CountingTransport(transport, usage.upstream)
+    start = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        usage.ms = (time.perf_counter() - start) * 1000
+        petfinder.transport = transport
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before)
+
+
+class BudgetExceeded(AssertionError):
+    """A request cost more than its route's budget."""
+
+
+class SlowRequest(UserWarning):
+    """A request took longer than its route's time budget."""
+
+
+def report(endpoint, method, path, overruns):
+    lines = [f"{endpoint} ({method} {path}) went over its budget:"]
+    for what, used, allowed, details in overruns:
+        lines.append(f"  {what}: {used}, budget {allowed}")
+        lines.extend(f"    {n}. {detail}" for n, detail in enumerate(details, 1))
+    return "\n".join(lines)
+
+
+def check_budget(app, client, method, path, **kwargs):
+    """Make a request with `client` and raise BudgetExceeded if its route went over.
+
+    Going over the time budget only warns with SlowRequest. Returns the
+    response and the Usage.
+    """
+
+    from engines import pool_metrics
+
+    adapter = app.url_map.bind("localhost")
+    endpoint, _ = adapter.match(path.split("?", 1)[0], method)
+    declared = getattr(app.view_functions[endpoint], "budget", None)
+    if declared is None:
+        raise ValueError(f"{endpoint} has no budget")
+
+    engines = [metrics.engine for metrics in pool_metrics.values()]
+    with recording(engines) as usage:
+        response = client.open(path, method=method, **kwargs)
+
+    overruns = declared.overruns(usage)
+    slow = [overrun for overrun in overruns if overrun[0] == "ms"]
+    if slow:
+        warnings.warn(report(endpoint, method, path, slow), SlowRequest, stacklevel=2)
+    exceeded = [overrun for overrun in overruns if overrun[0] != "ms"]
+    if exceeded:
+        raise BudgetExceeded(report(endpoint, method, path, exceeded))
+    return response, usage
@@ -0,0 +1,246 @@
+"""WSGI middleware compressing dynamic HTML and JSON responses.
+
+Negotiates brotli (when the brotli package is installed) or gzip from
+Accept-Encoding. Buffered responses smaller than `min_size` are sent as is;
+responses without a Content-Length are compressed chunk by chunk and flushed
+after each one, so streamed pages still arrive progressively. Anything that
+already has a Content-Encoding (like the precompressed static assets) is
+passed through untouched.
+"""
+
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# zlib level / brotli quality per content type. Dynamic pages are compressed
+# on every request, so they trade a little ratio for speed.
+GZIP_LEVELS = {
+    "text/html": 6,
+    "application/json": 5,
+    "text/css": 9,
+    "application/javascript": 9,
+    "image/svg+xml": 9,
+    "text/plain": 6,
+}
+BROTLI_QUALITIES = {
+    "text/html": 5,
+    "application/json": 4,
+    "text/css": 11,
+    "application/javascript": 11,
+    "image/svg+xml": 11,
+    "text/plain": 5,
+}
+
+SKIP_STATUSES = ("204", "206", "304")
+
+
+def parse_accept_encoding(header):
+    """`gzip, br;q=0.5` -> {"gzip": 1.0, "br": 0.5}."""
+
+    accepted = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def negotiate(header):
+    """Pick "br", "gzip" or None for an Accept-Encoding header."""
+
+    accepted = parse_accept_encoding(header)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class Compressor:
+    """A streaming gzip or brotli compressor with one interface."""
+
+    def __init__(self, encoding, content_type):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITIES.get(content_type, 5))
+        else:
+            level = GZIP_LEVELS.get(content_type, 6)
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        """Emit everything compressed so far without ending the stream."""
+
+        if self.encoding == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionStats:
+    """Running totals of what the middleware saved."""
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def record(self, bytes_in, bytes_out):
+        with self._lock:
+            self.responses += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    @property
+    def bytes_saved(self):
+        return self.bytes_in - self.bytes_out
+
+
+class CompressionMiddleware:
+    """Wrap a WSGI app so its text responses are compressed."""
+
+    def __init__(self, app, min_size=500):
+        self.app = app
+        self.min_size = min_size
+        self.stats = CompressionStats()
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None or environ.get("REQUEST_METHOD") == "HEAD":
+            return self.app(environ, start_response)
+
+        captured = []
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        chunks = iter(app_iter)
+        head = []
+        # Apps may delay start_response until their first chunk.
+        if not captured:
+            for chunk in chunks:
+                head.append(chunk)
+                if captured:
+                    break
+
+        status, headers, exc_info = captured
+        content_type = self.compressible_type(status, headers)
+        if content_type is None:
+            start_response(status, headers, exc_info)
+            return self.passthrough(app_iter, written + head, chunks)
+
+        length = header_value(headers, "Content-Length")
+        if length is not None:
+            body = b"".join(written + head) + b"".join(chunks)
+            close(app_iter)
+            if len(body) < self.min_size:
+                start_response(status, headers, exc_info)
+                return [body]
+            compressor = Compressor(encoding, content_type)
+            compressed = compressor.compress(body) + compressor.finish()
+            self.stats.record(len(body), len(compressed))
+            start_response(status, compressed_headers(headers, encoding, len(compressed)), exc_info)
+            return [compressed]
+
+        start_response(status, compressed_headers(headers, encoding), exc_info)
+        return self.stream(app_iter, written + head, chunks, Compressor(encoding, content_type))
+
+    def compressible_type(self, status, headers):
+        """The content type to compress as, or None to leave it alone."""
+
+        if status[:3] in SKIP_STATUSES or header_value(headers, "Content-Encoding"):
+            return None
+        content_type = (header_value(headers, "Content-Type") or "").split(";")[0].strip()
+        if content_type not in GZIP_LEVELS:
+            return None
+        return content_type
+
+    def passthrough(self, app_iter, head, chunks):
+        try:
+            yield from head
+            yield from chunks
+        finally:
+            close(app_iter)
+
+    def stream(self, app_iter, head, chunks, compressor):
+        bytes_in = bytes_out = 0
+        try:
+            for source in (head, chunks):
+                for chunk in source:
+                    if not chunk:
+                        continue
+                    bytes_in += len(chunk)
+                    out = compressor.compress(chunk) + compressor.flush()
+                    bytes_out += len(out)
+                    yield out
+            out = compressor.finish()
+            bytes_out += len(out)
+            yield out
+        finally:
+            close(app_iter)
+            self.stats.record(bytes_in, bytes_out)
+
+
+def header_value(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def compressed_headers(headers, encoding, length=None):
+    """Response headers for the compressed body."""
+
+    result = []
+    vary = None
+    for key, value in headers:
+        lowered = key.lower()
+        if lowered == "content-length":
+            continue
+        if lowered == "vary":
+            vary = value
+            continue
+        if lowered == "etag" and not value.startswith("W/"):
+            # the bytes changed, so a strong validator no longer holds
+            value = "W/" + value
+        result.append((key, value))
+
+    if vary is None:
+        vary = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        vary += ", Accept-Encoding"
+    result.append(("Vary", vary))
+    result.append(("Content-Encoding", encoding))
+    if length is not None:
+        result.append(("Content-Length", str(length)))
+    return result
+
+
+def close(app_iter):
+    if hasattr(app_iter, "close"):
+        app_iter.close()
@@ -0,0 +1,159 @@
+"""Settings for `create_app`, by profile.
+
+The app's settings come, in increasing order of precedence, from
+
+- DEFAULTS;
+- the profile, one of PROFILES: "production" (the default), "development"
+  or "test", picked by FLASK_ENV;
+- the environment variables in ENVIRONMENT that are set;
+- whatever is passed to `create_app` itself.
+
+Nothing here is read until an app is created.
+"""
+
+import os
+
+
+def flag(value):
+    return value == "1"
+
+
+def names(value):
+    """A comma separated list, empty items dropped."""
+
+    return [name for name in value.split(",") if name]
+
+
+def int_or_none(value):
+    return int(value) or None
+
+
+DEFAULTS = {
+    "SQLALCHEMY_DATABASE_URI": None,
+    "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    "SQLALCHEMY_ECHO": False,
+    "SQLALCHEMY_POOL_SIZE": 5,
+    "SQLALCHEMY_MAX_OVERFLOW": 5,
+    "SQLALCHEMY_POOL_RECYCLE": 1800,
+    "SQLALCHEMY_POOL_TIMEOUT": 10,
+    "SQLALCHEMY_POOL_PRE_PING": True,
+    "SQLALCHEMY_PGBOUNCER": False,
+    "SQLALCHEMY_PREPARED_STATEMENTS": True,
+    "SQLALCHEMY_REPLICA_URIS": [],
+    "SECRET_KEY": None,
+    "DEBUG_TB_ENABLED": False,
+    "DEBUG_TB_INTERCEPT_REDIRECTS": False,
+    "API_URL": None,
+    "TOKEN_URL": "https://api.petfinder.com/v2/oauth2/token",
+    "CLIENT_ID": None,
+    "CLIENT_SECRET": None,
+    "PETFINDER_TRANSPORT": "live",
+    "PETFINDER_CASSETTE": None,
+    "PETFINDER_REPLAY_SPEED": 0.0,
+    "FRAGMENT_CACHE_SIZE": 5000,
+    "PAGE_CACHE_SIZE": 500,
+    "PAGE_CACHE_TTL": 300,
+    "COMPRESSION_MIN_SIZE": 500,
+    "STREAM_LISTINGS": False,
+    "SESSION_BACKEND": "file",
+    # pick it for a time budget once per deploy with `python passwords.py MS`,
+    # so every worker agrees on the cost
+    "BCRYPT_LOG_ROUNDS": 12,
+    "BCRYPT_WORKERS": None,
+    "BCRYPT_MAX_QUEUE": None,
+    "METRICS_DIR": None,
+    "METRICS_FLUSH_INTERVAL": 1.0,
+    "METRICS_TOKEN": None,
+    "TRACE_SAMPLE_RATE": 0.0,
+    "TRACE_MIN_MS": 0.0,
+    "TRACE_DIR": "traces",
+    "PROFILE_ADMINS": [],
+    "PROFILE_SAMPLE_RATE": 0.0,
+    "PROFILE_DIR": "profiles",
+}
+
+# config key -> (environment variable, parser)
+ENVIRONMENT = {
+    "SQLALCHEMY_DATABASE_URI": ("DATABASE_URL", str),
+    "SQLALCHEMY_POOL_SIZE": ("DB_POOL_SIZE", int),
+    "SQLALCHEMY_MAX_OVERFLOW": ("DB_MAX_OVERFLOW", int),
+    "SQLALCHEMY_POOL_RECYCLE": ("DB_POOL_RECYCLE", int),
+    "SQLALCHEMY_POOL_TIMEOUT": ("DB_POOL_TIMEOUT", int),
+    "SQLALCHEMY_POOL_PRE_PING": ("DB_POOL_PRE_PING", flag),
+    "SQLALCHEMY_PGBOUNCER": ("DB_PGBOUNCER", flag),
+    "SQLALCHEMY_PREPARED_STATEMENTS": ("DB_PREPARED_STATEMENTS", flag),
+    "SQLALCHEMY_REPLICA_URIS": ("DATABASE_REPLICA_URLS", names),
+    "SECRET_KEY": ("SECRET_KEY", str),
+    "API_URL": ("API_URL", str),
+    "TOKEN_URL": ("TOKEN_URL", str),
+    "CLIENT_ID": ("CLIENT_ID", str),
+    "CLIENT_SECRET": ("CLIENT_SECRET", str),
+    "PETFINDER_TRANSPORT": ("PETFINDER_TRANSPORT", str),
+    "PETFINDER_CASSETTE": ("PETFINDER_CASSETTE", str),
+    "PETFINDER_REPLAY_SPEED": ("PETFINDER_REPLAY_SPEED", float),
+    "FRAGMENT_CACHE_SIZE": ("FRAGMENT_CACHE_SIZE", int),
+    "PAGE_CACHE_SIZE": ("PAGE_CACHE_SIZE", int),
+    "PAGE_CACHE_TTL": ("PAGE_CACHE_TTL", int),
+    "COMPRESSION_MIN_SIZE": ("COMPRESSION_MIN_SIZE", int),
+    "STREAM_LISTINGS": ("STREAM_LISTINGS", flag),
+    "SESSION_BACKEND": ("SESSION_BACKEND", str),
+    "SESSION_FILE_DIR": ("SESSION_FILE_DIR", str),
+    "BCRYPT_LOG_ROUNDS": ("BCRYPT_LOG_ROUNDS", int),
+    "BCRYPT_WORKERS": ("BCRYPT_WORKERS", int_or_none),
+    "BCRYPT_MAX_QUEUE": ("BCRYPT_MAX_QUEUE", int),
+    "METRICS_DIR": ("METRICS_DIR", str),
+    "METRICS_FLUSH_INTERVAL": ("METRICS_FLUSH_INTERVAL", float),
+    "METRICS_TOKEN": ("METRICS_TOKEN", str),
+    "TRACE_SAMPLE_RATE": ("TRACE_SAMPLE_RATE", float),
+    "TRACE_MIN_MS": ("TRACE_MIN_MS", float),
+    "TRACE_DIR": ("TRACE_DIR", str),
+    "PROFILE_ADMINS": ("PROFILE_ADMINS", names),
+    "PROFILE_SAMPLE_RATE": ("PROFILE_SAMPLE_RATE", float),
+    "PROFILE_DIR": ("PROFILE_DIR", str),
+}
+
+PROFILES = {
+    # the debug toolbar is never even imported
+    "production": {
+        "ENV": "production",
+        "DEBUG": False,
+    },
+    "development": {
+        "ENV": "development",
+        "DEBUG": True,
+        "DEBUG_TB_ENABLED": True,
+    },
+    # fast hashes, sessions in memory and none of the background writers
+    "test": {
+        "ENV": "test",
+        "SECRET_KEY": "test",
+        "SESSION_BACKEND": "memory",
+        "BCRYPT_LOG_ROUNDS": 4,
+        "METRICS_DIR": None,
+        "TRACE_SAMPLE_RATE": 0.0,
+        "PROFILE_SAMPLE_RATE": 0.0,
+    },
+}
+
+
+def profile_name(environ=os.environ):
+    return environ.get("FLASK_ENV") or "production"
+
+
+def from_environment(environ=os.environ):
+    """The settings of ENVIRONMENT whose variables are set."""
+
+    return {key: parse(environ[name]) for key, (name, parse) in ENVIRONMENT.items() if environ.get(name)}
+
+
+def load(profile=None, overrides=None, environ=os.environ):
+    """The settings of `profile` (FLASK_ENV's by default), environment and `overrides` applied."""
+
+    profile = profile or profile_name(environ)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile: {profile} (expected one of {', '.join(PROFILES)})")
+
+    config = dict(DEFAULTS, **PROFILES[profile])
+    config.update(from_environment(environ))
+    config.update(overrides or {})
+    return config
@@ -0,0 +1,170 @@
+"""Database engine configuration, pool metrics and prepared statements.
+
+Engine options come from the app config:
+
+- SQLALCHEMY_POOL_SIZE, SQLALCHEMY_MAX_OVERFLOW, SQLALCHEMY_POOL_TIMEOUT and
+  SQLALCHEMY_POOL_RECYCLE size the connection pool of each worker.
+- SQLALCHEMY_POOL_PRE_PING checks a connection before handing it out, so a
+  database restart doesn't surface as errors.
+- SQLALCHEMY_PGBOUNCER is for running behind PgBouncer in transaction
+  pooling mode: PgBouncer does the pooling, so each worker opens and closes
+  its connections (NullPool), and server-side prepared statements are off
+  since consecutive transactions may land on different server connections.
+
+SQLALCHEMY_PREPARED_STATEMENTS turns on PREPARE/EXECUTE for the few hot
+queries defined as PreparedStatements, saving Postgres from planning them
+again on every request.
+"""
+
+import re
+import threading
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import scoped_session
+from sqlalchemy.pool import NullPool
+
+POOL_ONLY_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_recycle")
+
+
+def apply_engine_options(config, options):
+    """Add the configured pool options to create_engine `options`."""
+
+    options.setdefault("pool_pre_ping", config.get("SQLALCHEMY_POOL_PRE_PING", True))
+    if config.get("SQLALCHEMY_PGBOUNCER"):
+        options["poolclass"] = NullPool
+        for name in POOL_ONLY_OPTIONS:
+            options.pop(name, None)
+    return options
+
+
+def engine_options(config):
+    """create_engine options for an engine configured like the primary."""
+
+    options = {}
+    for name, key in (
+        ("pool_size", "SQLALCHEMY_POOL_SIZE"),
+        ("max_overflow", "SQLALCHEMY_MAX_OVERFLOW"),
+        ("pool_timeout", "SQLALCHEMY_POOL_TIMEOUT"),
+        ("pool_recycle", "SQLALCHEMY_POOL_RECYCLE"),
+    ):
+        if config.get(key) is not None:
+            options[name] = config[key]
+    return apply_engine_options(config, options)
+
+
+def prepared_statements_enabled(config):
+    return config.get("SQLALCHEMY_PREPARED_STATEMENTS", True) and not config.get("SQLALCHEMY_PGBOUNCER")
+
+
+##############################################################################
+# Pool metrics
+
+class PoolMetrics:
+    """Counts connections opened and checked out of an engine's pool."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._count("connects")
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._count("checkouts")
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        self._count("invalidations")
+
+    def snapshot(self):
+        """Current pool usage and running totals, as a dict."""
+
+        pool = self.engine.pool
+        stats = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+        }
+        # NullPool keeps nothing around to report on
+        if hasattr(pool, "checkedout"):
+            stats.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        return stats
+
+
+pool_metrics = {}
+
+
+def track_pool(name, engine):
+    """Start collecting PoolMetrics for `engine` under `name`."""
+
+    pool_metrics[name] = PoolMetrics(engine)
+    return pool_metrics[name]
+
+
+##############################################################################
+# Prepared statements
+
+PARAM_RE = re.compile(r"(?<!:):(\w+)")
+
+
+class PreparedStatement:
+    """A query Postgres plans once per connection and then reuses.
+
+    `sql` uses :name placeholders; `types` gives the Postgres type of each
+    parameter, in the order they are passed to EXECUTE. Where prepared
+    statements are off (or the database isn't Postgres) the plain query runs
+    instead.
+    """
+
+    def __init__(self, name, sql, **types):
+        self.name = name
+        self.sql = sql
+        self.params = tuple(types)
+        positions = {param: i for i, param in enumerate(self.params, 1)}
+        self.prepare_sql = "PREPARE {} ({}) AS {}".format(
+            name, ", ".join(types.values()), PARAM_RE.sub(lambda m: f"${positions[m.group(1)]}", sql)
+        )
+        self.execute_sql = "EXECUTE {}({})".format(name, ", ".join(f":{param}" for param in self.params))
+
+    def statement(self, session):
+        """The text to run on `session`'s connection, preparing it if needed."""
+
+        if isinstance(session, scoped_session):
+            session = session()
+        if not prepared_statements_enabled(session.app.config):
+            return text(self.sql)
+
+        conn = session.connection()
+        if conn.dialect.name != "postgresql":
+            return text(self.sql)
+
+        # Connection.info lives as long as the underlying DBAPI connection,
+        # just like the server's prepared statements.
+        prepared = conn.info.setdefault("prepared_statements", set())
+        if self.name not in prepared:
+            conn.execute(text(self.prepare_sql))
+            prepared.add(self.name)
+        return text(self.execute_sql)
+
+    def execute(self, session, **params):
+        return session.connection().execute(self.statement(session), params)
+
+    def query(self, session, entity, **params):
+        """An ORM query for `entity` loaded from this statement."""
+
+        return session.query(entity).from_statement(self.statement(session)).params(**params)
@@ -0,0 +1,124 @@
+"""Fragment cache for the cards on the animal and organization listings.
+
+A card renders the same for every user except for the colour of its heart
+button, so the HTML is rendered once per entity and content version with a
+placeholder where the button class goes. Serving a card is then a dict lookup
+and a string substitution.
+
+Cards rendered without a like set keep a per-card hole instead, so a whole
+page of them can be cached and filled in later with `fill_likes`.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from flask import render_template
+from markupsafe import Markup
+
+LIKE_HOLE = "__like_class__"
+LIKED_CLASS = "btn-danger"
+NOT_LIKED_CLASS = "btn-secondary"
+
+LIKE_HOLE_RE = re.compile("\x00like:([^\x00]*)\x00")
+
+
+class FragmentCache:
+    """A thread-safe LRU of rendered fragments keyed by (kind, entity id).
+
+    Each entry remembers the content version it was rendered from, so a card
+    whose upstream data changed is simply re-rendered on the next lookup.
+    """
+
+    def __init__(self, maxsize=5000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """Return the fragment for `key` if it was rendered from `version`."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, version, fragment):
+        with self._lock:
+            self._entries[key] = (version, fragment)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, kind, entity_id):
+        """Drop the fragment for one entity."""
+
+        with self._lock:
+            self._entries.pop((kind, str(entity_id)), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+card_cache = FragmentCache()
+
+
+def card_version(card):
+    """A content version for a projected card, from every field it holds."""
+
+    return hash(tuple(getattr(card, slot) for slot in card.__slots__))
+
+
+def like_hole(card_id):
+    """The marker left in a card's heart button until the likes are known."""
+
+    return f"\x00like:{card_id}\x00"
+
+
+def fill_likes(html, likes):
+    """Replace the like holes in `html` using the set of liked ids."""
+
+    liked = {str(like) for like in likes}
+    return LIKE_HOLE_RE.sub(
+        lambda hole: LIKED_CLASS if hole.group(1) in liked else NOT_LIKED_CLASS, html
+    )
+
+
+def render_cards(template_name, kind, cards, likes=None, cache=card_cache):
+    """Render `cards` with `template_name`, reusing cached fragments.
+
+    `kind` is both the cache namespace and the name the card template uses
+    for its card ("animal" or "org"). `likes` is the set of liked ids; when
+    it is None every card keeps a like hole.
+    """
+
+    parts = []
+    for card in cards:
+        key = (kind, str(card.id))
+        version = card_version(card)
+        fragment = cache.get(key, version)
+        if fragment is None:
+            fragment = render_template(template_name, like_class=LIKE_HOLE, **{kind: card})
+            cache.set(key, version, fragment)
+
+        if likes is None:
+            like_class = like_hole(card.id)
+        else:
+            like_class = LIKED_CLASS if card.id in likes else NOT_LIKED_CLASS
+        # The hole is in the heart button, after any upstream text in the card.
+        head, _, tail = fragment.rpartition(LIKE_HOLE)
+        parts.append(head + like_class + tail)
+
+    return Markup("\n".join(parts))
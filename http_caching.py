@@ -0,0 +1,94 @@
+"""HTTP caching: ETags, conditional GETs and per-route Cache-Control.
+
+Pages carry weak ETags built from the version of the data they show plus
+whatever is specific to the viewer, so a browser revalidating an unchanged
+page gets a 304 before anything is rendered. Weak validators are used since
+the bytes on the wire may differ by content encoding.
+"""
+
+import hashlib
+from datetime import datetime
+
+from flask import current_app, make_response, request, session
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+NO_STORE = "no-store"
+
+
+def cache_control(policy):
+    """Set the Cache-Control header a view's responses get.
+
+    Goes below @app.route, so the attribute is on the registered function.
+    """
+
+    def decorator(view):
+        view.cache_control = policy
+        return view
+
+    return decorator
+
+
+def apply_cache_control(response):
+    """Give `response` its view's Cache-Control unless it already has one."""
+
+    if "Cache-Control" in response.headers:
+        return response
+
+    view = current_app.view_functions.get(request.endpoint)
+    response.headers["Cache-Control"] = getattr(view, "cache_control", DEFAULT_CACHE_CONTROL)
+    return response
+
+
+def etag_for(*parts):
+    """An ETag value from the things a response depends on."""
+
+    joined = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+def has_pending_flashes():
+    """Flash messages are shown once, so a page showing them can't be reused."""
+
+    return bool(session.get("_flashes"))
+
+
+def is_fresh(etag, last_modified=None):
+    """Does the client's copy still match `etag` / `last_modified`?"""
+
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def not_modified(etag):
+    response = make_response("", 304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def conditional_response(etag, render, last_modified=None):
+    """Answer 304 if the client's copy is current, else call `render`.
+
+    `render` returns the body and is only called when it is needed.
+    `last_modified` is a naive UTC datetime, as werkzeug parses it.
+    """
+
+    if has_pending_flashes():
+        return make_response(render())
+
+    if is_fresh(etag, last_modified):
+        return not_modified(etag)
+
+    response = make_response(render())
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+
+def http_date(timestamp):
+    """A Unix timestamp as the whole-second naive UTC datetime HTTP uses."""
+
+    return datetime.utcfromtimestamp(int(timestamp))
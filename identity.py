@@ -0,0 +1,143 @@
+"""Lazy resolution of the logged-in user.
+
+`g.user` is a CurrentUser: nothing is read from the session or the database
+until a view or template actually looks at it. The id, username and email
+come from a short-lived per-worker cache of UserRecords, so the navbar and
+login checks usually cost no query at all; anything else (likes, changes)
+loads the real User once for the request.
+"""
+
+import threading
+import time
+
+from models import User
+
+
+class UserRecord:
+    """The few fields of a user that most requests need."""
+
+    __slots__ = ("id", "username", "email")
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+
+RECORD_FIELDS = frozenset(UserRecord.__slots__)
+
+
+class IdentityCache:
+    """UserRecords by user id, kept for `ttl` seconds."""
+
+    def __init__(self, ttl=30, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._records.get(user_id)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[1]
+
+    def set(self, record):
+        with self._lock:
+            if len(self._records) >= self.maxsize:
+                self._records.clear()
+            self._records[record.id] = (time.time() + self.ttl, record)
+
+    def invalidate(self, user_id):
+        """Forget a user after their profile changes or they are deleted."""
+
+        with self._lock:
+            self._records.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+identity_cache = IdentityCache()
+
+
+class CurrentUser:
+    """Stands in for the logged-in User as `g.user`.
+
+    Falsy when nobody is logged in (or the user no longer exists). Attribute
+    reads and writes other than id, username and email go to the User model.
+    """
+
+    def __init__(self, load_user_id):
+        self._load_user_id = load_user_id
+        self._resolved = False
+        self._user_id = None
+        self._record = None
+        self._model = None
+
+    def _resolve(self):
+        if self._resolved:
+            return self._record
+        self._resolved = True
+
+        self._user_id = self._load_user_id()
+        if self._user_id is None:
+            return None
+
+        self._record = identity_cache.get(self._user_id)
+        if self._record is None:
+            model = self.model
+            if model is not None:
+                self._record = UserRecord(model.id, model.username, model.email)
+                identity_cache.set(self._record)
+        return self._record
+
+    @property
+    def model(self):
+        """The User row for this request, loaded on first use."""
+
+        if self._model is None:
+            if not self._resolved:
+                self._resolve()
+            if self._user_id is not None:
+                try:
+                    self._model = User.by_id(self._user_id)
+                except AttributeError as e:
+                    # as an AttributeError it would look like a missing
+                    # attribute to __getattr__, which would call this again
+                    raise RuntimeError(f"loading user {self._user_id} failed: {e}") from e
+        return self._model
+
+    def __bool__(self):
+        return self._resolve() is not None
+
+    def __getattr__(self, name):
+        # only reached when normal lookup failed; these never go to the model
+        if name == "model" or name.startswith("_"):
+            raise AttributeError(name)
+
+        if name in RECORD_FIELDS:
+            record = self._resolve()
+            if record is None:
+                raise AttributeError(name)
+            return getattr(record, name)
+
+        model = self.model
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.model, name, value)
+
+    def __repr__(self):
+        return f"<CurrentUser #{self._user_id}>"
@@ -0,0 +1,138 @@
+"""Saving animals and organizations to a user's likes.
+
+Shared by the heart buttons on the HTML pages and the JSON API.
+"""
+
+import petfinder
+from fragments import card_cache
+from models import db, Animal, Organization, SavedAnimals, SavedOrgs
+from normalize import normalize_text
+from page_cache import page_cache
+from projections import DEFAULT_IMG_URL
+
+
+def toggle_animal_like(user, animal_id):
+    """Like or unlike an animal for `user`.
+
+    Returns True if it is now liked, False if it was unliked, and None if the
+    animal isn't saved yet and couldn't be fetched from the API.
+    """
+    animal = Animal.by_id(animal_id)
+
+    if animal == None:
+        get_animal = get_the_animal(animal_id)
+        # this is to check if the token has expired so to refresh the page again
+        if get_animal is None:
+            return None
+        # store the animal and the like together, in one commit
+        db.session.add(Animal(
+            id=animal_id,
+            name=get_animal["name"],
+            img_url=get_animal["img_url"],
+            description=get_animal["description"],
+        ))
+        db.session.add(SavedAnimals(user_id=user.id, animal_id=animal_id))
+        db.session.commit()
+        # we just fetched fresh details, so drop any stale cached copies
+        invalidate_cached("animal", "animals", animal_id)
+        return True
+
+    # look up only this like, by primary key in the user's own partition,
+    # rather than loading everything they have liked
+    saved = SavedAnimals.query.get((user.id, animal_id))
+    if saved is None:
+        db.session.add(SavedAnimals(user_id=user.id, animal_id=animal_id))
+        liked = True
+    else:
+        db.session.delete(saved)
+        liked = False
+    db.session.commit()
+    return liked
+
+
+def toggle_org_like(user, org_id):
+    """Like or unlike an organization for `user`; returns like toggle_animal_like."""
+    org = Organization.by_id(org_id)
+
+    if org == None:
+        get_org = get_the_org(org_id)
+        # this is to check if the token has expired so to refresh the page again
+        if get_org is None:
+            return None
+        # store the organization and the like together, in one commit
+        db.session.add(Organization(
+            id=org_id,
+            name=get_org["name"],
+            img_url=get_org["img_url"],
+            mission_statement=get_org["mission_statement"],
+        ))
+        db.session.add(SavedOrgs(user_id=user.id, org_id=org_id))
+        db.session.commit()
+        # we just fetched fresh details, so drop any stale cached copies
+        invalidate_cached("org", "organizations", org_id)
+        return True
+
+    saved = SavedOrgs.query.get((user.id, org_id))
+    if saved is None:
+        db.session.add(SavedOrgs(user_id=user.id, org_id=org_id))
+        liked = True
+    else:
+        db.session.delete(saved)
+        liked = False
+    db.session.commit()
+    return liked
+
+
+def invalidate_cached(kind, listing_kind, entity_id):
+    """Drop cached pages, cards and listings showing an entity."""
+    page_cache.invalidate_entity(kind, entity_id)
+    card_cache.invalidate(kind, entity_id)
+    petfinder.listing_cache.invalidate_card(listing_kind, entity_id)
+
+
+def get_the_org(org_id):
+    """get the details for an organization from the API, for one not in our database"""
+    try:
+        url = f"{petfinder.BASE_URL}/organizations/{org_id}"
+        res = petfinder.make_api_request(url)
+        data = res.json()
+        j_org = data['organization']
+
+        org = {
+            "id": org_id,
+            "name": j_org["name"],
+            "mission_statement": normalize_text(j_org["mission_statement"]),
+        }
+
+        if len(j_org['photos']) == 0:
+            org['img_url'] = DEFAULT_IMG_URL
+        else:
+            org['img_url'] = j_org["photos"][0]["medium"]
+
+        return org
+    except Exception:
+        return
+
+
+def get_the_animal(animal_id):
+    """get the details for an animal from the API, for one not in our database"""
+    try:
+        url = f"{petfinder.BASE_URL}/animals/{animal_id}"
+        res = petfinder.make_api_request(url)
+        data = res.json()
+        j_animal = data['animal']
+
+        animal = {
+            "id": animal_id,
+            "name": j_animal["name"],
+            "description": normalize_text(j_animal["description"]),
+        }
+
+        if len(j_animal['photos']) == 0:
+            animal['img_url'] = DEFAULT_IMG_URL
+        else:
+            animal['img_url'] = j_animal["photos"][0]["medium"]
+
+        return animal
+    except Exception:
+        return
@@ -0,0 +1,422 @@
+"""Counters and latency histograms, served in Prometheus text format.
+
+init_metrics(app) times every request by endpoint, method and status, every
+SQL statement on the engines in engines.pool_metrics, and exposes it all at
+/metrics. petfinder.py times each upstream call and counts token refreshes.
+At scrape time the caches, the compression middleware, the connection pools
+and the password hasher add their own figures (see `collector`).
+
+Recording only takes a lock and bumps a number. Under gunicorn each worker
+keeps its own figures; with METRICS_DIR set, every worker writes a snapshot
+of them to <METRICS_DIR>/<pid>.json at most every METRICS_FLUSH_INTERVAL
+seconds, and whichever worker answers /metrics adds them all up. Counters
+and histograms of workers that have since exited keep counting, as they do
+with Prometheus' own multiprocess mode; gauges are reported per live worker,
+with a pid label. Point METRICS_DIR at an empty directory on each deploy.
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# seconds; the top buckets are for the slow upstream and bcrypt paths
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(key):
+    if not key:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in key
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._samples.items()}
+
+    def _copy(self, value):
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = label_key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._samples[label_key(labels)] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative `le` buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = label_key(labels)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = self._samples[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][i] += 1
+                    break
+            sample[1] += value
+            sample[2] += 1
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def time(self, **labels):
+        return Timer(self, labels)
+
+
+class Timer:
+    """`with histogram.time(...) as timer:` observes the block's duration.
+
+    Labels can still be added inside the block through `timer.labels`.
+    """
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.labels.setdefault("status", "error")
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """Every metric of this process, plus collectors read at scrape time."""
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.collectors = []
+        self._metrics_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._flushed = 0
+
+    def _add(self, cls, name, help, **options):
+        with self._metrics_lock:
+            if name not in self.metrics:
+                self.metrics[name] = cls(name, help, **options)
+            return self.metrics[name]
+
+    def counter(self, name, help):
+        return self._add(Counter, name, help)
+
+    def gauge(self, name, help):
+        return self._add(Gauge, name, help)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram, name, help, buckets=buckets)
+
+    def collector(self, fn):
+        """Register `fn(registry)`, called before every snapshot to set gauges and counters."""
+
+        self.collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        """This process's metrics as a JSON-friendly dict."""
+
+        for fn in self.collectors:
+            fn(self)
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                metric.name: {
+                    "type": metric.kind,
+                    "help": metric.help,
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": [[list(map(list, key)), value] for key, value in metric.samples().items()],
+                }
+                for metric in list(self.metrics.values())
+            },
+        }
+
+    def flush(self, directory, interval=0):
+        """Write the snapshot to `directory`, unless one was written in the last `interval` seconds."""
+
+        with self._lock:
+            now = time.monotonic()
+            if now - self._flushed < interval:
+                return
+            self._flushed = now
+        snapshot = self.snapshot()
+        with self._lock:
+            write_snapshot(directory, snapshot)
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.clear()
+
+
+def write_snapshot(directory, snapshot):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{snapshot['pid']}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    # readers see either the old snapshot or the new one, never half of one
+    os.replace(tmp, path)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_snapshots(directory):
+    snapshots = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge(snapshots, alive=pid_alive, label_pids=True):
+    """Add up the snapshots of several processes.
+
+    Returns {name: (type, help, buckets, {label key: value})}. Gauges only
+    come from processes that are still running, labelled with their pid.
+    """
+
+    merged = OrderedDict()
+    for snapshot in snapshots:
+        pid = snapshot["pid"]
+        live = alive(pid)
+        pid_label = (("pid", str(pid)),) if label_pids else ()
+        for name, metric in snapshot["metrics"].items():
+            kind = metric["type"]
+            if kind == "gauge" and not live:
+                continue
+            entry = merged.setdefault(name, (kind, metric["help"], tuple(metric["buckets"]), {}))
+            samples = entry[3]
+            for key, value in metric["samples"]:
+                key = tuple(tuple(pair) for pair in key)
+                if kind == "gauge":
+                    samples[key + pid_label] = value
+                elif kind == "counter":
+                    samples[key] = samples.get(key, 0) + value
+                elif key in samples:
+                    total = samples[key]
+                    total[0] = [a + b for a, b in zip(total[0], value[0])]
+                    total[1] += value[1]
+                    total[2] += value[2]
+                else:
+                    samples[key] = [list(value[0]), value[1], value[2]]
+    return merged
+
+
+def render(merged):
+    """Prometheus text exposition of merged metrics."""
+
+    lines = []
+    for name, (kind, help, buckets, samples) in merged.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in sorted(samples.items()):
+            if kind != "histogram":
+                lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + (float("inf"),), value[0] + [value[2] - sum(value[0])]):
+                cumulative += count
+                le = key + (("le", format_value(bound)),)
+                lines.append(f"{name}_bucket{format_labels(le)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(key)} {format_value(value[1])}")
+            lines.append(f"{name}_count{format_labels(key)} {value[2]}")
+    return "\n".join(lines) + "\n"
+
+
+def exposition(registry, directory=None):
+    """The /metrics body: this process alone, or every worker under `directory`."""
+
+    if not directory:
+        return render(merge([registry.snapshot()], alive=lambda pid: True, label_pids=False))
+    registry.flush(directory)
+    return render(merge(read_snapshots(directory)))
+
+
+registry = Registry()
+
+requests_total = registry.counter("http_requests_total", "Requests handled, by endpoint, method and status.")
+request_duration = registry.histogram("http_request_duration_seconds", "Time spent handling requests.")
+upstream_duration = registry.histogram(
+    "petfinder_request_duration_seconds", "Time spent on Petfinder API calls, by endpoint and status."
+)
+token_refreshes = registry.counter("petfinder_token_refreshes_total", "OAuth tokens fetched from Petfinder.")
+query_duration = registry.histogram("db_query_duration_seconds", "Time spent running SQL statements, by engine.")
+
+ID_SEGMENT_RE = re.compile(r"/(\d+|[A-Z]{2,3}\d+)(?=/|$)")
+
+
+def upstream_endpoint(url, base_url):
+    """/animals/12345 -> /animals/:id, so each record isn't its own series."""
+
+    path = url[len(base_url):] if base_url and url.startswith(base_url) else url
+    return ID_SEGMENT_RE.sub("/:id", path.split("?", 1)[0]) or "/"
+
+
+##############################################################################
+# Wiring into the app
+
+
+def instrument_engine(name, engine):
+    """Time every statement `engine` runs."""
+
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_start")
+        if started:
+            query_duration.observe(time.perf_counter() - started.pop(), engine=name)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+
+
+@registry.collector
+def collect_app_stats(registry):
+    """Cache hit counts, the connection pools and the hasher queue."""
+
+    from engines import pool_metrics
+    from fragments import card_cache
+    from identity import identity_cache
+    from page_cache import page_cache
+    from passwords import hasher
+    from petfinder import listing_cache
+
+    hits = registry.gauge("cache_hits", "Lookups answered from a cache since the worker started.")
+    misses = registry.gauge("cache_misses", "Lookups a cache could not answer since the worker started.")
+    for name, cache in (
+        ("card", card_cache), ("page", page_cache), ("listing", listing_cache), ("identity", identity_cache),
+    ):
+        hits.set(cache.hits, cache=name)
+        misses.set(cache.misses, cache=name)
+
+    pool = registry.gauge("db_pool", "Connection pool figures, by engine.")
+    for engine_name, metrics in pool_metrics.items():
+        for stat, value in metrics.snapshot().items():
+            pool.set(value, engine=engine_name, stat=stat)
+
+    registry.gauge("password_hashes_pending", "bcrypt jobs queued or running.").set(hasher.pending)
+
+
+def init_metrics(app, compression_stats=None):
+    """Time the app's requests and SQL, and serve /metrics."""
+
+    from flask import Response, g, request
+
+    from engines import pool_metrics
+
+    app.config.setdefault("METRICS_DIR", None)
+    app.config.setdefault("METRICS_FLUSH_INTERVAL", 1.0)
+    app.config.setdefault("METRICS_TOKEN", None)
+
+    if compression_stats is not None:
+        @registry.collector
+        def collect_compression(registry):
+            gauge = registry.gauge("compression", "Compressed responses and their bytes before and after.")
+            gauge.set(compression_stats.responses, stat="responses")
+            gauge.set(compression_stats.bytes_in, stat="bytes_in")
+            gauge.set(compression_stats.bytes_out, stat="bytes_out")
+
+    for name, metrics in pool_metrics.items():
+        instrument_engine(name, metrics.engine)
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("request_started")
+        if started is not None:
+            labels = {
+                "endpoint": request.endpoint or "unmatched",
+                "method": request.method,
+                "status": response.status_code,
+            }
+            request_duration.observe(time.perf_counter() - started, **labels)
+            requests_total.inc(**labels)
+        if app.config["METRICS_DIR"]:
+            registry.flush(app.config["METRICS_DIR"], app.config["METRICS_FLUSH_INTERVAL"])
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        token = app.config["METRICS_TOKEN"]
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return Response("Forbidden", 403)
+        body = exposition(registry, app.config["METRICS_DIR"])
+        return Response(body, content_type=CONTENT_TYPE, headers={"Cache-Control": "no-store"})
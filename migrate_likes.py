@@ -0,0 +1,214 @@
+"""Move animal_likes and org_likes to hash-partitioned tables, online.
+
+For each table this:
+
+1. creates `<table>_new`, partitioned by HASH (user_id) with the
+   (user_id, <entity>_id) primary key the models now declare;
+2. adds a trigger copying inserts and deletes on the old table into the new
+   one, so the app keeps working during the backfill;
+3. copies the old rows across in batches of --batch-size ids, one short
+   transaction per batch (duplicate likes collapse into one);
+4. deletes from the new table the likes that are no longer in the old one,
+   in batches of --batch-size user ids: a backfill batch can copy a like
+   that is deleted while it runs, after the trigger had nothing to delete
+   yet. The old table gets a (user_id, <entity>_id) index, built
+   concurrently, so each batch is a range lookup;
+5. swaps the tables in one brief transaction, keeping the old one as
+   `<table>_old` unless --drop-old is given.
+
+Safe to re-run: a table that is already partitioned is skipped, and an
+interrupted backfill starts over, skipping the rows it already copied.
+
+Run it like:
+
+    python migrate_likes.py --batch-size 10000 --pause 0.05
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app import create_app
+from models import LIKE_PARTITIONS, db
+
+LIKE_TABLES = {
+    "animal_likes": ("animal_id", "animals"),
+    "org_likes": ("org_id", "organizations"),
+}
+
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :table)"
+    ), table=table).scalar()
+
+
+def create_new_table(conn, table, entity_column, entity_table, partitions):
+    new = f"{table}_new"
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {new} (
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            {entity_column} TEXT NOT NULL REFERENCES {entity_table} (id) ON DELETE CASCADE,
+            PRIMARY KEY (user_id, {entity_column})
+        ) PARTITION BY HASH (user_id)
+    """))
+    for remainder in range(partitions):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {new}_p{remainder} PARTITION OF {new} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        ))
+
+
+def create_mirror_trigger(conn, table, entity_column):
+    new = f"{table}_new"
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {table}_mirror() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                IF NEW.user_id IS NOT NULL AND NEW.{entity_column} IS NOT NULL THEN
+                    INSERT INTO {new} (user_id, {entity_column})
+                    VALUES (NEW.user_id, NEW.{entity_column})
+                    ON CONFLICT DO NOTHING;
+                END IF;
+            ELSIF TG_OP = 'DELETE' THEN
+                DELETE FROM {new}
+                WHERE user_id = OLD.user_id AND {entity_column} = OLD.{entity_column};
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_mirror ON {table}"))
+    conn.execute(text(
+        f"CREATE TRIGGER {table}_mirror AFTER INSERT OR DELETE ON {table} "
+        f"FOR EACH ROW EXECUTE PROCEDURE {table}_mirror()"
+    ))
+
+
+def backfill(table, entity_column, batch_size, pause):
+    """Copy rows from `table` to `<table>_new` in id ranges."""
+
+    new = f"{table}_new"
+    with db.engine.connect() as conn:
+        low, high = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).first()
+    if low is None:
+        return 0
+
+    copied = 0
+    start = low
+    while start <= high:
+        with db.engine.begin() as conn:
+            result = conn.execute(text(f"""
+                INSERT INTO {new} (user_id, {entity_column})
+                SELECT user_id, {entity_column} FROM {table}
+                WHERE id >= :start AND id < :stop
+                  AND user_id IS NOT NULL AND {entity_column} IS NOT NULL
+                ON CONFLICT DO NOTHING
+            """), start=start, stop=start + batch_size)
+        copied += result.rowcount
+        start += batch_size
+        print(f"{table}: copied through id {min(start - 1, high)} of {high}")
+        time.sleep(pause)
+    return copied
+
+
+def index_old_likes(table, entity_column):
+    """Index `table` by user, without blocking writes, for `reconcile`."""
+
+    with db.engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY can't run inside a transaction
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_user_likes "
+            f"ON {table} (user_id, {entity_column})"
+        ))
+
+
+def reconcile(table, entity_column, batch_size, pause):
+    """Delete rows of `<table>_new` that are gone from `table`, in user id ranges.
+
+    Runs once every backfill batch has committed, so a like deleted during the
+    backfill is gone from the snapshot each batch here sees, and the trigger
+    keeps up with deletes from then on.
+    """
+
+    new = f"{table}_new"
+    with db.engine.connect() as conn:
+        low, high = conn.execute(text(f"SELECT MIN(user_id), MAX(user_id) FROM {new}")).first()
+    if low is None:
+        return 0
+
+    deleted = 0
+    start = low
+    while start <= high:
+        with db.engine.begin() as conn:
+            result = conn.execute(text(f"""
+                DELETE FROM {new} n
+                WHERE n.user_id >= :start AND n.user_id < :stop
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {table} o
+                      WHERE o.user_id = n.user_id AND o.{entity_column} = n.{entity_column}
+                  )
+            """), start=start, stop=start + batch_size)
+        deleted += result.rowcount
+        start += batch_size
+        print(f"{table}: reconciled through user {min(start - 1, high)} of {high}")
+        time.sleep(pause)
+    return deleted
+
+
+def swap(conn, table, partitions, drop_old):
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"DROP TRIGGER {table}_mirror ON {table}"))
+    conn.execute(text(f"DROP FUNCTION {table}_mirror()"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_old"))
+    conn.execute(text(f"ALTER INDEX {table}_pkey RENAME TO {table}_old_pkey"))
+    conn.execute(text(f"ALTER TABLE {table}_new RENAME TO {table}"))
+    conn.execute(text(f"ALTER INDEX {table}_new_pkey RENAME TO {table}_pkey"))
+    for remainder in range(partitions):
+        conn.execute(text(f"ALTER TABLE {table}_new_p{remainder} RENAME TO {table}_p{remainder}"))
+    if drop_old:
+        conn.execute(text(f"DROP TABLE {table}_old"))
+
+
+def migrate(table, batch_size, pause, partitions, drop_old):
+    entity_column, entity_table = LIKE_TABLES[table]
+
+    with db.engine.begin() as conn:
+        if is_partitioned(conn, table):
+            print(f"{table}: already partitioned")
+            return
+        if conn.execute(text("SELECT to_regclass(:name)"), name=f"{table}_old").scalar():
+            raise SystemExit(f"{table}_old exists; drop it before migrating {table} again")
+        create_new_table(conn, table, entity_column, entity_table, partitions)
+        create_mirror_trigger(conn, table, entity_column)
+
+    copied = backfill(table, entity_column, batch_size, pause)
+    print(f"{table}: backfilled {copied} rows")
+    index_old_likes(table, entity_column)
+    deleted = reconcile(table, entity_column, batch_size, pause)
+    print(f"{table}: dropped {deleted} rows deleted during the backfill")
+
+    with db.engine.begin() as conn:
+        swap(conn, table, partitions, drop_old)
+    print(f"{table}: swapped in the partitioned table")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between batches")
+    parser.add_argument("--partitions", type=int, default=LIKE_PARTITIONS)
+    parser.add_argument("--drop-old", action="store_true", help="drop the old tables after swapping")
+    parser.add_argument("tables", nargs="*", default=list(LIKE_TABLES), choices=list(LIKE_TABLES))
+    args = parser.parse_args()
+
+    create_app()
+    for table in args.tables:
+        migrate(table, args.batch_size, args.pause, args.partitions, args.drop_old)
+
+
+if __name__ == "__main__":
+    main()
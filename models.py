@@ -1,10 +1,56 @@
 """SQLAlchemy models for Pet Adopter."""
 
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import DDL, event, orm
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
+from engines import PreparedStatement, apply_engine_options, track_pool
+from passwords import hasher
+from replicas import forget_write, note_write, reads_from_replica, remember_write
+
+
+class RoutingSession(SignallingSession):
+    """Session that reads from a replica during read-only requests.
+
+    It sticks with the replica it picks first, so a request sees one
+    consistent database. Once it has flushed anything, the rest of its
+    queries use the primary.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self._pinned = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or self.new or self.deleted:
+            self._pinned = True
+
+        router = self.app.extensions.get("replicas")
+        if router is not None and not self._pinned and reads_from_replica():
+            info = getattr(mapper.mapped_table, "info", {}) if mapper is not None else {}
+            if info.get("bind_key") is None:
+                if self._replica is None:
+                    self._replica = router.choose() or False
+                if self._replica:
+                    return self._replica
+        return super().get_bind(mapper, clause)
+
+
+event.listen(RoutingSession, "after_flush", note_write)
+event.listen(RoutingSession, "after_commit", remember_write)
+event.listen(RoutingSession, "after_rollback", forget_write)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+        apply_engine_options(app.config, options)
+
+
+db = RoutingSQLAlchemy()
 
 class User(db.Model):
     """User in the system."""
@@ -26,6 +72,12 @@ class User(db.Model):
     def __repr__(self):
         return f"<User #{self.id}: {self.username}, {self.email}>"
 
+    @classmethod
+    def by_id(cls, user_id):
+        """Like `User.query.get`, through a prepared statement."""
+
+        return USER_BY_ID.query(db.session, cls, id=user_id).first()
+
     @classmethod
     def signup(cls, username, email, password):
         """Sign up user.
@@ -33,7 +85,7 @@ class User(db.Model):
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode("UTF-8")
+        hashed_pwd = hasher.hash(password)
 
         user = User(
             username=username, email=email, password=hashed_pwd, 
@@ -51,37 +103,76 @@ class User(db.Model):
         and, if it finds such a user, returns that user object.
 
         If can't find matching user (or if password is wrong), returns False.
+
+        A hash made with a lower cost than the current one is replaced
+        (and committed) while we have the plain password at hand.
         """
 
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = hasher.verify(user.password, password)
             if is_auth:
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
+                    db.session.commit()
                 return user
 
 
+# The like tables are hash partitioned on user_id, so everything about one
+# user's likes lives in one small partition. Their (user_id, ...) primary key
+# doubles as the covering index for "what has this user liked".
+LIKE_PARTITIONS = 16
+
+
+def create_partitions(table, modulus=LIKE_PARTITIONS):
+    """DDL for the hash partitions of `table`, named like animal_likes_p0."""
+
+    return [
+        DDL(
+            f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        ).execute_if(dialect="postgresql")
+        for remainder in range(modulus)
+    ]
+
+
 class SavedOrgs(db.Model):
     """Mapping saved organizations to users."""
 
     __tablename__ = "org_likes"
+    __table_args__ = {"postgresql_partition_by": "HASH (user_id)"}
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"), primary_key=True)
 
-    id = db.Column(db.Integer, primary_key=True)
+    org_id = db.Column(db.Text, db.ForeignKey("organizations.id", ondelete="cascade"), primary_key=True)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
+    @classmethod
+    def org_ids_for(cls, user_id):
+        """The ids of the organizations `user_id` has liked."""
 
-    org_id = db.Column(db.Text, db.ForeignKey("organizations.id", ondelete="cascade"))
+        return {row.org_id for row in LIKED_ORG_IDS.execute(db.session, user_id=user_id)}
     
 class SavedAnimals(db.Model):
     """Mapping saved animals to users."""
 
     __tablename__ = "animal_likes"
+    __table_args__ = {"postgresql_partition_by": "HASH (user_id)"}
 
-    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"), primary_key=True)
+
+    animal_id = db.Column(db.Text, db.ForeignKey("animals.id", ondelete="cascade"), primary_key=True)
+
+    @classmethod
+    def animal_ids_for(cls, user_id):
+        """The ids of the animals `user_id` has liked."""
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="cascade"))
+        return {row.animal_id for row in LIKED_ANIMAL_IDS.execute(db.session, user_id=user_id)}
 
-    animal_id = db.Column(db.Text, db.ForeignKey("animals.id", ondelete="cascade"))   
+
+for like_table in (SavedOrgs.__table__, SavedAnimals.__table__):
+    for ddl in create_partitions(like_table.name):
+        event.listen(like_table, "after_create", ddl)
 
 
 class Organization(db.Model):
@@ -96,6 +187,10 @@ class Organization(db.Model):
     img_url = db.Column(db.Text, nullable=True)
 
     mission_statement = db.Column(db.Text, nullable=True)
+
+    @classmethod
+    def by_id(cls, org_id):
+        return ORG_BY_ID.query(db.session, cls, id=org_id).first()
     
     
 class Animal(db.Model):
@@ -111,6 +206,37 @@ class Animal(db.Model):
 
     description = db.Column(db.Text, nullable=True)
 
+    @classmethod
+    def by_id(cls, animal_id):
+        return ANIMAL_BY_ID.query(db.session, cls, id=animal_id).first()
+
+class StoredSession(db.Model):
+    """A server-side session, see sessions.py."""
+
+    __tablename__ = "sessions"
+
+    id = db.Column(db.Text, primary_key=True,)
+
+    data = db.Column(db.Text, nullable=False)
+
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+
+
+##############################################################################
+# Hot queries, prepared once per connection (see engines.py)
+
+USER_BY_ID = PreparedStatement("user_by_id", "SELECT * FROM users WHERE id = :id", id="integer")
+ANIMAL_BY_ID = PreparedStatement("animal_by_id", "SELECT * FROM animals WHERE id = :id", id="text")
+ORG_BY_ID = PreparedStatement("org_by_id", "SELECT * FROM organizations WHERE id = :id", id="text")
+LIKED_ANIMAL_IDS = PreparedStatement(
+    "liked_animal_ids", "SELECT animal_id FROM animal_likes WHERE user_id = :user_id", user_id="integer"
+)
+LIKED_ORG_IDS = PreparedStatement(
+    "liked_org_ids", "SELECT org_id FROM org_likes WHERE user_id = :user_id", user_id="integer"
+)
+
+
 def connect_db(app):
     db.app = app
     db.init_app(app)
+    track_pool("primary", db.get_engine(app))
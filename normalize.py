@@ -0,0 +1,94 @@
+"""Normalization of free text coming back from the Petfinder API.
+
+Descriptions and mission statements arrive double HTML-escaped, sometimes with
+stray tags and runs of whitespace. The same texts show up on every page view,
+so each distinct text is normalized once and memoized by a hash of its content.
+"""
+
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+
+# p.card-bio is clamped to three lines; anything past this is never visible.
+CARD_TEXT_LENGTH = 300
+
+MEMO_SIZE = 20000
+
+TAG_RE = re.compile(r"<[^>]*>")
+WHITESPACE_RE = re.compile(r"\s+")
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def content_key(text, max_length=None):
+    """Key a text by the hash of its content rather than the string itself."""
+
+    digest = hashlib.sha1(text.encode("utf-8")).digest()
+    return (digest, max_length)
+
+
+def truncate(text, max_length):
+    """Cut `text` to `max_length` characters, on a word boundary if possible."""
+
+    if max_length is None or len(text) <= max_length:
+        return text
+
+    cut = text[:max_length - 1]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+def _normalize(text, max_length):
+    text = html.unescape(html.unescape(text))
+    # Jinja escapes whatever is left, so tags would otherwise show up verbatim.
+    text = TAG_RE.sub(" ", text)
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    return truncate(text, max_length)
+
+
+def normalize_text(text, max_length=None):
+    """Normalize one description or mission statement.
+
+    Returns None for a missing text so templates can keep testing it.
+    """
+
+    if text is None:
+        return None
+
+    key = content_key(text, max_length)
+    with _memo_lock:
+        normalized = _memo.get(key)
+        if normalized is not None:
+            _memo.move_to_end(key)
+            return normalized
+
+    normalized = _normalize(text, max_length)
+
+    with _memo_lock:
+        _memo[key] = normalized
+        if len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+    return normalized
+
+
+def normalize_many(texts, max_length=None):
+    """Normalize a batch of texts, doing the work once per distinct text."""
+
+    seen = {}
+    normalized = []
+    for text in texts:
+        if text not in seen:
+            seen[text] = normalize_text(text, max_length)
+        normalized.append(seen[text])
+    return normalized
+
+
+def clear_memo():
+    """Forget every memoized text."""
+
+    with _memo_lock:
+        _memo.clear()
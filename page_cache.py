@@ -0,0 +1,154 @@
+"""Full-page cache for the listing pages and the anonymous homepage.
+
+These pages are the same for every user apart from the navbar, the flash
+messages and the heart buttons. They are rendered once with markers left in
+those places ("holes"); serving a cached page renders only the small
+user-specific pieces and splices them in.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, render_template
+
+from fragments import fill_likes
+from http_caching import conditional_response, etag_for
+
+NAVBAR_HOLE = "<!--hole:navbar-->"
+FLASHES_HOLE = "<!--hole:flashes-->"
+
+
+class CachedPage:
+    """A rendered page body with its holes still in it."""
+
+    __slots__ = ("body", "entities", "created", "etag")
+
+    def __init__(self, body, entities=()):
+        self.body = body
+        self.entities = frozenset((kind, str(entity_id)) for kind, entity_id in entities)
+        self.created = time.time()
+        self.etag = hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """A thread-safe LRU of CachedPages with a time to live.
+
+    Pages remember which (kind, id) entities they show, so a change to one
+    animal or organization can drop every page it appears on.
+    """
+
+    def __init__(self, maxsize=500, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None or time.time() - page.created > self.ttl:
+                self._pages.pop(key, None)
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def set(self, key, body, entities=()):
+        """Store a rendered body under `key` and return its CachedPage."""
+
+        page = CachedPage(body, entities)
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.maxsize:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate_entity(self, kind, entity_id):
+        """Drop every page that shows the given animal or organization."""
+
+        entity = (kind, str(entity_id))
+        with self._lock:
+            stale = [key for key, page in self._pages.items() if entity in page.entities]
+            for key in stale:
+                del self._pages[key]
+        return len(stale)
+
+    def invalidate_route(self, route):
+        """Drop every page cached for `route`."""
+
+        with self._lock:
+            stale = [key for key in self._pages if key[0] == route]
+            for key in stale:
+                del self._pages[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+page_cache = PageCache()
+
+
+def page_key(route, page_num=None, **args):
+    """Cache key for a page: the route, page number and non-empty query args."""
+
+    return (route, page_num, tuple(sorted((name, value) for name, value in args.items() if value)))
+
+
+def cache_page(key, template_name, entities=(), **context):
+    """Render `template_name` with its holes left in and cache it under `key`."""
+
+    body = render_template(template_name, page_holes=True, **context)
+    return page_cache.set(key, body, entities)
+
+
+def render_holes():
+    """Render the navbar and flash messages for the current user.
+
+    This consumes the pending flash messages, so it has to happen while the
+    session can still be saved.
+    """
+
+    return {
+        NAVBAR_HOLE: render_template("_navbar.html"),
+        FLASHES_HOLE: render_template("_flashes.html"),
+    }
+
+
+def fill_holes(body, holes, likes=()):
+    """Put the rendered `holes` and the like state into `body`."""
+
+    for marker, html in holes.items():
+        body = body.replace(marker, html, 1)
+    return fill_likes(body, likes)
+
+
+def serve_page(page, likes=()):
+    """Fill the holes of a CachedPage for the current user."""
+
+    return fill_holes(page.body, render_holes(), likes)
+
+
+def send_page(page, likes=()):
+    """Serve a CachedPage, or a 304 if the viewer already has this version.
+
+    The ETag covers the page version, the viewer and their like set. There is
+    no Last-Modified: the page's age says nothing about its holes, so a client
+    revalidating by date alone would keep stale hearts and navbar.
+    """
+
+    user_id = g.user.id if g.user else None
+    etag = etag_for(page.etag, user_id, ",".join(sorted(str(like) for like in likes)))
+    return conditional_response(etag, lambda: serve_page(page, likes))
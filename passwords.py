@@ -0,0 +1,147 @@
+"""Password hashing off the request thread.
+
+bcrypt releases the GIL while it works, so running it in a small thread pool
+lets several logins hash at once, one per core, instead of each tying up the
+thread that serves it for the whole hash. The pool is bounded: when more than
+`max_queue` hashes are already waiting, new ones are refused with
+HasherBusy rather than piling up behind them.
+
+The cost factor (bcrypt's log rounds) is configurable; `python passwords.py
+250` picks the one that fits a 250 ms budget on this machine, to set once
+for every worker. Hashes made with a lower cost are upgraded the next time
+their owner logs in (see `needs_rehash`); stronger ones are left alone.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from tracing import span
+
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+def hash_rounds(hashed):
+    """The cost factor of a `$2b$12$...` hash, or None if it isn't one."""
+
+    parts = hashed.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def calibrate(target_ms, minimum=MIN_ROUNDS, maximum=MAX_ROUNDS):
+    """The highest cost whose hash takes at most `target_ms` here.
+
+    Each extra round doubles the time, so one timing at `minimum` is enough
+    to extrapolate from; never goes below `minimum`.
+    """
+
+    start = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(minimum))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    rounds = minimum
+    while rounds < maximum and elapsed_ms * 2 <= target_ms:
+        elapsed_ms *= 2
+        rounds += 1
+    return rounds
+
+
+class PasswordHasher:
+    """Hash and check passwords with bcrypt in a bounded thread pool."""
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, workers=None, max_queue=None):
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+        self.configure(rounds, workers, max_queue)
+
+    def configure(self, rounds=DEFAULT_ROUNDS, workers=None, max_queue=None):
+        """Set the cost, pool size and queue limit, replacing the pool."""
+
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = self.workers * 4 if max_queue is None else max_queue
+        with self._lock:
+            old, self._executor = self._executor, None
+        if old is not None:
+            old.shutdown(wait=False)
+
+    @property
+    def executor(self):
+        # started lazily so forked workers each get their own threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="bcrypt"
+                )
+            return self._executor
+
+    @property
+    def pending(self):
+        """Hashes running or waiting in the pool."""
+
+        return self._pending
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            # run in a copy of the caller's context so the hash is traced as
+            # part of its request
+            return self.executor.submit(contextvars.copy_context().run, self._work, fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _work(self, fn, *args):
+        with span(f"bcrypt.{fn.__name__}", "password", rounds=self.rounds):
+            return fn(*args)
+
+    def hash(self, password):
+        """A bcrypt hash of `password` at the configured cost, as text."""
+
+        if not password:
+            raise ValueError("Password must be non-empty.")
+        salt = bcrypt.gensalt(self.rounds)
+        return self._run(bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+    def verify(self, hashed, password):
+        """Whether `password` matches `hashed`."""
+
+        try:
+            return self._run(bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
+        except ValueError:
+            # not a bcrypt hash
+            return False
+
+    def needs_rehash(self, hashed):
+        """Whether `hashed` is weaker than the configured cost; stronger ones are kept."""
+
+        rounds = hash_rounds(hashed)
+        return rounds is None or rounds < self.rounds
+
+
+hasher = PasswordHasher()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pick the bcrypt cost for a time budget on this machine.")
+    parser.add_argument("target_ms", type=int, help="how long one hash may take")
+    args = parser.parse_args()
+    print(f"BCRYPT_LOG_ROUNDS={calibrate(args.target_ms)}")
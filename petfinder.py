@@ -0,0 +1,201 @@
+"""Client for the Petfinder API.
+
+Shared by the HTML views and the JSON API so both use the same OAuth token
+handling and the same cached, projected listings. The token authenticates
+this app rather than a user, so one token is shared by every request in the
+process instead of being copied into each user's session.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import token_refreshes, upstream_duration, upstream_endpoint
+from projections import project_animals, project_organizations, project_types
+from tracing import span
+from transport import make_transport
+
+#global variables for api, set from the app's config by init_petfinder
+BASE_URL = None
+TOKEN_URL = "https://api.petfinder.com/v2/oauth2/token"
+token_request = {
+    "grant_type": "client_credentials",
+    "client_id": None,
+    "client_secret": None,
+}
+# Petfinder tokens last an hour; refresh a minute early
+TOKEN_LIFETIME = 3600 - 60
+TYPES_TTL = 3600
+animal_types_cache = {}
+token_state = {}
+LISTING_TTL = 300
+PAGE_SIZE = 42
+
+# how requests reach Petfinder: live, or recorded to / replayed from a
+# cassette (see transport.py). Built on first use, so a replayed cassette is
+# only read once something asks for it.
+transport_settings = {"mode": "live", "cassette_path": None, "speed": 0.0}
+transport = None
+transport_lock = threading.Lock()
+
+
+def init_petfinder(app):
+    """Point the client at the API and credentials in app.config."""
+
+    global BASE_URL, TOKEN_URL, transport
+
+    BASE_URL = app.config["API_URL"]
+    TOKEN_URL = app.config["TOKEN_URL"]
+    token_request.update(client_id=app.config["CLIENT_ID"], client_secret=app.config["CLIENT_SECRET"])
+    transport_settings.update(
+        mode=app.config["PETFINDER_TRANSPORT"],
+        cassette_path=app.config["PETFINDER_CASSETTE"],
+        speed=app.config["PETFINDER_REPLAY_SPEED"],
+    )
+    with transport_lock:
+        transport = None
+    token_state.clear()
+
+
+def get_transport():
+    global transport
+
+    if transport is None:
+        with transport_lock:
+            if transport is None:
+                transport = make_transport(**transport_settings)
+    return transport
+
+
+#api functions
+def retrieve_new_token():
+    # retrieve a new OAuth token 
+    with span("petfinder /oauth2/token", "upstream"), upstream_duration.time(endpoint="/oauth2/token") as timer:
+        res = get_transport().request("POST", TOKEN_URL, json=token_request)
+        timer.labels["status"] = res.status_code
+    token_refreshes.inc()
+    return res.json()["access_token"]
+
+def refresh_token():
+    new_token = retrieve_new_token()
+    token_state.update(token=new_token, expires=time.time() + TOKEN_LIFETIME)
+
+def ensure_fresh_token():
+    """Refresh the token now if it is missing or about to expire.
+
+    Streamed pages can't redirect once they've started, so they make sure
+    of the token before sending anything.
+    """
+    if token_state.get('expires', 0) < time.time():
+        refresh_token()
+
+def make_api_request(url, method='GET', headers=None, params=None, data=None):
+    if 'token' not in token_state:
+        # No token yet, retrieve a new one
+        refresh_token()
+        
+    request_headers = {'Authorization': f'Bearer {token_state["token"]}'} if headers is None else headers
+    endpoint = upstream_endpoint(url, BASE_URL)
+    with span(f"petfinder {endpoint}", "upstream", url=url, params=params) as traced, \
+            upstream_duration.time(endpoint=endpoint) as timer:
+        response = get_transport().request(method, url, headers=request_headers, params=params, data=data)
+        timer.labels["status"] = response.status_code
+        if traced is not None:
+            traced.args["status"] = response.status_code
+    return response
+
+def get_animal_types():
+    """The animal species listed by the API, cached since they rarely change."""
+    if animal_types_cache.get('expires', 0) > time.time():
+        return animal_types_cache['types']
+
+    response_types = make_api_request(f"{BASE_URL}/types")
+    types = project_types(response_types.json()['types'])
+    animal_types_cache.update(types=types, expires=time.time() + TYPES_TTL)
+    return types
+
+
+class ListingCache:
+    """A small thread-safe LRU of projected listings with a time to live."""
+
+    def __init__(self, maxsize=500, ttl=LISTING_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_card(self, kind, card_id):
+        """Drop every listing of `kind` that contains the card `card_id`."""
+
+        card_id = str(card_id)
+        with self._lock:
+            stale = [
+                key for key, (_, (cards, _)) in self._entries.items()
+                if key[0] == kind and any(str(card.id) == card_id for card in cards)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+listing_cache = ListingCache()
+
+
+class TokenExpired(KeyError):
+    """A listing request got a 401: the token needs refreshing.
+
+    A KeyError, like the missing listing key of an empty result, so callers
+    that don't tell the two apart keep working.
+    """
+
+
+def fetch_listing(kind, params):
+    """Fetch one page of `kind` ("animals" or "organizations") as cards.
+
+    Returns (cards, total_pages). Raises TokenExpired when the token has
+    expired, and KeyError like the raw responses do when nothing matched.
+    """
+    key = (kind, tuple(sorted(params.items())))
+    cached = listing_cache.get(key)
+    if cached is not None:
+        return cached
+
+    response = make_api_request(f"{BASE_URL}/{kind}", params=params)
+    if response.status_code == 401:
+        raise TokenExpired(kind)
+    data = response.json()
+    project = project_animals if kind == "animals" else project_organizations
+    listing = (project(data[kind]), data.get("pagination", {}).get("total_pages", 1))
+    listing_cache.set(key, listing)
+    return listing
+
+
+def fetch_animals(params):
+    return fetch_listing("animals", params)
+
+
+def fetch_organizations(params):
+    return fetch_listing("organizations", params)
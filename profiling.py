@@ -0,0 +1,222 @@
+"""On-demand sampling profiler for the hot views.
+
+init_profiling(app) profiles a request to one of PROFILE_ENDPOINTS (the
+listings and the like toggles by default) when either
+
+- a user named in PROFILE_ADMINS sends `X-Profile: 1` (or `?profile=1`), or
+- it is picked at random, PROFILE_SAMPLE_RATE of the time (0 by default).
+
+While a request is profiled, a background thread looks at its stack every
+PROFILE_INTERVAL seconds. Nothing is installed in the interpreter itself, so
+unprofiled requests run exactly as before and profiled ones pay only for the
+sampling. Each profile is written to PROFILE_DIR as collapsed stacks
+("frame;frame;frame count" lines, which flamegraph.pl, speedscope and
+inferno all read), keeping the newest PROFILE_KEEP files. The samples of every
+profiled request are also added up per endpoint in hot-<pid>.folded, and
+`sampler.hot_frames()` lists the frames seen most often.
+"""
+
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+DEFAULT_ENDPOINTS = (
+    "views.list_animals", "views.list_organizations", "views.add_to_saved_animals", "views.add_to_saved_orgs"
+)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(frame):
+    """The stack ending in `frame` as "outer;...;inner"."""
+
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Profile:
+    """Collapsed stacks sampled from one thread."""
+
+    def __init__(self, name, thread_id):
+        self.name = name
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.started = time.time()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Sampler:
+    """One background thread sampling every thread that is being profiled."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.totals = defaultdict(Counter)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # started lazily, and again in each forked worker
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def start(self, name, thread_id=None):
+        """Begin profiling `thread_id` (the calling thread by default)."""
+
+        profile = Profile(name, thread_id or threading.get_ident())
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            self._ensure_thread()
+        return profile
+
+    def stop(self, profile):
+        """Stop profiling and fold the profile into the per-endpoint totals."""
+
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+            self.totals[profile.name].update(profile.stacks)
+        return profile
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for profile in self._active.values():
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None:
+                        profile.stacks[collapse(frame)] += 1
+                del frames
+
+    def snapshot(self):
+        """A copy of the per-endpoint totals."""
+
+        with self._lock:
+            return {name: Counter(stacks) for name, stacks in self.totals.items()}
+
+    def hot_frames(self, limit=20, name=None):
+        """[(frame, samples)] of the frames most often on top of the stack."""
+
+        leaves = Counter()
+        for endpoint, stacks in self.snapshot().items():
+            if name is not None and endpoint != name:
+                continue
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def reset(self):
+        with self._lock:
+            self.totals.clear()
+
+
+class ProfileWriter:
+    """Writes profiles to a directory, keeping the newest `keep` of them."""
+
+    def __init__(self, directory, keep=200):
+        self.directory = directory
+        self.keep = keep
+        self._numbers = itertools.count()
+        self._lock = threading.Lock()
+
+    def write(self, profile):
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started))
+        path = os.path.join(
+            self.directory, f"{stamp}-{os.getpid()}-{next(self._numbers)}-{profile.name}.folded"
+        )
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(profile.folded())
+            self.rotate()
+        return path
+
+    def write_totals(self, totals):
+        path = os.path.join(self.directory, f"hot-{os.getpid()}.folded")
+        with self._lock:
+            with open(f"{path}.tmp", "w") as f:
+                for name, stacks in totals.items():
+                    for stack, count in stacks.most_common():
+                        f.write(f"{name};{stack} {count}\n")
+            os.replace(f"{path}.tmp", path)
+
+    def rotate(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory)
+             if entry.name.endswith(".folded") and not entry.name.startswith("hot-")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:max(len(profiles) - self.keep, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+sampler = Sampler()
+
+
+def init_profiling(app):
+    """Profile the configured views on request or at random; see the module docstring."""
+
+    from flask import g, request
+
+    app.config.setdefault("PROFILE_ENDPOINTS", DEFAULT_ENDPOINTS)
+    app.config.setdefault("PROFILE_ADMINS", ())
+    app.config.setdefault("PROFILE_SAMPLE_RATE", 0.0)
+    app.config.setdefault("PROFILE_INTERVAL", 0.005)
+    app.config.setdefault("PROFILE_DIR", "profiles")
+    app.config.setdefault("PROFILE_KEEP", 200)
+
+    sampler.interval = app.config["PROFILE_INTERVAL"]
+    writer = ProfileWriter(app.config["PROFILE_DIR"], app.config["PROFILE_KEEP"])
+    endpoints = frozenset(app.config["PROFILE_ENDPOINTS"])
+    admins = frozenset(app.config["PROFILE_ADMINS"])
+
+    def requested_by_admin():
+        if request.headers.get("X-Profile") != "1" and request.args.get("profile") != "1":
+            return False
+        # the username comes from the identity cache, so this is usually free
+        return bool(g.get("user")) and g.user.username in admins
+
+    @app.before_request
+    def start_profile():
+        if request.endpoint not in endpoints:
+            return
+        rate = app.config["PROFILE_SAMPLE_RATE"]
+        if (rate and random.random() < rate) or (admins and requested_by_admin()):
+            g.profile = sampler.start(request.endpoint)
+
+    # teardown, so a streamed listing is profiled until its last chunk
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        sampler.stop(profile)
+        if profile.samples:
+            writer.write(profile)
+            writer.write_totals(sampler.snapshot())
+
+    return writer
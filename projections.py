@@ -0,0 +1,162 @@
+"""Compact projections of Petfinder API payloads.
+
+The API returns dozens of nested fields per animal or organization, but the
+listing templates only use a handful of them. These records keep just those
+fields so rendered pages and anything we cache stay small.
+"""
+
+from normalize import CARD_TEXT_LENGTH, normalize_many, normalize_text
+
+DEFAULT_IMG_URL = "https://img.freepik.com/free-vector/cute-dog-sitting-cartoon-vector-icon-illustration-animal-nature-icon-concept-isolated-premium-vector-flat-cartoon-style_138676-3671.jpg"
+
+
+def first_photo(payload, size):
+    """Return the `size` url of the first photo in `payload`, or None."""
+
+    photos = payload.get("photos") or []
+    if len(photos) == 0:
+        return None
+    return photos[0].get(size)
+
+
+class AnimalCard:
+    """An animal as shown on templates/animals/index.html."""
+
+    __slots__ = ("id", "name", "description", "photo")
+
+    def __init__(self, id, name, description=None, photo=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.photo = photo
+
+    def __repr__(self):
+        return f"<AnimalCard #{self.id}: {self.name}>"
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_api(cls, payload, description=None):
+        """Build a card from one entry of the API's `animals` list.
+
+        Pass `description` when it has already been normalized in a batch.
+        """
+
+        if description is None:
+            description = normalize_text(payload.get("description"), CARD_TEXT_LENGTH)
+        return cls(
+            id=payload["id"],
+            name=payload.get("name"),
+            description=description,
+            photo=first_photo(payload, "small"),
+        )
+
+
+class OrgCard:
+    """An organization as shown on templates/organizations/index.html."""
+
+    __slots__ = ("id", "name", "mission_statement", "photo")
+
+    def __init__(self, id, name, mission_statement=None, photo=None):
+        self.id = id
+        self.name = name
+        self.mission_statement = mission_statement
+        self.photo = photo
+
+    def __repr__(self):
+        return f"<OrgCard #{self.id}: {self.name}>"
+
+    def as_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_api(cls, payload, mission_statement=None):
+        """Build a card from one entry of the API's `organizations` list.
+
+        Pass `mission_statement` when it has already been normalized in a batch.
+        """
+
+        if mission_statement is None:
+            mission_statement = normalize_text(payload.get("mission_statement"), CARD_TEXT_LENGTH)
+        return cls(
+            id=payload["id"],
+            name=payload.get("name"),
+            mission_statement=mission_statement,
+            photo=first_photo(payload, "medium"),
+        )
+
+
+def project_animals(payloads):
+    """Project the API's `animals` list into AnimalCards."""
+
+    descriptions = normalize_many(
+        [payload.get("description") for payload in payloads], CARD_TEXT_LENGTH
+    )
+    return [
+        AnimalCard.from_api(payload, description)
+        for payload, description in zip(payloads, descriptions)
+    ]
+
+
+def project_organizations(payloads):
+    """Project the API's `organizations` list into OrgCards."""
+
+    statements = normalize_many(
+        [payload.get("mission_statement") for payload in payloads], CARD_TEXT_LENGTH
+    )
+    return [
+        OrgCard.from_api(payload, statement)
+        for payload, statement in zip(payloads, statements)
+    ]
+
+
+def project_types(payloads):
+    """Only the names of the API's animal `types` are used by the search form."""
+
+    return [payload["name"] for payload in payloads]
+
+
+def project_address(address):
+    address = address or {}
+    return {
+        field: address.get(field)
+        for field in ("address1", "address2", "city", "state", "postcode")
+    }
+
+
+def animal_detail(payload):
+    """The fields of an animal that templates/animals/details.html renders."""
+
+    contact = payload.get("contact") or {}
+    return {
+        "id": payload["id"],
+        "name": payload.get("name"),
+        "species": payload.get("species"),
+        "status": payload.get("status"),
+        "gender": payload.get("gender"),
+        "age": payload.get("age"),
+        "description": normalize_text(payload.get("description")),
+        "photo": first_photo(payload, "medium"),
+        "url": payload.get("url"),
+        "contact": {
+            "email": contact.get("email"),
+            "phone": contact.get("phone"),
+            "address": project_address(contact.get("address")),
+        },
+    }
+
+
+def org_detail(payload):
+    """The fields of an organization that templates/organizations/details.html renders."""
+
+    return {
+        "id": payload["id"],
+        "name": payload.get("name"),
+        "email": payload.get("email"),
+        "phone": payload.get("phone"),
+        "mission_statement": normalize_text(payload.get("mission_statement")),
+        "photo": first_photo(payload, "medium"),
+        "url": payload.get("url"),
+        "address": project_address(payload.get("address")),
+    }
@@ -0,0 +1,149 @@
+"""Sending read-only requests to read replicas.
+
+Set SQLALCHEMY_REPLICA_URIS to a list of replica database URLs and the
+database session (see models.RoutingSession) will run the queries of GET and
+HEAD requests on one of them, round robin, while anything that writes stays
+on the primary.
+
+A replica whose replay lag is over REPLICA_MAX_LAG seconds, or that can't be
+reached, is skipped until its next check; with no usable replica, reads go
+back to the primary. After a request commits a write, its client is kept on
+the primary for REPLICA_STICKY_SECONDS (through a cookie, so it holds
+across workers), so a like toggle is never followed by a page that doesn't
+show it.
+"""
+
+import itertools
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from engines import engine_options, track_pool
+
+STICKY_COOKIE = "primary_until"
+READ_METHODS = ("GET", "HEAD")
+
+LAG_QUERY = text(
+    "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+)
+
+
+class Replica:
+    """One replica database and what we last saw of its lag."""
+
+    def __init__(self, uri, engine):
+        self.uri = uri
+        self.engine = engine
+        self.lag = None
+        self.healthy = False
+        self.checked = 0
+
+
+class ReplicaRouter:
+    """Picks a replica that is reachable and caught up enough."""
+
+    def __init__(self, engines, max_lag=5, check_interval=10):
+        self.replicas = [Replica(uri, engine) for uri, engine in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cycle = itertools.cycle(self.replicas)
+        self._lock = threading.Lock()
+
+    def check(self, replica):
+        """Measure `replica`'s replay lag and mark it healthy or not."""
+
+        try:
+            with replica.engine.connect() as conn:
+                replica.lag = float(conn.execute(LAG_QUERY).scalar())
+            replica.healthy = replica.lag <= self.max_lag
+        except SQLAlchemyError:
+            replica.lag = None
+            replica.healthy = False
+        replica.checked = time.time()
+
+    def choose(self):
+        """The engine of the next usable replica, or None for the primary."""
+
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._cycle)
+            if time.time() - replica.checked >= self.check_interval:
+                self.check(replica)
+            if replica.healthy:
+                return replica.engine
+        return None
+
+
+def reads_from_replica():
+    """Whether this request's reads may go to a replica."""
+
+    return (
+        has_request_context()
+        and request.method in READ_METHODS
+        and not g.get("db_primary", False)
+    )
+
+
+# Session event hooks, registered once on models.RoutingSession. Only a
+# commit that flushed something counts as a write.
+
+def note_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+def forget_write(session):
+    session.info.pop("wrote", None)
+
+
+def remember_write(session):
+    """After a commit that wrote, keep this client on the primary."""
+
+    if session.info.pop("wrote", False) and has_request_context():
+        g.db_primary = True
+        g.db_wrote = True
+
+
+def init_replicas(app):
+    """Route `app`'s read-only requests to SQLALCHEMY_REPLICA_URIS, if any."""
+
+    app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+    app.config.setdefault("REPLICA_MAX_LAG", 5)
+    app.config.setdefault("REPLICA_CHECK_INTERVAL", 10)
+    app.config.setdefault("REPLICA_STICKY_SECONDS", 10)
+
+    uris = app.config["SQLALCHEMY_REPLICA_URIS"]
+    if not uris:
+        return
+
+    engines = []
+    for i, uri in enumerate(uris):
+        engine = create_engine(uri, **engine_options(app.config))
+        track_pool(f"replica{i}", engine)
+        engines.append((uri, engine))
+
+    app.extensions["replicas"] = ReplicaRouter(
+        engines,
+        max_lag=app.config["REPLICA_MAX_LAG"],
+        check_interval=app.config["REPLICA_CHECK_INTERVAL"],
+    )
+    sticky_seconds = app.config["REPLICA_STICKY_SECONDS"]
+
+    @app.before_request
+    def stick_to_primary():
+        try:
+            until = float(request.cookies.get(STICKY_COOKIE, 0))
+        except ValueError:
+            until = 0
+        g.db_primary = until > time.time()
+
+    @app.after_request
+    def set_sticky_cookie(response):
+        if g.get("db_wrote"):
+            response.set_cookie(
+                STICKY_COOKIE, str(int(time.time() + sticky_seconds)),
+                max_age=sticky_seconds, httponly=True,
+            )
+        return response
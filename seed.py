@@ -1,11 +1,248 @@
-"""Seed database with sample data from CSV Files."""
+"""Seed the database, optionally with a large synthetic dataset.
 
-from csv import DictReader
-from app import db
-from models import User, SavedOrgs, Organization, Animal, SavedAnimals
+With no options this drops and recreates the tables, as it always has:
 
+    python seed.py
 
-db.drop_all()
-db.create_all()
+Given counts, it then fills them with fake users, animals, organizations and
+likes:
 
-db.session.commit()
+    python seed.py --users 1000000 --animals 2000000 --organizations 50000 \\
+        --likes-per-user 20 --workers 8 --seed 7
+
+Rows are generated by Faker in chunks of --chunk-size, each chunk seeded
+from --seed and its position, and loaded with COPY by --workers processes in
+parallel; the same options always produce the same data, whatever the
+number of workers. Which animals and organizations get liked follows a Zipf
+distribution (--zipf), so a few are liked by many users and most by few,
+and the number of likes per user is exponentially distributed around
+--likes-per-user.
+
+Animal and organization ids follow benchmarks/fake_petfinder.py (10000000 +
+n and ORG0000), so likes seeded here line up with what the fake API serves.
+Every user's password is --password, hashed once.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import multiprocessing
+import random
+import time
+
+from app import create_app
+from models import db, User, SavedOrgs, Organization, Animal, SavedAnimals
+from passwords import hasher
+from projections import DEFAULT_IMG_URL
+
+ANIMAL_ID_BASE = 10000000
+COLUMNS = {
+    "users": ("id", "email", "username", "password"),
+    "animals": ("id", "name", "img_url", "description"),
+    "organizations": ("id", "name", "img_url", "mission_statement"),
+    "animal_likes": ("user_id", "animal_id"),
+    "org_likes": ("user_id", "org_id"),
+}
+
+
+def animal_id(n):
+    return str(ANIMAL_ID_BASE + n)
+
+
+def org_id(n):
+    return f"ORG{n:04d}"
+
+
+def chunk_seed(seed, table, start):
+    """The seed of one chunk: the same whichever worker generates it."""
+
+    return f"{seed}:{table}:{start}"
+
+
+def make_faker(seed):
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    return fake
+
+
+##############################################################################
+# Rows
+
+
+def user_rows(start, stop, seed, password):
+    fake = make_faker(chunk_seed(seed, "users", start))
+    for n in range(start, stop):
+        username = f"{fake.user_name()}_{n}"
+        yield (n + 1, f"{username}@{fake.free_email_domain()}", username, password)
+
+
+def animal_rows(start, stop, seed):
+    fake = make_faker(chunk_seed(seed, "animals", start))
+    for n in range(start, stop):
+        yield (animal_id(n), fake.first_name(), DEFAULT_IMG_URL, fake.sentence(nb_words=12))
+
+
+def organization_rows(start, stop, seed):
+    fake = make_faker(chunk_seed(seed, "organizations", start))
+    for n in range(start, stop):
+        yield (org_id(n), f"{fake.last_name()} Animal Rescue", DEFAULT_IMG_URL, fake.sentence(nb_words=20))
+
+
+# (items, zipf, seed) -> (shuffled item numbers, cumulative weights); built
+# once per worker process
+popularity_cache = {}
+
+
+def popularity(items, zipf, seed):
+    """Item numbers ranked from most to least popular, with Zipf cumulative weights."""
+
+    key = (items, zipf, seed)
+    if key not in popularity_cache:
+        ranked = list(range(items))
+        random.Random(f"{seed}:popularity:{items}").shuffle(ranked)
+        weights = list(itertools.accumulate(1 / rank ** zipf for rank in range(1, items + 1)))
+        popularity_cache[key] = (ranked, weights)
+    return popularity_cache[key]
+
+
+def like_rows(table, start, stop, seed, items, mean, zipf):
+    """Likes of users start + 1 .. stop for `items` animals or organizations."""
+
+    ranked, weights = popularity(items, zipf, seed)
+    make_id = animal_id if table == "animal_likes" else org_id
+    rng = random.Random(chunk_seed(seed, table, start))
+    for n in range(start, stop):
+        count = min(int(rng.expovariate(1 / mean)), items)
+        if not count:
+            continue
+        liked = set(rng.choices(ranked, cum_weights=weights, k=count))
+        for item in sorted(liked):
+            yield (n + 1, make_id(item))
+
+
+##############################################################################
+# Loading
+
+
+def copy_rows(connect_args, table, rows):
+    """COPY `rows` into `table` over a connection of our own; returns the row count."""
+
+    import psycopg2
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    buffer.seek(0)
+
+    conn = psycopg2.connect(**connect_args)
+    try:
+        with conn.cursor() as cur:
+            # a lost seed run is simply run again
+            cur.execute("SET synchronous_commit = off")
+            cur.copy_expert(f"COPY {table} ({', '.join(COLUMNS[table])}) FROM STDIN WITH (FORMAT csv)", buffer)
+        conn.commit()
+    finally:
+        conn.close()
+    return count
+
+
+def load_chunk(task):
+    """Generate and load one chunk; runs in a worker process."""
+
+    table, start, stop, options = task
+    if table == "users":
+        rows = user_rows(start, stop, options["seed"], options["password"])
+    elif table == "animals":
+        rows = animal_rows(start, stop, options["seed"])
+    elif table == "organizations":
+        rows = organization_rows(start, stop, options["seed"])
+    else:
+        items = options["animals"] if table == "animal_likes" else options["organizations"]
+        rows = like_rows(table, start, stop, options["seed"], items, options["likes_per_user"], options["zipf"])
+    return table, copy_rows(options["connect_args"], table, rows)
+
+
+def chunk_tasks(table, total, chunk_size, options):
+    return [(table, start, min(start + chunk_size, total), options) for start in range(0, total, chunk_size)]
+
+
+def run_tasks(pool, tasks):
+    """Load every task's chunk, printing a running total per table."""
+
+    loaded = {}
+    started = time.perf_counter()
+    for table, count in pool.imap_unordered(load_chunk, tasks):
+        loaded[table] = loaded.get(table, 0) + count
+        print(f"\r{table}: {loaded[table]} rows", end="", flush=True)
+    if tasks:
+        print(f"\r{', '.join(f'{table}: {count} rows' for table, count in loaded.items())}"
+              f" in {time.perf_counter() - started:.1f}s")
+
+
+def generate(args):
+    connect_args = db.engine.url.translate_connect_args(username="user", database="dbname")
+    options = {
+        "connect_args": connect_args,
+        "seed": args.seed,
+        "password": hasher.hash(args.password),
+        "animals": args.animals,
+        "organizations": args.organizations,
+        "likes_per_user": args.likes_per_user,
+        "zipf": args.zipf,
+    }
+
+    entity_tasks = (
+        chunk_tasks("users", args.users, args.chunk_size, options)
+        + chunk_tasks("animals", args.animals, args.chunk_size, options)
+        + chunk_tasks("organizations", args.organizations, args.chunk_size, options)
+    )
+    # likes reference the rows above, so they go in once those are loaded
+    like_tasks = []
+    if args.likes_per_user:
+        if args.animals:
+            like_tasks += chunk_tasks("animal_likes", args.users, args.chunk_size, options)
+        if args.organizations:
+            like_tasks += chunk_tasks("org_likes", args.users, args.chunk_size, options)
+
+    with multiprocessing.Pool(args.workers) as pool:
+        run_tasks(pool, entity_tasks)
+        run_tasks(pool, like_tasks)
+
+    # ids were given explicitly, so move the sequence past them
+    db.session.execute("SELECT setval(pg_get_serial_sequence('users', 'id'), GREATEST(MAX(id), 1)) FROM users")
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recreate the tables and fill them with fake data.")
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--animals", type=int, default=0)
+    parser.add_argument("--organizations", type=int, default=0)
+    parser.add_argument("--likes-per-user", type=float, default=0, help="mean likes of each kind per user")
+    parser.add_argument("--zipf", type=float, default=1.1, help="skew of which items get liked")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--password", default="password", help="every fake user's password")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    create_app()
+    db.drop_all()
+    db.create_all()
+
+    db.session.commit()
+
+    if args.users or args.animals or args.organizations:
+        generate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Server-side sessions.
+
+The browser only holds a random session id; the data lives in a store picked
+by the SESSION_BACKEND config:
+
+- "memory": a dict in this process, for development.
+- "file": one file per session under SESSION_FILE_DIR, shared by every
+  worker on the host.
+- "sql": the `sessions` table, shared by every host using the database.
+- "cookie": Flask's signed cookie sessions, as before.
+
+Session data is only read from the store the first time a request touches
+it, and only written back when the request changed it. Expired sessions are
+swept out every SESSION_SWEEP_INTERVAL seconds.
+"""
+
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask.json.tag import TaggedJSONSerializer
+from flask import session as current_session
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, StoredSession
+
+SID_RE = re.compile(r"^[A-Za-z0-9_-]{32,64}$")
+
+serializer = TaggedJSONSerializer()
+
+
+class ServerSideSession(SessionMixin):
+    """Session data loaded from the store on first use."""
+
+    def __init__(self, sid=None, loader=None):
+        self.sid = sid
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+        # the id this session had before `regenerate`, deleted on save
+        self.stale_sid = None
+        self._loader = loader
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self.accessed = True
+            loaded = self._loader() if self._loader is not None else None
+            if loaded is None and self.sid is not None:
+                # unknown or expired: never adopt an id the client picked
+                self.sid = None
+                self.new = True
+            self._data = loaded if loaded is not None else {}
+        return self._data
+
+    def regenerate(self):
+        """Move the data to a new id when saved, dropping the old one."""
+
+        self.data  # loaded under the old id
+        if not self.new:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.new = True
+        self.modified = True
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+
+##############################################################################
+# Stores
+
+class MemoryStore:
+    """Sessions in a dict in this process."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None or entry[0] < time.time():
+            return None
+        return serializer.loads(entry[1])
+
+    def save(self, sid, data, expires):
+        with self._lock:
+            self._sessions[sid] = (expires, serializer.dumps(data))
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires, _) in self._sessions.items() if expires < now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class FileStore:
+    """One file per session, shared by every worker process on the host.
+
+    A file's mtime is set to its expiry time.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            if os.path.getmtime(self.path(sid)) < time.time():
+                return None
+            with open(self.path(sid)) as f:
+                return serializer.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, sid, data, expires):
+        # write then rename so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(serializer.dumps(data))
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, self.path(sid))
+
+    def delete(self, sid):
+        try:
+            os.remove(self.path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        now = time.time()
+        swept = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < now:
+                    os.remove(path)
+                    swept += 1
+            except FileNotFoundError:
+                pass
+        return swept
+
+
+class SQLStore:
+    """Sessions in the `sessions` table, shared by every host.
+
+    Each read and write runs on its own connection to the primary (a replica
+    may not have the session a login just wrote yet), outside the request's
+    database session, so saving a session never commits, or trips over,
+    whatever the view left pending in it.
+    """
+
+    table = StoredSession.__table__
+
+    def load(self, sid):
+        with db.engine.connect() as conn:
+            stored = conn.execute(select([self.table.c.data]).where(and_(
+                self.table.c.id == sid, self.table.c.expires > datetime.utcnow()
+            ))).first()
+        if stored is None:
+            return None
+        return serializer.loads(stored.data)
+
+    def save(self, sid, data, expires):
+        values = {"data": serializer.dumps(data), "expires": datetime.utcfromtimestamp(expires)}
+        upsert = insert(self.table).values(id=sid, **values)
+        with db.engine.begin() as conn:
+            conn.execute(upsert.on_conflict_do_update(index_elements=[self.table.c.id], set_=values))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.id == sid))
+
+    def sweep(self):
+        with db.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires <= datetime.utcnow())).rowcount
+
+
+##############################################################################
+# Flask integration
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in `store` and only an id in the cookie."""
+
+    def __init__(self, store, sweep_interval=300):
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self._last_sweep = time.time()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if not sid or not SID_RE.match(sid):
+            return ServerSideSession()
+        return ServerSideSession(sid, loader=lambda: self.store.load(sid))
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session.modified:
+            return
+
+        if session.stale_sid is not None:
+            self.store.delete(session.stale_sid)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+            if not session.new or session.stale_sid is not None:
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        if session.new:
+            session.sid = secrets.token_urlsafe(32)
+
+        lifetime = app.permanent_session_lifetime
+        if not isinstance(lifetime, timedelta):
+            lifetime = timedelta(seconds=lifetime)
+        self.store.save(session.sid, dict(session), time.time() + lifetime.total_seconds())
+        self.maybe_sweep()
+
+        response.set_cookie(
+            app.session_cookie_name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+        )
+
+    def maybe_sweep(self):
+        if time.time() - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = time.time()
+        self.store.sweep()
+
+
+def rotate_session():
+    """Give the current session a new id, on login and logout.
+
+    An id someone learned or planted before then is useless afterwards.
+    Cookie sessions have no id to rotate.
+    """
+
+    if isinstance(current_session._get_current_object(), ServerSideSession):
+        current_session.regenerate()
+
+
+def make_store(app):
+    backend = app.config["SESSION_BACKEND"]
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "file":
+        return FileStore(app.config["SESSION_FILE_DIR"])
+    if backend == "sql":
+        return SQLStore()
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+def init_sessions(app):
+    """Switch `app` to server-side sessions unless it asks for cookies."""
+
+    app.config.setdefault("SESSION_BACKEND", "file")
+    app.config.setdefault(
+        "SESSION_FILE_DIR", os.path.join(tempfile.gettempdir(), "pet-adopter-sessions")
+    )
+    app.config.setdefault("SESSION_SWEEP_INTERVAL", 300)
+
+    if app.config["SESSION_BACKEND"] == "cookie":
+        return
+    app.session_interface = ServerSideSessionInterface(
+        make_store(app), sweep_interval=app.config["SESSION_SWEEP_INTERVAL"]
+    )
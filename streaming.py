@@ -0,0 +1,104 @@
+"""Streaming rendering for the listing pages.
+
+The layout, navbar and search controls don't depend on the Petfinder listing,
+so they are flushed to the browser before the listing is requested. The
+listing is a `Deferred`: it is fetched the moment the template first touches
+it, right after the `flush_marker` the template places in front of the grid.
+
+The streamed output is the same hole-y body the page cache stores, filled in
+chunk by chunk, and it is cached once the stream finishes. With no
+Content-Length set, the compression middleware compresses it per chunk.
+"""
+
+import requests
+from flask import Response, current_app, stream_with_context
+from markupsafe import Markup
+
+from page_cache import fill_holes, page_cache, render_holes
+
+FLUSH_MARKER = "<!--flush-->"
+
+# what a Petfinder call can fail with: a KeyError when the listing key is
+# missing, or a connection error, timeout or body that isn't JSON
+UPSTREAM_ERRORS = (KeyError, ValueError, requests.RequestException)
+
+
+class Deferred:
+    """A value computed the first time a template uses it.
+
+    An UPSTREAM_ERRORS from `fetch` leaves `default` in place and is kept in
+    `error`, since once the page has started streaming there is no
+    redirecting anymore. The token is fresh by then, so a KeyError means
+    nothing matched; anything else is `failed`, and the template asks the
+    user to try again.
+    """
+
+    def __init__(self, fetch, default=()):
+        self._fetch = fetch
+        self._default = default
+        self._value = None
+        self._done = False
+        self.error = None
+
+    def value(self):
+        if not self._done:
+            try:
+                self._value = self._fetch()
+            except UPSTREAM_ERRORS as error:
+                self.error = error
+                self._value = self._default
+            self._done = True
+        return self._value
+
+    @property
+    def failed(self):
+        self.value()
+        return self.error is not None and not isinstance(self.error, KeyError)
+
+    def __len__(self):
+        return len(self.value())
+
+    def __iter__(self):
+        return iter(self.value())
+
+    def __html__(self):
+        return self.value().__html__()
+
+
+def batches(pieces):
+    """Join Jinja's many small output pieces, breaking at flush markers."""
+
+    buffer = []
+    for piece in pieces:
+        if FLUSH_MARKER in piece:
+            head, _, tail = piece.partition(FLUSH_MARKER)
+            buffer.append(head)
+            yield "".join(buffer)
+            buffer = [tail]
+        else:
+            buffer.append(piece)
+    yield "".join(buffer)
+
+
+def stream_page(key, template_name, kind, listing, likes, **context):
+    """Stream `template_name`, flushing at its flush marker, then cache it.
+
+    `listing` is the Deferred list of cards; the page is cached under `key`
+    with its entities of `kind` only if the listing was fetched cleanly.
+    """
+
+    holes = render_holes()
+    template = current_app.jinja_env.get_template(template_name)
+    context.update(page_holes=True, flush_marker=Markup(FLUSH_MARKER))
+    current_app.update_template_context(context)
+
+    def generate():
+        parts = []
+        for batch in batches(template.generate(context)):
+            parts.append(batch)
+            yield fill_holes(batch, holes, likes)
+
+        if listing.error is None:
+            page_cache.set(key, "".join(parts), [(kind, card.id) for card in listing])
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
@@ -0,0 +1,128 @@
+"""JSON API tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_api.py
+
+
+from unittest import skipIf
+
+from models import db, Animal, User, SavedAnimals
+import petfinder
+import testing
+
+testing.setup_environment()
+
+from app import app, CURR_USER_KEY
+
+
+class APITestCase(testing.DatabaseTestCase):
+    """Test the /api/v1 endpoints."""
+
+    def setUp(self):
+        """Create test client and a user with one liked animal."""
+        super().setUp()
+
+        self.client = app.test_client()
+
+        self.testuser = User.signup(
+            username="testuser",
+            email="test@test.com",
+            password="testuser"
+        )
+        self.testuser_id = 1123
+        self.testuser.id = self.testuser_id
+
+        a1 = Animal(id='testid', name='testname', img_url='testurl', description='testdescription')
+        a2 = Animal(id='testid2', name='testname2', img_url='testurl2', description='testdescription2')
+        db.session.add_all([a1, a2])
+        db.session.commit()
+
+        db.session.add(SavedAnimals(user_id=self.testuser_id, animal_id='testid'))
+        db.session.commit()
+
+    def tearDown(self):
+        resp = super().tearDown()
+        db.session.rollback()
+        return resp
+
+    def login(self, c):
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.testuser_id
+
+    def test_unauthorized(self):
+        with self.client as c:
+            resp = c.get("/api/v1/animals")
+            self.assertEqual(resp.status_code, 401)
+            self.assertEqual(resp.get_json(), {"error": "Please login first!"})
+
+    def test_liked_animals(self):
+        with self.client as c:
+            self.login(c)
+
+            resp = c.get(f"/api/v1/users/{self.testuser_id}/animals")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.get_json()["data"], [{
+                "id": "testid",
+                "name": "testname",
+                "img_url": "testurl",
+                "description": "testdescription",
+            }])
+
+    def test_field_selection(self):
+        with self.client as c:
+            self.login(c)
+
+            resp = c.get(f"/api/v1/users/{self.testuser_id}/animals?fields=id,name")
+            self.assertEqual(resp.get_json()["data"], [{"id": "testid", "name": "testname"}])
+
+            resp = c.get(f"/api/v1/users/{self.testuser_id}/animals?fields=password")
+            self.assertEqual(resp.status_code, 400)
+
+    def test_toggle_like(self):
+        with self.client as c:
+            self.login(c)
+
+            resp = c.post("/api/v1/animals/testid2/like")
+            self.assertEqual(resp.get_json(), {"id": "testid2", "liked": True})
+
+            resp = c.post("/api/v1/animals/testid2/like")
+            self.assertEqual(resp.get_json(), {"id": "testid2", "liked": False})
+
+            likes = SavedAnimals.query.filter(SavedAnimals.user_id == self.testuser_id).all()
+            self.assertEqual(len(likes), 1)
+
+    def test_invalid_cursor(self):
+        with self.client as c:
+            self.login(c)
+
+            resp = c.get("/api/v1/animals?cursor=garbage")
+            self.assertEqual(resp.status_code, 400)
+
+    @skipIf(testing.upstream is None, "needs the fake Petfinder API")
+    def test_details_refresh_expired_token(self):
+        with self.client as c:
+            self.login(c)
+            petfinder.token_state["token"] = "expired"
+
+            resp = c.get("/api/v1/animals/10000007")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.get_json()["id"], 10000007)
+
+            resp = c.get("/api/v1/animals/99")
+            self.assertEqual(resp.status_code, 404)
+
+    @skipIf(testing.upstream is None, "needs the fake Petfinder API")
+    def test_listings_refresh_only_expired_token(self):
+        with self.client as c:
+            self.login(c)
+            petfinder.token_state["token"] = "expired"
+
+            resp = c.get("/api/v1/animals?gender=female")
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.get_json()["data"])
+
+            token = petfinder.token_state["token"]
+            resp = c.get("/api/v1/animals?name=nobody-is-called-this")
+            self.assertEqual(resp.get_json()["data"], [])
+            self.assertEqual(petfinder.token_state["token"], token)
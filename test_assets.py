@@ -0,0 +1,44 @@
+"""Static asset pipeline tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_assets.py
+
+
+import gzip
+import os
+import tempfile
+from unittest import TestCase
+
+from assets import build, fingerprint, minify_css, STATIC_DIR
+
+
+class AssetBuildTestCase(TestCase):
+    """Test building fingerprinted assets."""
+
+    def test_minify_css(self):
+        css = "/* nav */\na > b , c {\n  color: red;\n}\n"
+        self.assertEqual(minify_css(css), "a>b,c{color: red}")
+
+    def test_fingerprint_changes_with_content(self):
+        self.assertNotEqual(
+            fingerprint("stylesheets/style.css", b"a"), fingerprint("stylesheets/style.css", b"b")
+        )
+        self.assertTrue(fingerprint("images/logo.png", b"a").startswith("images/logo."))
+
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dist = os.path.join(tmp, "dist")
+            manifest = build(STATIC_DIR, dist)
+
+            css = manifest["stylesheets/style.css"]
+            with open(os.path.join(dist, css), "rb") as f:
+                content = f.read()
+            with gzip.open(os.path.join(dist, css + ".gz")) as f:
+                self.assertEqual(f.read(), content)
+
+            # the stylesheet points at the fingerprinted background image
+            self.assertIn(manifest["images/nav-bg.png"].encode(), content)
+
+            # pngs are already compressed
+            self.assertFalse(os.path.exists(os.path.join(dist, manifest["images/logo.png"] + ".gz")))
@@ -0,0 +1,116 @@
+"""Fake Petfinder API and benchmark statistics tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_benchmarks.py
+
+
+from unittest import TestCase
+
+import requests
+
+from benchmarks import fake_petfinder
+from benchmarks.load import Report, parse_mix
+from benchmarks.stats import RouteStats, compare, percentile
+
+
+class FakePetfinderTestCase(TestCase):
+    """Test the stand-in API."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fake_petfinder.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.error_rate = self.server.expire_rate = 0.0
+        res = requests.post(f"{self.server.url}/oauth2/token", json={"grant_type": "client_credentials"})
+        self.headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    def get(self, path, **params):
+        return requests.get(f"{self.server.url}{path}", headers=self.headers, params=params)
+
+    def test_listing(self):
+        data = self.get("/animals", page=2, limit=42, type="Dog").json()
+        self.assertLessEqual(len(data["animals"]), 42)
+        self.assertTrue(all(animal["type"] == "Dog" for animal in data["animals"]))
+        self.assertEqual(data["pagination"]["current_page"], 2)
+
+        data = self.get("/organizations", state="CA").json()
+        self.assertTrue(all(org["address"]["state"] == "CA" for org in data["organizations"]))
+
+    def test_details(self):
+        self.assertEqual(self.get("/animals/10000000").json()["animal"]["id"], 10000000)
+        self.assertEqual(self.get("/organizations/ORG0001").json()["organization"]["id"], "ORG0001")
+        self.assertEqual(self.get("/animals/1").status_code, 404)
+
+    def test_types(self):
+        self.assertIn({"name": "Dog"}, self.get("/types").json()["types"])
+
+    def test_auth_and_errors(self):
+        res = requests.get(f"{self.server.url}/animals")
+        self.assertEqual(res.status_code, 401)
+        self.assertNotIn("animals", res.json())
+
+        self.server.error_rate = 1.0
+        self.assertEqual(self.get("/animals").status_code, 500)
+
+        self.server.error_rate, self.server.expire_rate = 0.0, 1.0
+        self.assertEqual(self.get("/animals").status_code, 401)
+        self.server.expire_rate = 0.0
+        # the token is gone until a new one is fetched
+        self.assertEqual(self.get("/animals").status_code, 401)
+
+    def test_same_seed_same_fixtures(self):
+        first = fake_petfinder.Fixtures(seed=3, animals=10, organizations=5)
+        second = fake_petfinder.Fixtures(seed=3, animals=10, organizations=5)
+        self.assertEqual(first.animals, second.animals)
+
+
+class StatsTestCase(TestCase):
+    """Test latency summaries and baseline comparison."""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summary(self):
+        stats = RouteStats("route")
+        for ms in range(1, 11):
+            stats.record(ms / 1000, ok=ms != 10)
+        summary = stats.summary(elapsed=2)
+        self.assertEqual(summary["requests"], 10)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["rps"], 5.0)
+        self.assertEqual(summary["p50"], 5.0)
+
+    def test_compare(self):
+        baseline = {"route": {"p95": 100, "rps": 50}}
+        _, regressed = compare({"route": {"p95": 105, "rps": 49}}, baseline)
+        self.assertFalse(regressed)
+        _, regressed = compare({"route": {"p95": 150, "rps": 50}}, baseline)
+        self.assertTrue(regressed)
+
+
+class LoadTestCase(TestCase):
+    """Test the load generator's bookkeeping."""
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("browse=6,like"), {"browse": 6.0, "like": 1.0})
+        with self.assertRaises(SystemExit):
+            parse_mix("run=1")
+
+    def test_report(self):
+        report = Report()
+        report.record("animals", 0.02, True)
+        report.record("animals", 0.04, False)
+        report.record("save_animal", 0.01, True)
+        summary = report.summary(elapsed=1)
+        self.assertEqual(list(summary), ["animals", "save_animal"])
+        self.assertEqual(summary["animals"]["errors"], 1)
@@ -0,0 +1,96 @@
+"""Query, upstream call and time budget tests for the views."""
+
+# run these tests like:
+#
+#    python -m unittest test_budgets.py
+#
+# The Petfinder API is the stand-in from benchmarks/fake_petfinder.py (see
+# testing.py), so no credentials or network are needed. When one fails, the
+# message lists every statement and upstream call the request made.
+
+
+import testing
+
+testing.setup_environment()
+
+import petfinder
+from app import app, CURR_USER_KEY
+from budgets import Budget, BudgetExceeded, SlowRequest, check_budget
+from models import db, User
+
+app.config["WTF_CSRF_ENABLED"] = False
+
+ANIMAL_ID = "10000007"
+ORG_ID = "ORG0003"
+
+
+class BudgetTestCase(testing.DatabaseTestCase):
+    """Test that each route stays within its declared budget."""
+
+    def setUp(self):
+        super().setUp()
+
+        self.user = User.signup(username="testuser", email="test@test.com", password="testuser")
+        db.session.commit()
+        self.user_id = self.user.id
+        db.session.expunge_all()
+
+        # the caches start out empty; only the OAuth token is kept
+        petfinder.refresh_token()
+
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.user_id
+
+    def check(self, method, path):
+        response, usage = check_budget(app, self.client, method, path, headers={"Referer": "/animals/1"})
+        self.assertLess(response.status_code, 400)
+        return usage
+
+    def test_listings(self):
+        self.check("GET", "/animals/1")
+        self.check("GET", "/animals/1?type=Dog&gender=Female")
+        self.check("GET", "/organizations/1")
+        self.check("GET", "/organizations/1?state=CA")
+
+    def test_details(self):
+        self.check("GET", f"/animal/details/{ANIMAL_ID}")
+        self.check("GET", f"/organization/details/{ORG_ID}")
+
+    def test_likes(self):
+        # first like of a new animal: fetched from the API and stored
+        self.check("POST", f"/animal/save/{ANIMAL_ID}")
+        self.check("POST", f"/organization/save/{ORG_ID}")
+        # unlike and like again: no upstream call at all
+        for _ in range(2):
+            usage = self.check("POST", f"/animal/save/{ANIMAL_ID}")
+            self.assertEqual(usage.upstream, [])
+            self.check("POST", f"/organization/save/{ORG_ID}")
+
+        self.check("GET", f"/users/{self.user_id}/animals")
+        self.check("GET", f"/users/{self.user_id}/organizations")
+
+    def test_home(self):
+        usage = self.check("GET", "/")
+        self.assertEqual(usage.upstream, [])
+
+    def test_report(self):
+        view = app.view_functions["views.homepage"]
+        view.budget, saved = Budget(queries=0), view.budget
+        try:
+            with self.assertRaises(BudgetExceeded) as raised:
+                self.check("GET", "/")
+        finally:
+            view.budget = saved
+        self.assertIn("views.homepage (GET /) went over its budget", str(raised.exception))
+        self.assertIn("queries: 1, budget 0", str(raised.exception))
+
+    def test_time_is_only_reported(self):
+        view = app.view_functions["views.homepage"]
+        view.budget, saved = Budget(ms=0), view.budget
+        try:
+            with self.assertWarns(SlowRequest) as warned:
+                self.check("GET", "/")
+        finally:
+            view.budget = saved
+        self.assertIn("ms: ", str(warned.warning))
@@ -0,0 +1,87 @@
+"""Compression middleware tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_compression.py
+
+
+import gzip
+from unittest import TestCase
+
+from compression import CompressionMiddleware, negotiate, parse_accept_encoding
+
+PAGE = b"<div class='card'>hello</div>" * 100
+
+
+def make_app(body, content_type="text/html; charset=utf-8", length=True, extra=()):
+    def app(environ, start_response):
+        headers = [("Content-Type", content_type)] + list(extra)
+        if length:
+            headers.append(("Content-Length", str(len(body))))
+        start_response("200 OK", headers)
+        if length:
+            return [body]
+        return iter([body[:100], body[100:]])
+
+    return app
+
+
+def call(app, accept="gzip"):
+    environ = {"REQUEST_METHOD": "GET", "HTTP_ACCEPT_ENCODING": accept}
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"] = status
+        response["headers"] = dict(headers)
+
+    response["body"] = b"".join(app(environ, start_response))
+    return response
+
+
+class CompressionTestCase(TestCase):
+    """Test negotiating and compressing responses."""
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(
+            parse_accept_encoding("gzip, deflate;q=0.5, identity;q=0"),
+            {"gzip": 1.0, "deflate": 0.5, "identity": 0.0},
+        )
+        self.assertIsNone(negotiate("gzip;q=0"))
+        self.assertEqual(negotiate("gzip"), "gzip")
+
+    def test_compresses_html(self):
+        middleware = CompressionMiddleware(make_app(PAGE))
+        resp = call(middleware)
+
+        self.assertEqual(resp["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(resp["headers"]["Vary"], "Accept-Encoding")
+        self.assertEqual(int(resp["headers"]["Content-Length"]), len(resp["body"]))
+        self.assertEqual(gzip.decompress(resp["body"]), PAGE)
+        self.assertEqual(middleware.stats.bytes_in, len(PAGE))
+        self.assertGreater(middleware.stats.bytes_saved, 0)
+
+    def test_streams_without_content_length(self):
+        resp = call(CompressionMiddleware(make_app(PAGE, length=False)))
+
+        self.assertNotIn("Content-Length", resp["headers"])
+        self.assertEqual(gzip.decompress(resp["body"]), PAGE)
+
+    def test_skips_small_and_encoded_and_binary(self):
+        resp = call(CompressionMiddleware(make_app(b"tiny")))
+        self.assertNotIn("Content-Encoding", resp["headers"])
+        self.assertEqual(resp["body"], b"tiny")
+
+        resp = call(CompressionMiddleware(make_app(PAGE, extra=[("Content-Encoding", "br")])))
+        self.assertEqual(resp["headers"]["Content-Encoding"], "br")
+        self.assertEqual(resp["body"], PAGE)
+
+        resp = call(CompressionMiddleware(make_app(PAGE, content_type="image/png")))
+        self.assertNotIn("Content-Encoding", resp["headers"])
+
+    def test_no_accept_encoding(self):
+        resp = call(CompressionMiddleware(make_app(PAGE)), accept="")
+        self.assertEqual(resp["body"], PAGE)
+
+    def test_strong_etag_becomes_weak(self):
+        resp = call(CompressionMiddleware(make_app(PAGE, extra=[("ETag", '"abc"')])))
+        self.assertEqual(resp["headers"]["ETag"], 'W/"abc"')
@@ -0,0 +1,35 @@
+"""App settings and profile tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_config.py
+
+
+from unittest import TestCase
+
+import config
+
+
+class ConfigTestCase(TestCase):
+    """Test how profiles, the environment and overrides combine."""
+
+    def test_profile_from_flask_env(self):
+        self.assertEqual(config.load(environ={})["ENV"], "production")
+        self.assertFalse(config.load(environ={})["DEBUG_TB_ENABLED"])
+        self.assertTrue(config.load(environ={"FLASK_ENV": "development"})["DEBUG_TB_ENABLED"])
+        self.assertEqual(config.load("test", environ={"FLASK_ENV": "development"})["BCRYPT_LOG_ROUNDS"], 4)
+
+    def test_precedence(self):
+        environ = {"BCRYPT_LOG_ROUNDS": "6", "DB_POOL_PRE_PING": "0", "PROFILE_ADMINS": "ann,,bob"}
+        settings = config.load("test", environ=environ)
+        self.assertEqual(settings["BCRYPT_LOG_ROUNDS"], 6)
+        self.assertFalse(settings["SQLALCHEMY_POOL_PRE_PING"])
+        self.assertEqual(settings["PROFILE_ADMINS"], ["ann", "bob"])
+        self.assertEqual(settings["PAGE_CACHE_SIZE"], 500)
+
+        settings = config.load("test", {"BCRYPT_LOG_ROUNDS": 5}, environ=environ)
+        self.assertEqual(settings["BCRYPT_LOG_ROUNDS"], 5)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            config.load("staging", environ={})
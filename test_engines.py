@@ -0,0 +1,50 @@
+"""Engine configuration tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_engines.py
+
+
+from unittest import TestCase
+
+from sqlalchemy.pool import NullPool
+
+from engines import PreparedStatement, engine_options, prepared_statements_enabled
+
+
+class EngineOptionsTestCase(TestCase):
+    """Test building create_engine options from the config."""
+
+    def test_pool_options(self):
+        options = engine_options({
+            "SQLALCHEMY_POOL_SIZE": 5,
+            "SQLALCHEMY_MAX_OVERFLOW": 2,
+            "SQLALCHEMY_POOL_RECYCLE": 1800,
+        })
+        self.assertEqual(options, {
+            "pool_size": 5,
+            "max_overflow": 2,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,
+        })
+
+    def test_pgbouncer(self):
+        config = {"SQLALCHEMY_POOL_SIZE": 5, "SQLALCHEMY_PGBOUNCER": True}
+        options = engine_options(config)
+        self.assertIs(options["poolclass"], NullPool)
+        self.assertNotIn("pool_size", options)
+        self.assertFalse(prepared_statements_enabled(config))
+
+
+class PreparedStatementTestCase(TestCase):
+    """Test the PREPARE and EXECUTE statements."""
+
+    def test_sql(self):
+        statement = PreparedStatement(
+            "likes", "SELECT * FROM t WHERE a = :a AND b = :b::text", a="integer", b="text"
+        )
+        self.assertEqual(
+            statement.prepare_sql,
+            "PREPARE likes (integer, text) AS SELECT * FROM t WHERE a = $1 AND b = $2::text",
+        )
+        self.assertEqual(statement.execute_sql, "EXECUTE likes(:a, :b)")
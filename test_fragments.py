@@ -0,0 +1,57 @@
+"""Fragment cache tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_fragments.py
+
+
+from unittest import TestCase
+
+from fragments import FragmentCache, card_version, fill_likes, like_hole
+from projections import AnimalCard
+
+
+class FragmentCacheTestCase(TestCase):
+    """Test the LRU of rendered cards."""
+
+    def setUp(self):
+        self.cache = FragmentCache(maxsize=2)
+
+    def test_hit_and_version_miss(self):
+        self.cache.set(("animal", "1"), 1, "<div>1</div>")
+
+        self.assertEqual(self.cache.get(("animal", "1"), 1), "<div>1</div>")
+        self.assertIsNone(self.cache.get(("animal", "1"), 2))
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_lru_eviction(self):
+        self.cache.set(("animal", "1"), 1, "a")
+        self.cache.set(("animal", "2"), 1, "b")
+        self.cache.get(("animal", "1"), 1)
+        self.cache.set(("animal", "3"), 1, "c")
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get(("animal", "2"), 1))
+        self.assertEqual(self.cache.get(("animal", "1"), 1), "a")
+
+    def test_invalidate(self):
+        self.cache.set(("org", "CA1"), 1, "a")
+        self.cache.invalidate("org", "CA1")
+
+        self.assertIsNone(self.cache.get(("org", "CA1"), 1))
+
+    def test_card_version_follows_content(self):
+        card = AnimalCard(1, "Rex", "good dog", None)
+        same = AnimalCard(1, "Rex", "good dog", None)
+        changed = AnimalCard(1, "Rex", "very good dog", None)
+
+        self.assertEqual(card_version(card), card_version(same))
+        self.assertNotEqual(card_version(card), card_version(changed))
+
+    def test_fill_likes(self):
+        html = f"<b class='{like_hole(1)}'></b><b class='{like_hole(2)}'></b>"
+
+        self.assertEqual(
+            fill_likes(html, {2}), "<b class='btn-secondary'></b><b class='btn-danger'></b>"
+        )
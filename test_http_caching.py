@@ -0,0 +1,70 @@
+"""HTTP caching tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_http_caching.py
+
+
+from unittest import TestCase
+
+from flask import Flask, flash
+
+from http_caching import NO_STORE, apply_cache_control, cache_control, conditional_response, etag_for
+
+app = Flask(__name__)
+app.config["SECRET_KEY"] = "testing"
+app.after_request(apply_cache_control)
+renders = []
+
+
+def render():
+    renders.append(1)
+    return "page"
+
+
+@app.route("/page")
+def page():
+    return conditional_response(etag_for("v1"), render)
+
+
+@app.route("/flashed")
+def flashed():
+    flash("hello", "success")
+    return conditional_response(etag_for("v1"), render)
+
+
+@app.route("/form")
+@cache_control(NO_STORE)
+def form():
+    return "form"
+
+
+class HttpCachingTestCase(TestCase):
+    """Test conditional GETs and Cache-Control policies."""
+
+    def setUp(self):
+        self.client = app.test_client()
+        renders.clear()
+
+    def test_not_modified_skips_render(self):
+        resp = self.client.get("/page")
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+
+        resp = self.client.get("/page", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(len(renders), 1)
+
+    def test_stale_etag_renders(self):
+        resp = self.client.get("/page", headers={"If-None-Match": 'W/"old"'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, b"page")
+
+    def test_pending_flashes_are_not_cached(self):
+        resp = self.client.get("/flashed")
+        self.assertNotIn("ETag", resp.headers)
+
+    def test_cache_control_policies(self):
+        self.assertEqual(self.client.get("/page").headers["Cache-Control"], "private, no-cache")
+        self.assertEqual(self.client.get("/form").headers["Cache-Control"], "no-store")
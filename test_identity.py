@@ -0,0 +1,91 @@
+"""Current-user resolution tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_identity.py
+
+
+from unittest.mock import patch
+
+from sqlalchemy import event
+
+from models import db, User
+import testing
+
+testing.setup_environment()
+
+from app import app, CURR_USER_KEY
+from identity import CurrentUser, identity_cache
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+class IdentityTestCase(testing.DatabaseTestCase):
+    """Test that g.user only queries when it is used."""
+
+    def setUp(self):
+        super().setUp()
+        identity_cache.clear()
+
+        self.client = app.test_client()
+
+        self.testuser = User.signup(
+            username="testuser",
+            email="test@test.com",
+            password="testuser"
+        )
+        self.testuser_id = 1123
+        self.testuser.id = self.testuser_id
+        db.session.commit()
+
+        self.queries = []
+        event.listen(db.engine, "before_cursor_execute", self.count_query)
+
+    def tearDown(self):
+        event.remove(db.engine, "before_cursor_execute", self.count_query)
+        db.session.rollback()
+        super().tearDown()
+
+    def count_query(self, conn, cursor, statement, *args):
+        self.queries.append(statement)
+
+    def login(self, c):
+        with c.session_transaction() as sess:
+            sess[CURR_USER_KEY] = self.testuser_id
+
+    def test_logout_redirect_without_queries(self):
+        with self.client as c:
+            resp = c.get("/logout")
+            self.assertEqual(resp.status_code, 302)
+            self.assertEqual(self.queries, [])
+
+    def test_model_errors_surface(self):
+        user = CurrentUser(lambda: self.testuser_id)
+        with patch.object(User, "by_id", side_effect=AttributeError("broken")):
+            with self.assertRaises(RuntimeError):
+                user.username
+            with self.assertRaises(AttributeError):
+                user._missing
+
+    def test_cached_identity(self):
+        with self.client as c:
+            self.login(c)
+            c.get("/users/profile")
+            self.queries.clear()
+
+            resp = c.get("/")
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(f"/users/{self.testuser_id}", str(resp.data))
+            self.assertEqual(self.queries, [])
+
+    def test_profile_edit_invalidates(self):
+        with self.client as c:
+            self.login(c)
+            c.get("/users/profile")
+
+            c.post("/users/profile", data={
+                "username": "renamed",
+                "email": "test@test.com",
+                "password": "testuser",
+            })
+            self.assertIsNone(identity_cache.get(self.testuser_id))
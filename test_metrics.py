@@ -0,0 +1,80 @@
+"""Metrics registry and exposition tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_metrics.py
+
+
+import os
+import tempfile
+from unittest import TestCase
+
+from metrics import Registry, exposition, merge, read_snapshots, upstream_endpoint, write_snapshot
+
+
+class MetricsTestCase(TestCase):
+    """Test recording, merging worker snapshots and rendering."""
+
+    def setUp(self):
+        self.registry = Registry()
+        self.requests = self.registry.counter("requests_total", "Requests.")
+        self.latency = self.registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+
+    def test_render(self):
+        self.requests.inc(endpoint="list_animals")
+        self.requests.inc(2, endpoint="list_animals")
+        for seconds in (0.05, 0.5, 5):
+            self.latency.observe(seconds, endpoint="list_animals")
+
+        body = exposition(self.registry)
+        self.assertIn("# TYPE requests_total counter", body)
+        self.assertIn('requests_total{endpoint="list_animals"} 3', body)
+        self.assertIn('latency_seconds_bucket{endpoint="list_animals",le="0.1"} 1', body)
+        self.assertIn('latency_seconds_bucket{endpoint="list_animals",le="1"} 2', body)
+        self.assertIn('latency_seconds_bucket{endpoint="list_animals",le="+Inf"} 3', body)
+        self.assertIn('latency_seconds_count{endpoint="list_animals"} 3', body)
+        self.assertIn('latency_seconds_sum{endpoint="list_animals"} 5.55', body)
+
+    def test_timer(self):
+        with self.latency.time(endpoint="/types") as timer:
+            timer.labels["status"] = 200
+        with self.assertRaises(KeyError):
+            with self.latency.time(endpoint="/types"):
+                raise KeyError("animals")
+
+        samples = self.latency.samples()
+        self.assertEqual(samples[(("endpoint", "/types"), ("status", "200"))][2], 1)
+        self.assertEqual(samples[(("endpoint", "/types"), ("status", "error"))][2], 1)
+
+    def test_collector(self):
+        @self.registry.collector
+        def collect(registry):
+            registry.gauge("pending", "Pending.").set(4)
+
+        self.assertIn("pending 4", exposition(self.registry))
+
+    def test_merge_workers(self):
+        gauge = self.registry.gauge("pool", "Pool.")
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in (101, 102):
+                self.requests.inc(endpoint="homepage")
+                self.latency.observe(0.5, endpoint="homepage")
+                gauge.set(pid, stat="size")
+                snapshot = self.registry.snapshot()
+                snapshot["pid"] = pid
+                write_snapshot(directory, snapshot)
+                self.registry.reset()
+
+            self.assertEqual(sorted(os.listdir(directory)), ["101.json", "102.json"])
+            merged = merge(read_snapshots(directory), alive=lambda pid: pid == 101)
+
+        self.assertEqual(merged["requests_total"][3], {(("endpoint", "homepage"),): 2})
+        self.assertEqual(merged["latency_seconds"][3][(("endpoint", "homepage"),)], [[0, 2], 1.0, 2])
+        # the exited worker's gauges are dropped, the live one's labelled
+        self.assertEqual(merged["pool"][3], {(("stat", "size"), ("pid", "101")): 101})
+
+    def test_upstream_endpoint(self):
+        base = "https://api.petfinder.com/v2"
+        self.assertEqual(upstream_endpoint(f"{base}/animals/61234567", base), "/animals/:id")
+        self.assertEqual(upstream_endpoint(f"{base}/organizations/CA123", base), "/organizations/:id")
+        self.assertEqual(upstream_endpoint(f"{base}/animals?page=2", base), "/animals")
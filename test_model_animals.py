@@ -5,25 +5,22 @@
 #    python -m unittest test_model_animals.py
 
 
-import os
-from unittest import TestCase
 from sqlalchemy import exc
 
 from models import db, User, Animal, SavedAnimals
+import testing
 
-os.environ['DATABASE_URL'] = "postgresql:///adopt_a_pet_test"
+testing.setup_environment()
 
 from app import app
+from likes import toggle_animal_like
 
-db.create_all()
-
-class AnimalModelTestCase(TestCase):
+class AnimalModelTestCase(testing.DatabaseTestCase):
     """Test animal model."""
 
     def setUp(self):
         """Create test client, add sample data."""
-        db.drop_all()
-        db.create_all()
+        super().setUp()
 
         self.uid = 1121
         u = User.signup("testing", "testing@test.com", "password")
@@ -59,6 +56,17 @@ class AnimalModelTestCase(TestCase):
         self.assertEqual(self.u.animal_likes[0].name, "testname")
         
 
+    def test_prepared_lookups(self):
+        """Do the prepared statements run on the app's scoped session?"""
+
+        db.session.add(Animal(id="10000007", name="testname", img_url="testurl", description="test"))
+        db.session.add(SavedAnimals(user_id=self.uid, animal_id="10000007"))
+        db.session.commit()
+
+        self.assertEqual(User.by_id(self.uid).username, "testing")
+        self.assertEqual(Animal.by_id("10000007").name, "testname")
+        self.assertEqual(SavedAnimals.animal_ids_for(self.uid), {"10000007"})
+
     def test_animal_likes(self):
         a1 = Animal(id='testid',
                 name='testname',
@@ -86,3 +94,14 @@ class AnimalModelTestCase(TestCase):
         self.assertEqual(l[0].animal_id, a1.id)
         self.assertEqual(l[1].animal_id, a2.id)
 
+
+    def test_toggle_like(self):
+        a = Animal(id='1234', name='testname', img_url='testurl', description='testdescription')
+        db.session.add(a)
+        db.session.commit()
+
+        self.assertTrue(toggle_animal_like(self.u, '1234'))
+        self.assertEqual(SavedAnimals.animal_ids_for(self.uid), {"1234"})
+
+        self.assertFalse(toggle_animal_like(self.u, '1234'))
+        self.assertEqual(SavedAnimals.animal_ids_for(self.uid), set())
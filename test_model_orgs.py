@@ -5,25 +5,21 @@
 #    python -m unittest test_model_orgs.py
 
 
-import os
-from unittest import TestCase
 from sqlalchemy import exc
 
 from models import db, User, Organization, SavedOrgs
+import testing
 
-os.environ['DATABASE_URL'] = "postgresql:///adopt_a_pet_test"
+testing.setup_environment()
 
 from app import app
 
-db.create_all()
-
-class OrganizationModelTestCase(TestCase):
+class OrganizationModelTestCase(testing.DatabaseTestCase):
     """Test organization model."""
 
     def setUp(self):
         """Create test client, add sample data."""
-        db.drop_all()
-        db.create_all()
+        super().setUp()
 
         self.uid = 12312
         u = User.signup("testing", "testing@test.com", "password")
@@ -5,25 +5,21 @@
 #    python -m unittest test_model_users.py
 
 
-import os
-from unittest import TestCase
 from sqlalchemy import exc
 
 from models import db, User
+import testing
 
-os.environ['DATABASE_URL'] = "postgresql:///adopt_a_pet_test"
+testing.setup_environment()
 
 from app import app
 
-db.create_all()
-
-class UserModelTestCase(TestCase):
+class UserModelTestCase(testing.DatabaseTestCase):
     """Test views for Users."""
 
     def setUp(self):
         """Create test client, add sample data."""
-        db.drop_all()
-        db.create_all()
+        super().setUp()
 
         u1 = User.signup("test1", "email1@email.com", "password")
         uid1 = 312342
@@ -124,12 +120,8 @@ class UserModelTestCase(TestCase):
         self.assertFalse(User.authenticate(self.u1.username, "badpassword"))
 
 
-
-
         
 
 
-
-
         
 
@@ -0,0 +1,41 @@
+"""Text normalization tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_normalize.py
+
+
+from unittest import TestCase
+
+import normalize
+from normalize import normalize_text, normalize_many
+
+
+class NormalizeTestCase(TestCase):
+    """Test normalizing descriptions and mission statements."""
+
+    def setUp(self):
+        normalize.clear_memo()
+
+    def test_double_unescape_and_whitespace(self):
+        text = "Meet&amp;amp;greet\n\n  <br />every   day"
+        self.assertEqual(normalize_text(text), "Meet&greet every day")
+
+    def test_missing_text(self):
+        self.assertIsNone(normalize_text(None))
+
+    def test_truncate_on_word_boundary(self):
+        text = "one two three four"
+        self.assertEqual(normalize_text(text, 10), "one two…")
+        self.assertEqual(normalize_text("short", 10), "short")
+
+    def test_memoized_by_content(self):
+        first = normalize_text("same &amp;amp; text")
+        second = normalize_text("same &amp;amp; " + "text")
+        self.assertIs(first, second)
+        self.assertEqual(len(normalize._memo), 1)
+
+    def test_normalize_many(self):
+        texts = ["a&amp;amp;b", None, "a&amp;amp;b"]
+        self.assertEqual(normalize_many(texts), ["a&b", None, "a&b"])
+        self.assertEqual(len(normalize._memo), 1)
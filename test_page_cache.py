@@ -0,0 +1,41 @@
+"""Page cache tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_page_cache.py
+
+
+from unittest import TestCase
+
+from page_cache import PageCache, page_key
+
+
+class PageCacheTestCase(TestCase):
+    """Test caching whole pages."""
+
+    def setUp(self):
+        self.cache = PageCache(maxsize=10, ttl=300)
+
+    def test_page_key_ignores_empty_args(self):
+        self.assertEqual(
+            page_key("animals", 1, name=None, type="Dog", gender=""),
+            page_key("animals", 1, type="Dog"),
+        )
+
+    def test_get_and_expire(self):
+        key = page_key("animals", 1)
+        page = self.cache.set(key, "<html></html>", [("animal", 1)])
+
+        self.assertIs(self.cache.get(key), page)
+
+        self.cache.ttl = -1
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidate_entity(self):
+        self.cache.set(page_key("animals", 1), "a", [("animal", 1), ("animal", 2)])
+        self.cache.set(page_key("animals", 2), "b", [("animal", 3)])
+
+        self.assertEqual(self.cache.invalidate_entity("animal", "2"), 1)
+        self.assertIsNone(self.cache.get(page_key("animals", 1)))
+        self.assertIsNotNone(self.cache.get(page_key("animals", 2)))
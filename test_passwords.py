@@ -0,0 +1,73 @@
+"""Password hasher tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_passwords.py
+
+
+import threading
+from unittest import TestCase
+
+import bcrypt
+
+from passwords import HasherBusy, PasswordHasher, calibrate, hash_rounds
+
+
+class PasswordHasherTestCase(TestCase):
+    """Test hashing in the bounded pool."""
+
+    def setUp(self):
+        self.hasher = PasswordHasher(rounds=4, workers=2, max_queue=1)
+
+    def test_hash_and_verify(self):
+        hashed = self.hasher.hash("password")
+        self.assertTrue(hashed.startswith("$2b$04$"))
+        self.assertTrue(self.hasher.verify(hashed, "password"))
+        self.assertFalse(self.hasher.verify(hashed, "wrong"))
+        self.assertFalse(self.hasher.verify("not a hash", "password"))
+
+    def test_empty_password(self):
+        with self.assertRaises(ValueError):
+            self.hasher.hash("")
+        with self.assertRaises(ValueError):
+            self.hasher.hash(None)
+
+    def test_needs_rehash(self):
+        hashed = self.hasher.hash("password")
+        self.assertEqual(hash_rounds(hashed), 4)
+        self.assertFalse(self.hasher.needs_rehash(hashed))
+
+        self.hasher.configure(rounds=5, workers=2, max_queue=1)
+        self.assertTrue(self.hasher.needs_rehash(hashed))
+
+        # a stronger hash is never downgraded
+        self.hasher.configure(rounds=4, workers=2, max_queue=1)
+        stronger = bcrypt.hashpw(b"password", bcrypt.gensalt(5)).decode("utf-8")
+        self.assertFalse(self.hasher.needs_rehash(stronger))
+
+    def test_queue_guard(self):
+        release = threading.Event()
+
+        def block(*args):
+            release.wait()
+            return True
+
+        # two running plus one queued fills a pool of 2 with max_queue 1
+        threads = [threading.Thread(target=self.hasher._run, args=(block,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while self.hasher.pending < 3:
+            pass
+
+        with self.assertRaises(HasherBusy):
+            self.hasher._run(block)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.hasher.pending, 0)
+
+    def test_calibrate(self):
+        self.assertEqual(calibrate(0), 4)
+        self.assertGreaterEqual(calibrate(10000, maximum=6), 4)
+        self.assertLessEqual(calibrate(10000, maximum=6), 6)
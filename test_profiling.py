@@ -0,0 +1,58 @@
+"""Sampling profiler tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_profiling.py
+
+
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from profiling import Sampler, ProfileWriter
+
+
+def busy_loop(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class ProfilingTestCase(TestCase):
+    """Test sampling a thread, the hot frame totals and the profile files."""
+
+    def setUp(self):
+        self.sampler = Sampler(interval=0.001)
+
+    def test_samples_current_thread(self):
+        profile = self.sampler.start("list_animals")
+        busy_loop(0.1)
+        self.sampler.stop(profile)
+
+        # how many samples fit depends on when the sampler gets the GIL
+        self.assertGreater(profile.samples, 0)
+        self.assertTrue(any(stack.endswith("test_profiling.py:busy_loop") for stack in profile.stacks))
+        frame, samples = self.sampler.hot_frames(1)[0]
+        self.assertEqual(frame, "test_profiling.py:busy_loop")
+
+        # nothing more is recorded once stopped
+        count = profile.samples
+        busy_loop(0.02)
+        self.assertEqual(profile.samples, count)
+
+    def test_writer_rotates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = ProfileWriter(directory, keep=2)
+            for _ in range(3):
+                profile = self.sampler.start("save")
+                busy_loop(0.02)
+                self.sampler.stop(profile)
+                writer.write(profile)
+                time.sleep(0.01)
+            writer.write_totals(self.sampler.snapshot())
+
+            names = os.listdir(directory)
+            self.assertEqual(len([name for name in names if not name.startswith("hot-")]), 2)
+            with open(os.path.join(directory, f"hot-{os.getpid()}.folded")) as f:
+                self.assertTrue(f.readline().startswith("save;"))
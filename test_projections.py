@@ -0,0 +1,43 @@
+"""Projection tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_projections.py
+
+
+from unittest import TestCase
+
+from projections import AnimalCard, OrgCard, project_animals, project_types
+
+
+class ProjectionTestCase(TestCase):
+    """Test projecting API payloads into cards."""
+
+    def test_animal_card(self):
+        payload = {
+            "id": 123,
+            "name": "Rex",
+            "description": "Loves &amp;amp; fetches",
+            "photos": [{"small": "small.jpg", "medium": "medium.jpg"}],
+            "attributes": {"spayed_neutered": True},
+            "contact": {"email": "a@b.com"},
+        }
+        card = AnimalCard.from_api(payload)
+
+        self.assertEqual(card.id, 123)
+        self.assertEqual(card.name, "Rex")
+        self.assertEqual(card.description, "Loves & fetches")
+        self.assertEqual(card.photo, "small.jpg")
+        self.assertFalse(hasattr(card, "__dict__"))
+
+    def test_org_card_without_photos(self):
+        card = OrgCard.from_api({"id": "CA1", "name": "Shelter", "photos": []})
+
+        self.assertIsNone(card.photo)
+        self.assertIsNone(card.mission_statement)
+
+    def test_project_lists(self):
+        animals = project_animals([{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+        self.assertEqual([animal.id for animal in animals], [1, 2])
+
+        self.assertEqual(project_types([{"name": "Dog", "coats": []}]), ["Dog"])
@@ -0,0 +1,87 @@
+"""Read replica routing tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_replicas.py
+
+
+from types import SimpleNamespace
+from unittest import TestCase
+
+from flask import Flask, g
+from sqlalchemy.exc import OperationalError
+
+from replicas import ReplicaRouter, forget_write, note_write, remember_write
+
+
+class FakeResult:
+    def __init__(self, lag):
+        self.lag = lag
+
+    def scalar(self):
+        return self.lag
+
+
+class FakeEngine:
+    """Stands in for a replica engine reporting a fixed lag."""
+
+    def __init__(self, lag=0, down=False):
+        self.lag = lag
+        self.down = down
+        self.checks = 0
+
+    def connect(self):
+        self.checks += 1
+        if self.down:
+            raise OperationalError("SELECT 1", {}, Exception("down"))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        return FakeResult(self.lag)
+
+
+class ReplicaRouterTestCase(TestCase):
+    """Test choosing a replica."""
+
+    def test_round_robin(self):
+        a, b = FakeEngine(), FakeEngine()
+        router = ReplicaRouter([("a", a), ("b", b)])
+        self.assertEqual([router.choose() for _ in range(4)], [a, b, a, b])
+
+    def test_skips_lagging_and_down(self):
+        lagging, down, good = FakeEngine(lag=60), FakeEngine(down=True), FakeEngine(lag=1)
+        router = ReplicaRouter([("lagging", lagging), ("down", down), ("good", good)], max_lag=5)
+        self.assertIs(router.choose(), good)
+        self.assertIs(router.choose(), good)
+
+    def test_falls_back_to_primary(self):
+        router = ReplicaRouter([("a", FakeEngine(lag=60))], max_lag=5)
+        self.assertIsNone(router.choose())
+
+    def test_checks_are_cached(self):
+        engine = FakeEngine()
+        router = ReplicaRouter([("a", engine)], check_interval=60)
+        router.choose()
+        router.choose()
+        self.assertEqual(engine.checks, 1)
+
+    def test_only_commits_that_wrote_stick(self):
+        session = SimpleNamespace(info={})
+        with Flask(__name__).test_request_context():
+            remember_write(session)
+            self.assertFalse(g.get("db_wrote", False))
+
+            note_write(session, None)
+            forget_write(session)
+            remember_write(session)
+            self.assertFalse(g.get("db_wrote", False))
+
+            note_write(session, None)
+            remember_write(session)
+            self.assertTrue(g.db_wrote)
@@ -0,0 +1,32 @@
+"""Synthetic data generator tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_seed.py
+
+
+from collections import Counter
+from unittest import TestCase
+
+from seed import animal_rows, like_rows, user_rows
+
+
+class SeedTestCase(TestCase):
+    """Test that generated rows are reproducible and likes are skewed."""
+
+    def test_reproducible(self):
+        self.assertEqual(list(animal_rows(0, 50, seed=1)), list(animal_rows(0, 50, seed=1)))
+        self.assertNotEqual(list(animal_rows(0, 50, seed=1)), list(animal_rows(0, 50, seed=2)))
+
+        users = list(user_rows(10, 20, seed=1, password="hash"))
+        self.assertEqual([user[0] for user in users], list(range(11, 21)))
+        self.assertEqual(len({user[2] for user in users}), 10)
+
+    def test_likes(self):
+        likes = list(like_rows("animal_likes", 0, 2000, seed=1, items=1000, mean=10, zipf=1.1))
+        self.assertEqual(len(likes), len(set(likes)))
+        self.assertEqual(likes, list(like_rows("animal_likes", 0, 2000, seed=1, items=1000, mean=10, zipf=1.1)))
+
+        per_animal = Counter(animal_id for _, animal_id in likes).most_common()
+        # the most liked animal is far more popular than the median one
+        self.assertGreater(per_animal[0][1], 10 * per_animal[len(per_animal) // 2][1])
@@ -0,0 +1,121 @@
+"""Server-side session tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_sessions.py
+
+
+import tempfile
+import time
+from unittest import TestCase
+
+from flask import Flask, session
+
+from sessions import FileStore, MemoryStore, ServerSideSessionInterface, rotate_session
+
+app = Flask(__name__)
+app.config["SECRET_KEY"] = "testing"
+loads = []
+
+
+@app.route("/set/<value>")
+def set_value(value):
+    session["value"] = value
+    return "set"
+
+
+@app.route("/get")
+def get_value():
+    return session.get("value", "none")
+
+
+@app.route("/untouched")
+def untouched():
+    return "ok"
+
+
+@app.route("/clear")
+def clear():
+    session.clear()
+    return "cleared"
+
+
+@app.route("/rotate")
+def rotate():
+    rotate_session()
+    session["value"] = "rotated"
+    return "rotated"
+
+
+class CountingStore(MemoryStore):
+    def load(self, sid):
+        loads.append(sid)
+        return super().load(sid)
+
+    def save(self, sid, data, expires):
+        self.saves = getattr(self, "saves", 0) + 1
+        super().save(sid, data, expires)
+
+
+class SessionTestCase(TestCase):
+    """Test keeping session data on the server."""
+
+    def setUp(self):
+        self.store = CountingStore()
+        app.session_interface = ServerSideSessionInterface(self.store)
+        self.client = app.test_client()
+        loads.clear()
+
+    def test_round_trip_with_small_cookie(self):
+        resp = self.client.get("/set/hello")
+        cookie = resp.headers["Set-Cookie"]
+        self.assertLess(len(cookie.split(";")[0]), 60)
+
+        self.assertEqual(self.client.get("/get").data, b"hello")
+
+    def test_lazy_load_and_write_only_when_modified(self):
+        self.client.get("/set/hello")
+        self.assertEqual(self.store.saves, 1)
+
+        resp = self.client.get("/untouched")
+        self.assertEqual(loads, [])
+        self.assertNotIn("Set-Cookie", resp.headers)
+
+        self.client.get("/get")
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(self.store.saves, 1)
+
+    def test_clear_deletes_session(self):
+        self.client.get("/set/hello")
+        self.client.get("/clear")
+
+        self.assertEqual(self.client.get("/get").data, b"none")
+        self.assertEqual(len(self.store._sessions), 0)
+
+    def test_unknown_sid_is_replaced(self):
+        chosen = "f" * 43
+        self.client.set_cookie("localhost", app.session_cookie_name, chosen)
+        resp = self.client.get("/set/hello")
+
+        self.assertNotIn(chosen, resp.headers["Set-Cookie"])
+        self.assertNotIn(chosen, self.store._sessions)
+        self.assertEqual(len(self.store._sessions), 1)
+
+    def test_rotate_moves_data_to_new_sid(self):
+        self.client.get("/set/hello")
+        [old_sid] = self.store._sessions
+
+        self.client.get("/rotate")
+        [new_sid] = self.store._sessions
+        self.assertNotEqual(new_sid, old_sid)
+        self.assertEqual(self.client.get("/get").data, b"rotated")
+
+    def test_file_store_expiry_and_sweep(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FileStore(tmp)
+            store.save("a" * 43, {"value": ("tuple", 1)}, time.time() + 60)
+            store.save("b" * 43, {"value": 2}, time.time() - 60)
+
+            self.assertEqual(store.load("a" * 43), {"value": ("tuple", 1)})
+            self.assertIsNone(store.load("b" * 43))
+            self.assertEqual(store.sweep(), 1)
@@ -0,0 +1,56 @@
+"""Streaming rendering tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_streaming.py
+
+
+from unittest import TestCase
+
+import requests
+
+from streaming import FLUSH_MARKER, Deferred, batches
+
+
+class StreamingTestCase(TestCase):
+    """Test the pieces of streamed listing pages."""
+
+    def test_batches_break_at_flush_marker(self):
+        pieces = ["<html>", "<nav>", f"</form>{FLUSH_MARKER}<div>", "cards", "</html>"]
+
+        self.assertEqual(
+            list(batches(pieces)), ["<html><nav></form>", "<div>cards</html>"]
+        )
+
+    def test_deferred_fetches_once_when_used(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return [1, 2]
+
+        listing = Deferred(fetch)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(len(listing), 2)
+        self.assertEqual(list(listing), [1, 2])
+        self.assertEqual(len(calls), 1)
+
+    def test_deferred_keeps_key_errors(self):
+        def fetch():
+            return {}["animals"]
+
+        listing = Deferred(fetch)
+
+        self.assertEqual(len(listing), 0)
+        self.assertIsInstance(listing.error, KeyError)
+        self.assertFalse(listing.failed)
+
+    def test_deferred_keeps_upstream_errors(self):
+        def fetch():
+            raise requests.ConnectionError()
+
+        listing = Deferred(fetch)
+
+        self.assertTrue(listing.failed)
+        self.assertEqual(list(listing), [])
@@ -0,0 +1,64 @@
+"""Request tracing tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_tracing.py
+
+
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from passwords import PasswordHasher
+from tracing import TraceWriter, current_span, span, start_trace
+
+
+class TracingTestCase(TestCase):
+    """Test spans, their propagation into the hasher pool and the trace file."""
+
+    def tearDown(self):
+        current_span.set(None)
+
+    def test_untraced(self):
+        with span("fetch") as opened:
+            self.assertIsNone(opened)
+
+    def test_nesting(self):
+        root = start_trace("list_animals")
+        with span("petfinder /animals", "upstream") as outer:
+            with span("sql", "sql") as inner:
+                self.assertIs(inner.parent, outer)
+        self.assertIs(current_span.get(), root)
+        root.finish()
+
+        names = [event["name"] for event in root.trace.events]
+        self.assertEqual(names, ["sql", "petfinder /animals", "list_animals"])
+        self.assertEqual({event["tid"] for event in root.trace.events}, {root.trace.id})
+
+    def test_thread_pool(self):
+        hasher = PasswordHasher(rounds=4, workers=1)
+        root = start_trace("signup")
+        hasher.hash("password")
+        root.finish()
+
+        hashed = [event for event in root.trace.events if event["name"] == "bcrypt.hashpw"]
+        self.assertEqual(len(hashed), 1)
+        self.assertTrue(hashed[0]["args"]["thread"].startswith("bcrypt"))
+
+    def test_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            writer = TraceWriter(directory, max_bytes=10 ** 6)
+            for name in ("first", "second"):
+                root = start_trace(name)
+                root.finish()
+                writer.write(root.trace)
+
+            with open(writer.path) as f:
+                # what chrome://tracing does with the unterminated array
+                events = json.loads(f.read().rstrip().rstrip(",") + "]")
+            self.assertEqual([event["name"] for event in events], ["first", "second"])
+
+            writer.max_bytes = 0
+            writer.write(root.trace)
+            self.assertEqual(len(os.listdir(directory)), 2)
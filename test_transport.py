@@ -0,0 +1,94 @@
+"""Record and replay transport tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_transport.py
+
+
+import gzip
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from benchmarks import fake_petfinder
+from transport import (
+    AutoTransport, Cassette, CassetteMiss, RecordingTransport, ReplayTransport, request_key,
+)
+
+
+class TransportTestCase(TestCase):
+    """Test recording the fake Petfinder API and replaying it offline."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fake_petfinder.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cassette.jsonl.gz")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def record_session(self):
+        transport = RecordingTransport(Cassette(self.path))
+        token = transport.request(
+            "POST", f"{self.server.url}/oauth2/token", json={"client_secret": "secret"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        animals = transport.request("GET", f"{self.server.url}/animals", headers=headers, params={"page": 1, "limit": 5})
+        return token, animals
+
+    def test_replay(self):
+        token, recorded = self.record_session()
+
+        transport = ReplayTransport(Cassette(self.path))
+        replayed = transport.request(
+            "GET", f"{self.server.url}/animals", headers={"Authorization": "Bearer other"},
+            params={"limit": 5, "page": 1},
+        )
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), recorded.json())
+        self.assertEqual(replayed.headers["content-type"], "application/json")
+
+        with self.assertRaises(CassetteMiss):
+            transport.request("GET", f"{self.server.url}/animals", params={"page": 2})
+
+    def test_secrets_not_recorded(self):
+        token, _ = self.record_session()
+        with gzip.open(self.path, "rt") as f:
+            stored = f.read()
+        self.assertNotIn("secret", stored)
+        self.assertNotIn(token, stored)
+        self.assertNotIn("Authorization", stored)
+
+    def test_repeats_in_order(self):
+        cassette = Cassette(self.path)
+        key = request_key("GET", "http://api/types")
+        for n in (1, 2):
+            cassette._add({"method": key[0], "url": key[1], "status": 200, "headers": {},
+                           "content": str(n), "elapsed": 0.2})
+        transport = ReplayTransport(cassette)
+        self.assertEqual([transport.request("GET", "http://api/types").text for _ in range(3)], ["1", "2", "2"])
+
+    def test_latency_replay(self):
+        cassette = Cassette(self.path)
+        key = request_key("GET", "http://api/types")
+        cassette._add({"method": key[0], "url": key[1], "status": 200, "headers": {},
+                       "content": "", "elapsed": 0.2})
+
+        start = time.perf_counter()
+        ReplayTransport(cassette, speed=0.25).request("GET", "http://api/types")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_auto_records_misses_only(self):
+        transport = AutoTransport(Cassette(self.path))
+        for _ in range(2):
+            transport.request("POST", f"{self.server.url}/oauth2/token")
+        self.assertEqual(len(Cassette(self.path)), 1)
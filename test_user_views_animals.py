@@ -2,31 +2,33 @@
 
 # run these tests like:
 #
-#    FLASK_ENV=production python -m unittest test_user_views_animals.py
-
+#    python -m unittest test_user_views_animals.py
+#
+# The Petfinder API is the fake one from benchmarks/fake_petfinder.py (see
+# testing.py). To test against recorded real responses instead, replay a
+# cassette recorded by one run with PETFINDER_TRANSPORT=record (see
+# transport.py):
+#
+#    PETFINDER_TRANSPORT=replay PETFINDER_CASSETTE=cassettes/view_tests.jsonl.gz \
+#        python -m unittest test_user_views_animals.py
 
-import os
-from unittest import TestCase
 
 from models import db, connect_db, Animal, User, SavedAnimals
+import testing
 from bs4 import BeautifulSoup
 
-os.environ['DATABASE_URL'] = "postgresql:///adopt_a_pet_test"
+testing.setup_environment()
 
 from app import app, CURR_USER_KEY
 
-db.create_all()
-
 app.config["WTF_CSRF_ENABLED"] = False
 
-class AnimalViewTestCase(TestCase):
+class AnimalViewTestCase(testing.DatabaseTestCase):
     """Test views for animals."""
 
     def setUp(self):
         """Create test client."""
-
-        db.drop_all()
-        db.create_all()
+        super().setUp()
 
         self.client = app.test_client()
         
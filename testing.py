@@ -0,0 +1,258 @@
+"""Shared set-up for the database and view tests, and a parallel runner.
+
+A test module calls `setup_environment()` before importing the app:
+
+    import testing
+    testing.setup_environment()
+
+    from app import app, CURR_USER_KEY
+
+which points the app at
+
+- the test database, TEST_DATABASE_URL (postgresql:///adopt_a_pet_test by
+  default), or a copy of it per worker when the suite runs in parallel
+  (adopt_a_pet_test_1, ...), created if it doesn't exist yet;
+- benchmarks/fake_petfinder.py, started in this process, so no credentials
+  or network are needed. With PETFINDER_TRANSPORT set (say, to replay a
+  cassette) or TEST_LIVE_PETFINDER=1 the Petfinder settings are left alone.
+
+and picks the "test" profile of config.py, which hashes passwords at bcrypt's
+minimum cost and keeps sessions in memory.
+
+Test cases that use the database subclass DatabaseTestCase. The tables are
+created once per process; each test then runs inside one transaction that
+is rolled back afterwards, with the session in a SAVEPOINT, so the code
+under test can commit and roll back as usual without anything outliving the
+test.
+
+    python -m testing           # every test_*.py, one process per core
+    python -m testing -j 4 test_api.py test_model_users.py
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from unittest import TestCase
+
+from sqlalchemy import event, orm
+from sqlalchemy.engine.url import make_url
+
+DEFAULT_DATABASE_URL = "postgresql:///adopt_a_pet_test"
+
+upstream = None
+schema_created = False
+
+
+def worker_id():
+    """This process's slot in a parallel run, or None when run on its own."""
+
+    return os.environ.get("TEST_WORKER") or os.environ.get("PYTEST_XDIST_WORKER")
+
+
+def database_url():
+    url = make_url(os.environ.get("TEST_DATABASE_URL", DEFAULT_DATABASE_URL))
+    worker = worker_id()
+    if worker:
+        url.database = f"{url.database}_{worker}"
+    return str(url)
+
+
+def create_database(url):
+    """Create the database at `url` unless it already exists."""
+
+    import psycopg2
+
+    url = make_url(url)
+    connect_args = url.translate_connect_args(username="user", database="dbname")
+    connect_args["dbname"] = "postgres"
+    conn = psycopg2.connect(**connect_args)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (url.database,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{url.database}"')
+    finally:
+        conn.close()
+
+
+def start_upstream():
+    """The fake Petfinder API for this process, started on first use."""
+
+    global upstream
+
+    from benchmarks import fake_petfinder
+
+    if upstream is None:
+        upstream = fake_petfinder.start()
+    return upstream
+
+
+def setup_environment():
+    """Configure the app for tests; call before creating it."""
+
+    url = database_url()
+    create_database(url)
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("FLASK_ENV", "test")
+
+    if not os.environ.get("PETFINDER_TRANSPORT") and os.environ.get("TEST_LIVE_PETFINDER") != "1":
+        server = start_upstream()
+        os.environ["API_URL"] = server.url
+        os.environ["TOKEN_URL"] = f"{server.url}/oauth2/token"
+        os.environ["CLIENT_ID"] = "test"
+        os.environ["CLIENT_SECRET"] = "test"
+
+
+def ensure_schema():
+    """Create the tables, once per process."""
+
+    global schema_created
+
+    from app import app  # binds db to the app
+    from models import db
+
+    if not schema_created:
+        # dropped first, so a changed model never meets an old table
+        db.drop_all()
+        db.create_all()
+        schema_created = True
+
+
+def clear_caches():
+    """Forget everything the app keeps in memory between requests."""
+
+    import petfinder
+    from fragments import card_cache
+    from identity import identity_cache
+    from page_cache import page_cache
+
+    page_cache.clear()
+    card_cache.clear()
+    identity_cache.clear()
+    petfinder.listing_cache.clear()
+    petfinder.animal_types_cache.clear()
+
+
+class TransactionalSession(orm.scoped_session):
+    """`db.session` during one test.
+
+    The app removes the session at the end of each request; here that only
+    drops what the request left uncommitted, not the test's transaction.
+    Objects are expunged before the rollback, as Session.close does, so the
+    ones a test holds keep their loaded state; and nothing is sent to the
+    database when nothing was flushed since the last SAVEPOINT.
+    """
+
+    def remove(self):
+        if self.registry.has():
+            session = self.registry()
+            session.expunge_all()
+            if session.info.pop("flushed", False):
+                session.rollback()
+
+    def close_for_good(self):
+        super().remove()
+
+
+def note_flush(session, flush_context):
+    session.info["flushed"] = True
+
+
+def restart_savepoint(session, transaction):
+    # once the SAVEPOINT is committed or rolled back, start the next one
+    if transaction.nested and not transaction._parent.nested:
+        session.info.pop("flushed", None)
+        session.begin_nested()
+
+
+class DatabaseTestCase(TestCase):
+    """A test case whose database changes are all rolled back afterwards."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ensure_schema()
+
+    def setUp(self):
+        from models import db
+
+        super().setUp()
+        clear_caches()
+
+        self._connection = db.engine.connect()
+        self._transaction = self._connection.begin()
+        self._factory = db.create_session({"bind": self._connection, "binds": {}})
+        event.listen(self._factory, "after_transaction_end", restart_savepoint)
+        event.listen(self._factory, "after_flush", note_flush)
+
+        self._app_session, db.session = db.session, TransactionalSession(self._factory)
+        db.session.begin_nested()
+
+    def tearDown(self):
+        from models import db
+
+        event.remove(self._factory, "after_transaction_end", restart_savepoint)
+        event.remove(self._factory, "after_flush", note_flush)
+        db.session.close_for_good()
+        db.session = self._app_session
+        self._transaction.rollback()
+        self._connection.close()
+        super().tearDown()
+
+
+##############################################################################
+# Parallel runner
+
+
+def run_module(path, workers):
+    """Run one test module under a free worker id; returns (path, returncode, output, seconds)."""
+
+    worker = workers.get()
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(
+            [sys.executable, "-m", "unittest", path],
+            env=dict(os.environ, TEST_WORKER=str(worker)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+    finally:
+        workers.put(worker)
+    return path, result.returncode, result.stdout, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the test modules in parallel, one database per worker.")
+    parser.add_argument("modules", nargs="*", default=sorted(glob.glob("test_*.py")))
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    workers = Queue()
+    for worker in range(1, args.jobs + 1):
+        workers.put(worker)
+
+    started = time.perf_counter()
+    failed = []
+    with ThreadPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(run_module, path, workers) for path in args.modules]
+        for future in futures:
+            path, returncode, output, seconds = future.result()
+            print(f"{'ok' if returncode == 0 else 'FAILED':6} {path} ({seconds:.1f}s)")
+            if returncode != 0:
+                failed.append(path)
+                print(output)
+
+    print(f"\n{len(args.modules) - len(failed)} of {len(args.modules)} modules passed "
+          f"in {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Request tracing, written in the Chrome trace event format.
+
+init_tracing(app) opens a span for a sample of requests, TRACE_SAMPLE_RATE
+of them (0, the default, traces nothing). Inside a traced request every
+Petfinder call, SQL statement, template render and password hash gets a
+child span; outside one, `span()` costs a context variable lookup.
+
+A finished trace is appended to <TRACE_DIR>/trace-<pid>.json if it took at
+least TRACE_MIN_MS, so a low threshold keeps every sampled request and a
+high one keeps only the slow tail. Each file is a JSON array of "X" events;
+open it in chrome://tracing or https://ui.perfetto.dev, where every request
+is its own row. A file over TRACE_MAX_BYTES is moved to trace-<pid>.old.json
+and a new one started.
+
+Spans follow contextvars, so work handed to a thread pool stays in its
+request's trace when submitted through `contextvars.copy_context().run`, as
+passwords.py does.
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+trace_ids = itertools.count(1)
+
+
+class Trace:
+    """The spans of one request, kept until it finishes."""
+
+    def __init__(self, name):
+        self.id = next(trace_ids)
+        self.name = name
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+
+class Span:
+    """One timed step of a trace."""
+
+    __slots__ = ("trace", "parent", "name", "category", "args", "start", "token")
+
+    def __init__(self, trace, parent, name, category, args):
+        self.trace = trace
+        self.parent = parent
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = time.perf_counter()
+        self.token = None
+
+    def finish(self):
+        end = time.perf_counter()
+        self.trace.add({
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": round(self.start * 1e6, 1),
+            "dur": round((end - self.start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": self.trace.id,
+            "args": dict(self.args, thread=threading.current_thread().name),
+        })
+        return end - self.start
+
+
+def start_trace(name, category="request", **args):
+    """Open the root span of a new trace and make it current."""
+
+    span = Span(Trace(name), None, name, category, args)
+    span.token = current_span.set(span)
+    return span
+
+
+def begin(name, category, **args):
+    """Open a child of the current span; None when nothing is being traced."""
+
+    parent = current_span.get()
+    if parent is None:
+        return None
+    span = Span(parent.trace, parent, name, category, args)
+    span.token = current_span.set(span)
+    return span
+
+
+def end(span, **args):
+    """Close a span from `begin` (None is fine) and return to its parent."""
+
+    if span is None:
+        return None
+    span.args.update(args)
+    try:
+        current_span.reset(span.token)
+    except (RuntimeError, ValueError):
+        # opened in another context, e.g. by a signal in a streamed response
+        current_span.set(span.parent)
+    return span.finish()
+
+
+@contextmanager
+def span(name, category="app", **args):
+    """`with span("fetch"):` times the block as a child of the current span."""
+
+    opened = begin(name, category, **args)
+    try:
+        yield opened
+    finally:
+        end(opened)
+
+
+class TraceWriter:
+    """Appends finished traces to this worker's file."""
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        # the pid is read on every write so forked workers get their own file
+        return os.path.join(self.directory, f"trace-{os.getpid()}.json")
+
+    def write(self, trace):
+        events = sorted(trace.events, key=lambda event: event["ts"])
+        # the JSON array format allows a trailing comma and no closing bracket,
+        # which is what lets us append
+        text = "".join(json.dumps(event, separators=(",", ":"), default=str) + ",\n" for event in events)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path
+            if os.path.exists(path) and os.path.getsize(path) > self.max_bytes:
+                os.replace(path, path[:-len(".json")] + ".old.json")
+            new = not os.path.exists(path)
+            with open(path, "a") as f:
+                if new:
+                    f.write("[\n")
+                f.write(text)
+
+
+def instrument_engine(engine):
+    """A span for every statement `engine` runs."""
+
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("trace_spans", []).append(begin("sql", "sql", statement=statement[:200]))
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            end(spans.pop())
+
+    def error(context):
+        spans = context.connection.info.get("trace_spans")
+        if spans:
+            end(spans.pop(), error=type(context.original_exception).__name__)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", error)
+
+
+def init_tracing(app):
+    """Trace a sample of the app's requests; see the module docstring."""
+
+    from flask import before_render_template, g, request, template_rendered
+
+    from engines import pool_metrics
+
+    app.config.setdefault("TRACE_SAMPLE_RATE", 0.0)
+    app.config.setdefault("TRACE_MIN_MS", 0)
+    app.config.setdefault("TRACE_DIR", "traces")
+    app.config.setdefault("TRACE_MAX_BYTES", 50 * 1024 * 1024)
+    if not app.config["TRACE_SAMPLE_RATE"]:
+        return None
+
+    writer = TraceWriter(app.config["TRACE_DIR"], app.config["TRACE_MAX_BYTES"])
+
+    for metrics in pool_metrics.values():
+        instrument_engine(metrics.engine)
+
+    def template_started(sender, template, context, **extra):
+        g.setdefault("template_spans", []).append(begin(f"render {template.name}", "template"))
+
+    def template_finished(sender, template, context, **extra):
+        spans = g.get("template_spans")
+        if spans:
+            end(spans.pop())
+
+    before_render_template.connect(template_started, app)
+    template_rendered.connect(template_finished, app)
+
+    @app.before_request
+    def start_request_trace():
+        if random.random() < app.config["TRACE_SAMPLE_RATE"]:
+            g.trace_span = start_trace(
+                request.endpoint or "unmatched", method=request.method, path=request.full_path
+            )
+
+    @app.after_request
+    def note_status(response):
+        root = g.get("trace_span")
+        if root is not None:
+            root.args["status"] = response.status_code
+        return response
+
+    # teardown rather than after_request, so a streamed page's trace covers
+    # the whole stream
+    @app.teardown_request
+    def finish_request_trace(exc):
+        root = g.pop("trace_span", None)
+        if root is None:
+            return
+        current_span.set(None)
+        if root.finish() * 1000 >= app.config["TRACE_MIN_MS"]:
+            writer.write(root.trace)
+
+    return writer
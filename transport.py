@@ -0,0 +1,204 @@
+"""HTTP transports for the Petfinder client, including record and replay.
+
+petfinder.py sends every upstream request through `transport`, picked by
+PETFINDER_TRANSPORT:
+
+- "live" (the default): straight to the network.
+- "record": to the network, appending each interaction to the cassette at
+  PETFINDER_CASSETTE.
+- "replay": answered from the cassette only; a request it doesn't have
+  raises CassetteMiss.
+- "auto": replayed when the cassette has it, recorded when it doesn't.
+
+Cassettes are gzipped JSON lines, one interaction per line. Requests are
+matched on method, URL and query parameters; request headers and bodies are
+never stored, and the token in a recorded token response is replaced by a
+placeholder, so neither the client secret nor a bearer token ends up on
+disk. When the same request was recorded several times its responses are
+replayed in order, the last one repeating.
+
+PETFINDER_REPLAY_SPEED sets how much of the recorded latency a replay
+reproduces: 0 (the default) answers at once, 1 in real time, 0.1 ten times
+faster than it was recorded.
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+KEPT_HEADERS = ("Content-Type",)
+# token responses are recorded with these replaced by PLACEHOLDER_TOKEN
+SECRET_FIELDS = ("access_token", "refresh_token")
+PLACEHOLDER_TOKEN = "replayed-token"
+
+
+class CassetteMiss(Exception):
+    """A replayed request that the cassette has no recording of."""
+
+
+def request_key(method, url, params=None):
+    """(method, url) with the query parameters merged in and sorted."""
+
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + [
+        (str(name), str(value)) for name, value in (params or {}).items() if value is not None
+    ]
+    url = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ""))
+    return method.upper(), url
+
+
+def build_response(method, url, status, headers, content):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content.encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+def scrub(content):
+    """`content` with any token in a JSON body replaced by a placeholder."""
+
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(body, dict) or not any(field in body for field in SECRET_FIELDS):
+        return content
+    for field in SECRET_FIELDS:
+        if field in body:
+            body[field] = PLACEHOLDER_TOKEN
+    return json.dumps(body)
+
+
+class LiveTransport:
+    """Requests straight to the network."""
+
+    def __init__(self):
+        self.session = requests.Session()
+
+    def request(self, method, url, headers=None, params=None, data=None, json=None):
+        return self.session.request(method, url, headers=headers, params=params, data=data, json=json)
+
+
+class Cassette:
+    """Recorded interactions, loaded from and appended to a gzipped file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._responses = defaultdict(list)
+        self._played = defaultdict(int)
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _add(self, interaction):
+        key = (interaction["method"], interaction["url"])
+        self._responses[key].append(interaction)
+
+    def __contains__(self, key):
+        return key in self._responses
+
+    def __len__(self):
+        return sum(len(responses) for responses in self._responses.values())
+
+    def play(self, key):
+        """The next recorded interaction for `key`."""
+
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                raise CassetteMiss(f"{key[0]} {key[1]} is not in {self.path}")
+            index = min(self._played[key], len(responses) - 1)
+            self._played[key] += 1
+            return responses[index]
+
+    def record(self, key, response, elapsed):
+        interaction = {
+            "method": key[0],
+            "url": key[1],
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "content": scrub(response.text),
+            "elapsed": round(elapsed, 4),
+        }
+        with self._lock:
+            self._add(interaction)
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # gzip members can be concatenated, so appending keeps it one file
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+
+class RecordingTransport:
+    """Live requests, each one also written to a cassette."""
+
+    def __init__(self, cassette, live=None):
+        self.cassette = cassette
+        self.live = live or LiveTransport()
+
+    def request(self, method, url, headers=None, params=None, data=None, json=None):
+        start = time.perf_counter()
+        response = self.live.request(method, url, headers=headers, params=params, data=data, json=json)
+        self.cassette.record(request_key(method, url, params), response, time.perf_counter() - start)
+        return response
+
+
+class ReplayTransport:
+    """Responses from a cassette, optionally as slowly as they were recorded."""
+
+    def __init__(self, cassette, speed=0.0):
+        self.cassette = cassette
+        self.speed = speed
+
+    def request(self, method, url, headers=None, params=None, data=None, json=None):
+        key = request_key(method, url, params)
+        interaction = self.cassette.play(key)
+        if self.speed:
+            time.sleep(interaction["elapsed"] * self.speed)
+        return build_response(key[0], key[1], interaction["status"], interaction["headers"], interaction["content"])
+
+
+class AutoTransport:
+    """Replay what the cassette has, record what it doesn't."""
+
+    def __init__(self, cassette, speed=0.0, live=None):
+        self.replay = ReplayTransport(cassette, speed)
+        self.record = RecordingTransport(cassette, live)
+
+    def request(self, method, url, headers=None, params=None, data=None, json=None):
+        if request_key(method, url, params) in self.replay.cassette:
+            return self.replay.request(method, url, headers, params, data, json)
+        return self.record.request(method, url, headers, params, data, json)
+
+
+def make_transport(mode="live", cassette_path=None, speed=0.0):
+    """The transport for `mode`: "live", "record", "replay" or "auto"."""
+
+    if mode == "live":
+        return LiveTransport()
+    if not cassette_path:
+        raise ValueError(f"PETFINDER_TRANSPORT={mode} needs PETFINDER_CASSETTE")
+
+    cassette = Cassette(cassette_path)
+    if mode == "record":
+        return RecordingTransport(cassette)
+    if mode == "replay":
+        return ReplayTransport(cassette, speed)
+    if mode == "auto":
+        return AutoTransport(cassette, speed)
+    raise ValueError(f"Unknown PETFINDER_TRANSPORT: {mode}")